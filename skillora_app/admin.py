@@ -4,7 +4,10 @@ from .models import (Course, Instructor, Job, Testimonial, TeamMember, Contact,
                      InternshipFeedback, Notification, CourseMaterial, 
                      Assignment, AssignmentSubmission, CourseAnnouncement, StudentProgress,
                      ExcelUpload, AIVerification, Report, PlacementRecord, DashboardStats, DepartmentStats,
-                     Cart, Payment, Enrollment)
+                     Cart, Payment, Enrollment, BackgroundJob, DocumentAnalysis,
+                     MediaBlob, StoredFile, Skill, SkillAlias, RecommendationCache,
+                     SearchDocument)
+from .progress_utils import save_course_details
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
@@ -12,6 +15,14 @@ class CourseAdmin(admin.ModelAdmin):
     list_filter = ('category', 'level', 'created_at')
     search_fields = ('title', 'instructor', 'description')
     ordering = ('-created_at',)
+    # Derived from the free-text field by the post_save signal; saving the form would put the old tags back
+    exclude = ('skill_tags',)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            save_course_details(obj)
+        else:
+            super().save_model(request, obj, form, change)
 
 @admin.register(Instructor)
 class InstructorAdmin(admin.ModelAdmin):
@@ -50,6 +61,7 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'role', 'phone')
     list_filter = ('role',)
     search_fields = ('user__username', 'user__email', 'skills')
+    exclude = ('skill_tags',)
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -76,6 +88,7 @@ class InternshipAdmin(admin.ModelAdmin):
     list_filter = ('internship_type', 'status', 'has_placement_potential', 'created_at')
     search_fields = ('title', 'company__company_name', 'location', 'required_skills')
     ordering = ('-created_at',)
+    exclude = ('required_skill_tags',)
     readonly_fields = ('created_at', 'updated_at')
 
 @admin.register(InternshipApplication)
@@ -91,6 +104,7 @@ class StudentProfileAdmin(admin.ModelAdmin):
     list_display = ('student', 'department', 'year_of_study', 'cgpa', 'is_placement_ready')
     list_filter = ('department', 'year_of_study', 'graduation_year', 'is_placement_ready')
     search_fields = ('student__user__username', 'department', 'skills')
+    exclude = ('skill_tags',)
 
 @admin.register(InternshipFeedback)
 class InternshipFeedbackAdmin(admin.ModelAdmin):
@@ -156,8 +170,15 @@ class ExcelUploadAdmin(admin.ModelAdmin):
 class AIVerificationAdmin(admin.ModelAdmin):
     list_display = ('company', 'verification_type', 'status', 'confidence_score', 'created_at')
     list_filter = ('verification_type', 'status', 'created_at')
-    search_fields = ('company__company_name', 'document_file')
-    readonly_fields = ('created_at', 'processed_at')
+    search_fields = ('company__company_name', 'document_file', 'content_hash')
+    readonly_fields = ('content_hash', 'created_at', 'processed_at')
+
+@admin.register(DocumentAnalysis)
+class DocumentAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'file_type', 'letterhead_hash', 'created_at')
+    list_filter = ('file_type', 'created_at')
+    search_fields = ('content_hash', 'letterhead_hash')
+    readonly_fields = ('created_at',)
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
@@ -204,3 +225,51 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ('user', 'course', 'enrolled_at', 'is_active')
     list_filter = ('enrolled_at', 'is_active')
     search_fields = ('user__username', 'course__title')
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'company', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('task', 'status', 'created_at')
+    search_fields = ('task', 'company__company_name', 'last_error')
+    readonly_fields = ('created_at', 'locked_by', 'locked_at', 'finished_at')
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('path', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256', 'path')
+    readonly_fields = ('sha256', 'path', 'size', 'ref_count', 'created_at')
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'blob', 'created_at')
+    search_fields = ('name', 'blob__sha256')
+    readonly_fields = ('name', 'blob', 'created_at')
+
+class SkillAliasInline(admin.TabularInline):
+    model = SkillAlias
+    extra = 1
+
+@admin.register(Skill)
+class SkillAdmin(admin.ModelAdmin):
+    list_display = ('name', 'display_name', 'created_at')
+    search_fields = ('name', 'display_name', 'aliases__alias')
+    inlines = [SkillAliasInline]
+
+@admin.register(SkillAlias)
+class SkillAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'skill')
+    search_fields = ('alias', 'skill__name')
+
+@admin.register(RecommendationCache)
+class RecommendationCacheAdmin(admin.ModelAdmin):
+    list_display = ('student', 'is_stale', 'version', 'expires_at', 'refreshed_at')
+    list_filter = ('is_stale',)
+    search_fields = ('student__user__username',)
+    readonly_fields = ('internship_ids', 'scores', 'version', 'expires_at', 'refreshed_at')
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'kind', 'object_id', 'updated_at')
+    list_filter = ('kind',)
+    search_fields = ('title',)
+    readonly_fields = ('kind', 'object_id', 'title', 'tags', 'body', 'updated_at')
@@ -0,0 +1,389 @@
+"""
+Autocomplete for the search boxes
+
+Suggestions come from an in-process index of course titles, job titles,
+company names, locations (jobs and published internships) and skills
+(their aliases are matched too). The database is read once, when the index
+is built; after that, a keystroke is answered from memory.
+
+Each distinct (kind, text) is one suggestion. Its words are stored in a
+character trie, and every trie node keeps the suggestions with a word below
+it, so a prefix resolves in one walk. Matching is typo-tolerant. The trie is
+walked below the query's first letter (typos are assumed to come after it)
+with a Levenshtein row per node, and pruned once the row minimum exceeds the
+allowed distance: 0 for words of up to 2 characters, 1 up to 5,
+and 2 beyond. Earlier query words must match whole words, and the last one
+may be a prefix. The fuzzy walk only runs when exact prefixes give too few
+suggestions. Results are ordered by edit distance, then matches in the shown
+text before alias-only ones, then by how many rows mention the suggestion,
+then by length.
+
+Signals apply saves and deletes to the index in the process that made them,
+once the transaction commits (a rolled-back save leaves no suggestion). They
+also bump the version stored in the AutocompleteVersion row. Each process
+reads that version at most once every settings.AUTOCOMPLETE_VERSION_CHECK
+seconds, so keystrokes in between never touch the database. A process that
+sees another process's change (a gunicorn worker or the job worker) rebuilds.
+Every index is also rebuilt after settings.AUTOCOMPLETE_MAX_AGE seconds, which
+picks up skills created by bulk_create (skill_utils.resolve_skills), since it
+sends no signals. A rebuild reads the database outside the index lock; the
+old index keeps answering until the new one is swapped in.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AutocompleteVersion, Company, Course, Internship, Job, Skill, SkillAlias
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+MAX_QUERY_WORDS = 6
+VERSION_ROW = 1
+
+Suggestion = namedtuple('Suggestion', 'text kind distance')
+
+
+def normalize(text):
+    """Lowercase, accents stripped, single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+def words(text):
+    return re.findall(r'\w+', normalize(text))
+
+
+def max_distance(word):
+    """Edits tolerated for a query word: none for 1-2 characters, 1 up to 5, 2 beyond."""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+# Sources: model -> terms of an instance, as (kind, text, extra words) triples
+
+def _job_terms(job):
+    return [('job', job.title, ()), ('company', job.company, ()), ('location', job.location, ())]
+
+
+def _course_terms(course):
+    return [('course', course.title, ())]
+
+
+def _company_terms(company):
+    return [('company', company.company_name, ())]
+
+
+def _internship_terms(internship):
+    return [('location', internship.location, ())] if internship.status == 'published' else []
+
+
+def _skill_terms(skill, aliases=None):
+    if aliases is None:
+        aliases = skill.aliases.values_list('alias', flat=True)
+    return [('skill', skill.display_name or skill.name, tuple(aliases))]
+
+
+SOURCES = {
+    Job: _job_terms,
+    Course: _course_terms,
+    Company: _company_terms,
+    Internship: _internship_terms,
+    Skill: _skill_terms,
+}
+
+
+class _Node:
+    __slots__ = ('children', 'ends', 'below')
+
+    def __init__(self):
+        self.children = {}
+        self.ends = {}   # suggestion id -> number of its words ending here
+        self.below = {}  # suggestion id -> number of its words at or under this node
+
+
+def _count(counts, key, delta):
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+class AutocompleteIndex:
+    """Suggestions with reference counts, a word trie over them, and the terms each source row contributed."""
+
+    def __init__(self):
+        self.root = _Node()
+        self.ids = {}          # (kind, key) -> suggestion id
+        self.suggestions = {}  # suggestion id -> [text, kind, references, indexed words, words of the text]
+        self.sources = {}      # (model label, pk) -> [(kind, key)]
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def _index_words(self, suggestion_id, suggestion_words, delta):
+        for word in suggestion_words:
+            node = self.root
+            _count(node.below, suggestion_id, delta)
+            for char in word:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+                _count(node.below, suggestion_id, delta)
+            _count(node.ends, suggestion_id, delta)
+
+    def _add_term(self, kind, text, extra_words):
+        key = normalize(text)
+        if not key:
+            return None
+        suggestion_id = self.ids.get((kind, key))
+        if suggestion_id is None:
+            suggestion_id = self.ids[(kind, key)] = self.next_id
+            self.next_id += 1
+            suggestion_words = sorted(set(words(text)) | {word for extra in extra_words for word in words(extra)})
+            self.suggestions[suggestion_id] = [' '.join(text.split()), kind, 0, suggestion_words, words(text)]
+            self._index_words(suggestion_id, suggestion_words, 1)
+        self.suggestions[suggestion_id][2] += 1
+        return (kind, key)
+
+    def _remove_term(self, kind, key):
+        suggestion_id = self.ids.get((kind, key))
+        if suggestion_id is None:
+            return
+        suggestion = self.suggestions[suggestion_id]
+        suggestion[2] -= 1
+        if suggestion[2] <= 0:
+            self._index_words(suggestion_id, suggestion[3], -1)
+            del self.suggestions[suggestion_id]
+            del self.ids[(kind, key)]
+
+    def update_source(self, source, terms):
+        """Replace the terms a source row contributes (an empty list removes it)."""
+        for kind, key in self.sources.pop(source, ()):
+            self._remove_term(kind, key)
+        added = [self._add_term(kind, text, extra) for kind, text, extra in terms]
+        added = [term for term in added if term is not None]
+        if added:
+            self.sources[source] = added
+
+    def _exact_word(self, word, prefix):
+        """Suggestions with a word equal to ``word`` (or starting with it), from one trie walk."""
+        node = self.root
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return {}
+        return dict.fromkeys(node.below if prefix else node.ends, 0)
+
+    def _match_word(self, word, prefix):
+        """{suggestion id: edit distance} for suggestions with a word matching ``word`` (or starting like it)."""
+        limit = max_distance(word)
+        matches = {}
+
+        def collect(ids, distance):
+            for suggestion_id in ids:
+                if distance < matches.get(suggestion_id, limit + 1):
+                    matches[suggestion_id] = distance
+
+        def next_row(previous, char):
+            row = [previous[0] + 1]
+            for i, query_char in enumerate(word, start=1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (query_char != char)))
+            return row
+
+        # Typos are searched after an exact first letter, which keeps the walk to one branch of the trie
+        start = self.root.children.get(word[0])
+        if start is None:
+            return matches
+        # Each stack entry carries the distance its whole subtree was already collected at (prefix mode)
+        stack = [(start, next_row(list(range(len(word) + 1)), word[0]), limit + 1)]
+        first = stack[0]
+        if prefix and first[1][-1] <= limit:
+            collect(start.below, first[1][-1])
+            stack[0] = (start, first[1], first[1][-1])
+        elif not prefix and first[1][-1] <= limit:
+            collect(start.ends, first[1][-1])
+        while stack:
+            node, previous, collected = stack.pop()
+            if prefix and collected == 0:
+                continue
+            for char, child in node.children.items():
+                row = next_row(previous, char)
+                child_collected = collected
+                if prefix:
+                    if row[-1] < collected:
+                        collect(child.below, row[-1])
+                        child_collected = row[-1]
+                elif row[-1] <= limit:
+                    collect(child.ends, row[-1])
+                if min(row) <= limit and child_collected > 0:
+                    stack.append((child, row, child_collected))
+        return matches
+
+    def _candidates(self, query_words, kinds, fuzzy):
+        """{suggestion id: summed edit distance} of the suggestions matching every query word."""
+        match = self._match_word if fuzzy else self._exact_word
+        distances = None
+        for position, word in enumerate(query_words):
+            matches = match(word, prefix=position == len(query_words) - 1)
+            if distances is None:
+                distances = matches
+            else:
+                distances = {sid: distances[sid] + d for sid, d in matches.items() if sid in distances}
+            if not distances:
+                return {}
+        if kinds:
+            distances = {sid: d for sid, d in distances.items() if self.suggestions[sid][1] in kinds}
+        return distances
+
+    def suggest(self, query, kinds=None, limit=DEFAULT_SUGGESTIONS):
+        query_words = words(query)[:MAX_QUERY_WORDS]
+        if not query_words:
+            return []
+        # Exact prefixes are a walk down the trie; the edit-distance search runs only when they are too few
+        distances = self._candidates(query_words, kinds, fuzzy=False)
+        if len(distances) < limit:
+            distances = self._candidates(query_words, kinds, fuzzy=True)
+        last = query_words[-1]
+
+        def rank(item):
+            suggestion_id, distance = item
+            text, _, references, _, text_words = self.suggestions[suggestion_id]
+            # Matched through the shown text rather than only through a skill alias
+            in_text = any(word.startswith(last) for word in text_words)
+            return (distance, not in_text, -references, len(text), text)
+
+        best = heapq.nsmallest(limit, distances.items(), key=rank)
+        return [
+            Suggestion(self.suggestions[sid][0], self.suggestions[sid][1], distance) for sid, distance in best
+        ]
+
+
+def _source(model, pk):
+    return (model._meta.label_lower, pk)
+
+
+def build_index():
+    """A complete index read from the database (one query per source model, plus skill aliases)."""
+    index = AutocompleteIndex()
+    for job in Job.objects.only('title', 'company', 'location'):
+        index.update_source(_source(Job, job.pk), _job_terms(job))
+    for course in Course.objects.only('title'):
+        index.update_source(_source(Course, course.pk), _course_terms(course))
+    for company in Company.objects.only('company_name'):
+        index.update_source(_source(Company, company.pk), _company_terms(company))
+    for internship in Internship.objects.filter(status='published').only('location', 'status'):
+        index.update_source(_source(Internship, internship.pk), _internship_terms(internship))
+    aliases = {}
+    for skill_id, alias in SkillAlias.objects.values_list('skill_id', 'alias'):
+        aliases.setdefault(skill_id, []).append(alias)
+    for skill in Skill.objects.only('name', 'display_name'):
+        index.update_source(_source(Skill, skill.pk), _skill_terms(skill, aliases.get(skill.pk, ())))
+    return index
+
+
+_state = {'index': None, 'version': None, 'built_at': 0.0, 'checked_at': 0.0}
+_lock = threading.Lock()
+# Held by the one thread rebuilding the index
+_build_lock = threading.Lock()
+
+
+def _shared_version():
+    return AutocompleteVersion.objects.filter(pk=VERSION_ROW).values_list('version', flat=True).first() or 0
+
+
+def get_index():
+    """This process's index, (re)built when missing, older than AUTOCOMPLETE_MAX_AGE or changed by another process."""
+    now = time.monotonic()
+    max_age = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 600)
+    check_interval = getattr(settings, 'AUTOCOMPLETE_VERSION_CHECK', 5)
+    with _lock:
+        current = _state['index']
+        fresh = current is not None and now - _state['built_at'] <= max_age
+        if fresh and now - _state['checked_at'] < check_interval:
+            return current
+    version = _shared_version()
+    with _lock:
+        _state['checked_at'] = now
+        if fresh and _state['version'] == version:
+            return _state['index']
+    return _rebuild(version, current)
+
+
+def _rebuild(version, current):
+    """Build an index for ``version`` outside the index lock and swap it in."""
+    if current is not None:
+        # Someone else is already rebuilding: keep answering from the current index
+        if not _build_lock.acquire(blocking=False):
+            return current
+    else:
+        _build_lock.acquire()
+    try:
+        with _lock:
+            if _state['index'] is not current and _state['version'] == version:
+                # Built by another thread while this one waited
+                return _state['index']
+        index = build_index()
+        with _lock:
+            _state.update(index=index, version=version, built_at=time.monotonic())
+        return index
+    finally:
+        _build_lock.release()
+
+
+def _bump_version():
+    """Increment the shared version; returns (previous version, new version)."""
+    with transaction.atomic():
+        row, _ = AutocompleteVersion.objects.select_for_update().get_or_create(pk=VERSION_ROW)
+        row.version += 1
+        row.save(update_fields=['version', 'updated_at'])
+    return row.version - 1, row.version
+
+
+def update_autocomplete(instance, deleted=False):
+    """Apply a saved or deleted source row to this process's index and tell the other processes."""
+    update_autocomplete_many([instance], deleted=deleted)
+
+
+def update_autocomplete_many(instances, deleted=False):
+    """update_autocomplete() for several rows (e.g. saved with bulk_create), bumping the version once."""
+    # Terms are read now (a deleted row is gone by commit time) and applied once the transaction commits
+    changes = [
+        (_source(type(instance), instance.pk), [] if deleted else SOURCES[type(instance)](instance))
+        for instance in instances
+    ]
+    if changes:
+        transaction.on_commit(lambda: _apply_changes(changes))
+
+
+def _apply_changes(changes):
+    previous, version = _bump_version()
+    with _lock:
+        index = _state['index']
+        if index is None:
+            return
+        if _state['version'] != previous:
+            # Already behind another process's change; the next query rebuilds
+            _state.update(version=None, checked_at=0.0)
+            return
+        for source, terms in changes:
+            index.update_source(source, terms)
+        _state['version'] = version
+
+
+def suggest(query, kinds=None, limit=DEFAULT_SUGGESTIONS):
+    """Ranked Suggestions for a partly typed ``query``, optionally only of the given kinds."""
+    index = get_index()
+    with _lock:
+        return index.suggest(query, kinds=kinds, limit=limit)
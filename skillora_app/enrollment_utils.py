@@ -0,0 +1,168 @@
+"""
+Single read path for course enrollments
+
+A student counts as enrolled in a course through Student.courses_enrolled,
+Course.students_enrolled or an active Enrollment. EnrollmentIndex keeps one
+row per enrolled (student, course) pair with a flag per source, so checks and
+rosters are a single indexed query instead of a union of all three. The index
+is kept current by the signal handlers in signals.py and can be rebuilt with
+``manage.py rebuild_enrollment_index``.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Course, Enrollment, EnrollmentIndex, Student, StudentProgress
+
+SOURCE_FIELDS = ('via_student_courses', 'via_course_students', 'via_enrollment')
+
+
+def is_enrolled(student, course):
+    """Return True if the student is enrolled in the course by any route."""
+    return EnrollmentIndex.objects.filter(student=student, course=course).exists()
+
+
+def enrolled_courses(student):
+    """Courses the student is enrolled in."""
+    return Course.objects.filter(enrollment_index__student=student)
+
+
+def enrolled_students(course):
+    """Students enrolled in the course."""
+    return Student.objects.filter(enrollment_index__course=course)
+
+
+def with_course_metrics(courses):
+    """Annotate a Course queryset with ``student_count``, the distinct students enrolled by any route."""
+    return courses.annotate(student_count=Count('enrollment_index__student', distinct=True))
+
+
+def distinct_student_total(courses):
+    """Number of distinct students enrolled in any course of the queryset."""
+    return EnrollmentIndex.objects.filter(course__in=courses).values('student_id').distinct().count()
+
+
+def load_teacher_rosters(teacher, course_id=None):
+    """
+    Return every course the teacher instructs with its students and their progress.
+
+    Each entry is a dict with ``course``, ``students``, ``students_with_progress``
+    and ``student_count``. ``course_id`` narrows the result in SQL. Three queries
+    are made however many courses and students there are: the courses, their index
+    rows with students and users joined in, and the progress percentages.
+    """
+    courses = Course.objects.filter(instructor=teacher).order_by('-created_at')
+    if course_id is not None:
+        courses = courses.filter(id=course_id)
+    courses = list(courses)
+    students_by_course = {course.id: [] for course in courses}
+    if not courses:
+        return []
+
+    for row in EnrollmentIndex.objects.filter(
+        course_id__in=students_by_course
+    ).select_related('student__user').order_by('student_id'):
+        students_by_course[row.course_id].append(row.student)
+
+    percentages = {
+        (student_id, progress_course_id): percentage
+        for student_id, progress_course_id, percentage in StudentProgress.objects.filter(
+            course_id__in=students_by_course
+        ).values_list('student_id', 'course_id', 'progress_percentage')
+    }
+
+    rosters = []
+    for course in courses:
+        students = students_by_course[course.id]
+        rosters.append({
+            'course': course,
+            'students': students,
+            'students_with_progress': [
+                {
+                    'student': student,
+                    'progress_percentage': percentages.get((student.id, course.id), 0.0),
+                }
+                for student in students
+            ],
+            'student_count': len(students),
+        })
+    return rosters
+
+
+def _source_pairs(student_ids=None, course_ids=None):
+    """Read the (student_id, course_id) pairs of every source, keyed by flag name."""
+    sources = (
+        ('via_student_courses', 'student_id',
+         Student.courses_enrolled.through.objects.values_list('student_id', 'course_id')),
+        ('via_course_students', 'student_id',
+         Course.students_enrolled.through.objects.values_list('student_id', 'course_id')),
+        ('via_enrollment', 'user__student',
+         Enrollment.objects.filter(is_active=True, user__student__isnull=False).values_list('user__student', 'course_id')),
+    )
+    flags_by_pair = {}
+    for field, student_lookup, pairs in sources:
+        if student_ids is not None:
+            pairs = pairs.filter(**{f'{student_lookup}__in': student_ids})
+        if course_ids is not None:
+            pairs = pairs.filter(course_id__in=course_ids)
+        for pair in pairs.iterator(chunk_size=2000):
+            flags_by_pair.setdefault(pair, dict.fromkeys(SOURCE_FIELDS, False))[field] = True
+    return flags_by_pair
+
+
+def _apply_index_changes(wanted, existing, scope, commit=True, batch_size=500):
+    """Bring the index rows for ``scope`` in line with ``wanted`` and report the changes."""
+    to_create, to_update, to_delete = [], [], []
+    for pair in scope:
+        flags = wanted.get(pair)
+        row = existing.get(pair)
+        if flags is None:
+            if row is not None:
+                to_delete.append(row.pk)
+        elif row is None:
+            to_create.append(EnrollmentIndex(student_id=pair[0], course_id=pair[1], **flags))
+        elif any(getattr(row, field) != value for field, value in flags.items()):
+            for field, value in flags.items():
+                setattr(row, field, value)
+            to_update.append(row)
+
+    if commit:
+        if to_create:
+            EnrollmentIndex.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+        if to_update:
+            EnrollmentIndex.objects.bulk_update(to_update, list(SOURCE_FIELDS), batch_size=batch_size)
+        if to_delete:
+            EnrollmentIndex.objects.filter(pk__in=to_delete).delete()
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(to_delete)}
+
+
+def sync_enrollments(pairs):
+    """Recompute the index rows for the given (student_id, course_id) pairs from their sources."""
+    pairs = {(student_id, course_id) for student_id, course_id in pairs if student_id and course_id}
+    if not pairs:
+        return
+    student_ids = {student_id for student_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+    wanted = _source_pairs(student_ids, course_ids)
+    existing = {
+        (row.student_id, row.course_id): row
+        for row in EnrollmentIndex.objects.filter(student_id__in=student_ids, course_id__in=course_ids)
+    }
+    _apply_index_changes(wanted, existing, pairs)
+
+
+def unenroll(student, course):
+    """Remove the student from the course through every enrollment source."""
+    with transaction.atomic():
+        student.courses_enrolled.remove(course)
+        course.students_enrolled.remove(student)
+        # A queryset update sends no signals, so sync the index explicitly
+        Enrollment.objects.filter(user_id=student.user_id, course=course, is_active=True).update(is_active=False)
+        sync_enrollments([(student.pk, course.pk)])
+
+
+def rebuild_enrollment_index(commit=True, batch_size=500):
+    """Rebuild the whole index from the three sources and return the created/updated/deleted counts."""
+    wanted = _source_pairs()
+    existing = {(row.student_id, row.course_id): row for row in EnrollmentIndex.objects.iterator(chunk_size=2000)}
+    return _apply_index_changes(wanted, existing, set(wanted) | set(existing), commit=commit, batch_size=batch_size)
@@ -0,0 +1,66 @@
+"""
+Helpers for streaming large downloads
+
+Rows are produced lazily (usually from ``QuerySet.iterator()``) and written
+out as they are generated, so an export never holds the whole result set in
+memory and the first bytes reach the client straight away.
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Yield CSV lines: the header, then one line per row (a sequence of values)."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    """Yield one JSON document per line for each row (a dict)."""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_json_array(rows):
+    """Yield a JSON array of the rows (dicts), one element per line."""
+    separator = '\n'
+    yield '['
+    for row in rows:
+        yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def iter_file(fileobj, chunk_size=FILE_CHUNK_SIZE):
+    """Yield a file's contents from the start in chunks, closing it at the end."""
+    try:
+        fileobj.seek(0)
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def streaming_download(chunks, content_type, filename):
+    """StreamingHttpResponse sending ``chunks`` as an attachment called ``filename``."""
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,468 @@
+"""
+Ingestion of company spreadsheet uploads (ExcelUpload)
+
+The uploaded CSV or .xlsx file is read one row at a time (csv module, or
+openpyxl in read-only mode) and handled in chunks of INGEST_CHUNK_SIZE rows:
+each chunk is validated against the database with a few set-based queries
+and saved with bulk_create inside its own transaction, together with the
+upload's progress. Invalid rows are skipped and reported in
+ExcelUpload.error_log, so a 100k-row file never needs more than one chunk in
+memory, and an interrupted import resumes after its last committed chunk.
+
+Supported upload types:
+
+    student_data       email, first_name, last_name, username, phone,
+                       department, cgpa, year_of_study, graduation_year, skills
+    placement_records  student_email, job_title, package_amount,
+                       stipend_amount, placement_date, iqac_status
+    job_postings       title, location, description, requirements,
+                       salary_range, job_type, company
+
+Column names are matched case-insensitively, ignoring spaces. Students are
+created with unusable passwords; they set one with the password reset flow.
+"""
+
+import csv
+import io
+import os
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .autocomplete_utils import update_autocomplete_many
+from .models import Job, PlacementRecord, Student, StudentProfile, UserProfile
+from .search_utils import index_objects
+from .skill_utils import sync_skill_tags
+from .stats_utils import refresh_dashboard_stats
+
+INGEST_CHUNK_SIZE = 1000
+PROGRESS_FIELDS = ['resume_row', 'total_records', 'processed_records', 'error_count', 'error_log']
+# error_log keeps the first errors; the rest are only counted
+MAX_LOGGED_ERRORS = 500
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y')
+INTEGER_MIN, INTEGER_MAX = -2 ** 31, 2 ** 31 - 1
+IQAC_STATUSES = dict(PlacementRecord._meta.get_field('iqac_status').choices)
+
+COLUMN_ALIASES = {
+    'email_address': 'email',
+    'mail': 'email',
+    'firstname': 'first_name',
+    'lastname': 'last_name',
+    'mobile': 'phone',
+    'phone_number': 'phone',
+    'dept': 'department',
+    'batch': 'graduation_year',
+    'year': 'year_of_study',
+}
+
+UPLOAD_TYPE_ALIASES = {
+    'placement_records': {
+        'email': 'student_email',
+        'student': 'student_email',
+        'role': 'job_title',
+        'package': 'package_amount',
+        'ctc': 'package_amount',
+        'stipend': 'stipend_amount',
+        'date': 'placement_date',
+    },
+    'job_postings': {
+        'job_title': 'title',
+        'role': 'title',
+        'salary': 'salary_range',
+        'type': 'job_type',
+    },
+}
+
+
+class IngestionError(Exception):
+    """The upload cannot be read at all (unsupported type or file format)."""
+
+
+class RowError(ValueError):
+    """A single row is invalid; it is skipped and logged."""
+
+
+def _normalize_header(name):
+    return '_'.join(str(name or '').strip().lower().replace('-', ' ').split())
+
+
+def _headers(raw_headers, upload_type):
+    type_aliases = UPLOAD_TYPE_ALIASES.get(upload_type, {})
+    headers = []
+    for raw in raw_headers:
+        name = _normalize_header(raw)
+        name = COLUMN_ALIASES.get(name, name)
+        headers.append(type_aliases.get(name, name))
+    return headers
+
+
+def _iter_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise IngestionError('Excel support requires openpyxl (pip install openpyxl). Upload a CSV file instead.')
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_upload_rows(fileobj, filename, upload_type):
+    """
+    Yield (row number, {column: value}) for every non-empty data row of a CSV
+    or .xlsx file, reading it sequentially.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = _iter_csv(fileobj)
+    elif extension in ('.xlsx', '.xlsm'):
+        rows = _iter_xlsx(fileobj)
+    else:
+        raise IngestionError(f'Unsupported file type "{extension or filename}". Upload a .csv or .xlsx file.')
+
+    headers = None
+    for number, values in enumerate(rows, start=1):
+        if not any(value not in (None, '') for value in values):
+            continue
+        if headers is None:
+            headers = _headers(values, upload_type)
+            continue
+        yield number, {
+            header: value.strip() if isinstance(value, str) else value
+            for header, value in zip(headers, values) if header
+        }
+
+
+# Value parsing
+
+def _text(row, key, max_length=None, required=False):
+    value = row.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{key} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{key} is longer than {max_length} characters')
+    return value
+
+
+def _decimal(row, key, max_value=None):
+    value = row.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise RowError(f'{key} "{value}" is not a number')
+    # NaN cannot be compared and Infinity cannot be stored
+    if not number.is_finite():
+        raise RowError(f'{key} "{value}" is not a number')
+    if number < 0 or (max_value is not None and number > max_value):
+        raise RowError(f'{key} {number} is out of range')
+    try:
+        return number.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        # Too many digits for the context precision (e.g. 1e999)
+        raise RowError(f'{key} {number} is out of range')
+
+
+def _integer(row, key, choices=None):
+    value = row.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(f'{key} "{value}" is not a whole number')
+    if not number.is_finite():
+        raise RowError(f'{key} "{value}" is not a whole number')
+    number = int(number)
+    # Beyond IntegerField's range the row would fail when it is saved, with the whole chunk
+    if not INTEGER_MIN <= number <= INTEGER_MAX or (choices is not None and number not in choices):
+        raise RowError(f'{key} "{value}" is out of range')
+    return number
+
+
+def _date(row, key):
+    value = row.get(key)
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(row, key, required=True)
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise RowError(f'{key} "{text}" is not a date (use YYYY-MM-DD)')
+
+
+def _email(row, key):
+    email = _text(row, key, required=True).lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError(f'{key} "{email}" is not a valid email address')
+    return email
+
+
+def _existing_emails(emails):
+    return set(
+        User.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails).values_list('email_lower', flat=True)
+    )
+
+
+# Chunk handlers: each takes [(row number, row)] and returns (created, errors)
+
+def _ingest_students(upload, chunk):
+    errors, parsed, seen = [], [], set()
+    for number, row in chunk:
+        try:
+            email = _email(row, 'email')
+            if email in seen:
+                raise RowError(f'{email} appears more than once in the file')
+            seen.add(email)
+            parsed.append((number, {
+                'email': email,
+                'username': _text(row, 'username', 150) or email[:150],
+                'first_name': _text(row, 'first_name', 150),
+                'last_name': _text(row, 'last_name', 150),
+                'phone': _text(row, 'phone', 15) or None,
+                'department': _text(row, 'department', 100),
+                'cgpa': _decimal(row, 'cgpa', max_value=Decimal('10')),
+                'year_of_study': _integer(row, 'year_of_study', choices=range(1, 5)),
+                'graduation_year': _integer(row, 'graduation_year'),
+                'skills': _text(row, 'skills'),
+            }))
+        except RowError as error:
+            errors.append((number, str(error)))
+
+    taken_emails = _existing_emails([values['email'] for _, values in parsed])
+    taken_usernames = set(User.objects.filter(
+        username__in=[values['username'] for _, values in parsed]
+    ).values_list('username', flat=True))
+    valid = []
+    for number, values in parsed:
+        if values['email'] in taken_emails:
+            errors.append((number, f"{values['email']} is already registered"))
+        elif values['username'] in taken_usernames:
+            errors.append((number, f"username {values['username']} is already taken"))
+        else:
+            taken_usernames.add(values['username'])
+            valid.append(values)
+    if not valid:
+        return 0, errors
+
+    unusable_password = make_password(None)
+    users = User.objects.bulk_create([
+        User(username=values['username'], email=values['email'], first_name=values['first_name'],
+             last_name=values['last_name'], password=unusable_password)
+        for values in valid
+    ])
+    UserProfile.objects.bulk_create([UserProfile(user=user, role='student') for user in users])
+    students = Student.objects.bulk_create([Student(user=user) for user in users])
+    profiles = StudentProfile.objects.bulk_create([
+        StudentProfile(
+            student=student,
+            phone=values['phone'],
+            department=values['department'],
+            cgpa=values['cgpa'],
+            year_of_study=values['year_of_study'],
+            graduation_year=values['graduation_year'],
+            skills=values['skills'],
+        )
+        for student, values in zip(students, valid)
+    ])
+    # bulk_create skips the post_save signal that links skills
+    sync_skill_tags(StudentProfile, profiles)
+    return len(valid), errors
+
+
+def _ingest_placements(upload, chunk):
+    errors, parsed = [], []
+    for number, row in chunk:
+        try:
+            iqac_status = _text(row, 'iqac_status').lower() or 'pending'
+            if iqac_status not in IQAC_STATUSES:
+                raise RowError(f'iqac_status must be one of: {", ".join(IQAC_STATUSES)}')
+            parsed.append((number, {
+                'student_email': _email(row, 'student_email'),
+                'job_title': _text(row, 'job_title', 200, required=True),
+                'package_amount': _decimal(row, 'package_amount', max_value=Decimal('9999999999.99')),
+                'stipend_amount': _decimal(row, 'stipend_amount', max_value=Decimal('99999999.99')),
+                'placement_date': _date(row, 'placement_date'),
+                'iqac_status': iqac_status,
+            }))
+        except RowError as error:
+            errors.append((number, str(error)))
+
+    student_ids = dict(
+        Student.objects.annotate(email_lower=Lower('user__email')).filter(
+            email_lower__in={values['student_email'] for _, values in parsed}
+        ).values_list('email_lower', 'id')
+    )
+    # A record is one (student, job title, date) at this company, so importing a file again adds nothing
+    recorded = set(PlacementRecord.objects.filter(
+        company=upload.company, student_id__in=student_ids.values()
+    ).values_list('student_id', 'job_title', 'placement_date'))
+    records = []
+    for number, values in parsed:
+        student_id = student_ids.get(values.pop('student_email'))
+        if student_id is None:
+            errors.append((number, 'no student is registered with that email'))
+            continue
+        identity = (student_id, values['job_title'], values['placement_date'])
+        if identity in recorded:
+            errors.append((number, 'this placement is already recorded'))
+            continue
+        recorded.add(identity)
+        records.append(PlacementRecord(company=upload.company, student_id=student_id, **values))
+    PlacementRecord.objects.bulk_create(records)
+    return len(records), errors
+
+
+def _ingest_jobs(upload, chunk):
+    errors, parsed = [], []
+    for number, row in chunk:
+        try:
+            parsed.append((number, Job(
+                title=_text(row, 'title', 200, required=True),
+                company=_text(row, 'company', 100) or upload.company.company_name[:100],
+                location=_text(row, 'location', 100, required=True),
+                description=_text(row, 'description', required=True),
+                requirements=_text(row, 'requirements'),
+                salary_range=_text(row, 'salary_range', 100),
+                job_type=_text(row, 'job_type', 50) or 'Full-time',
+            )))
+        except RowError as error:
+            errors.append((number, str(error)))
+
+    # A posting is one (title, company, location) posted by this company, so importing a file again adds nothing
+    posted = set(Job.objects.filter(
+        company_posters=upload.company, title__in={job.title for _, job in parsed}
+    ).values_list('title', 'company', 'location'))
+    jobs = []
+    for number, job in parsed:
+        identity = (job.title, job.company, job.location)
+        if identity in posted:
+            errors.append((number, 'this job is already posted'))
+            continue
+        posted.add(identity)
+        jobs.append(job)
+    jobs = Job.objects.bulk_create(jobs)
+    Job.company_posters.through.objects.bulk_create([
+        Job.company_posters.through(company_id=upload.company_id, job_id=job.pk) for job in jobs
+    ])
+    # bulk_create skips the post_save signals that index jobs for search and autocomplete
+    index_objects(jobs)
+    update_autocomplete_many(jobs)
+    return len(jobs), errors
+
+
+INGESTERS = {
+    'student_data': _ingest_students,
+    'placement_records': _ingest_placements,
+    'job_postings': _ingest_jobs,
+}
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _error_lines(errors):
+    return [f'Row {number}: {message}' for number, message in errors]
+
+
+def _finish(upload, status, lines):
+    """Record the final status and error_log (the logged lines plus a count of the rest)."""
+    if upload.error_count > len(lines):
+        lines = lines + [f'... and {upload.error_count - len(lines)} more errors']
+    upload.status = status
+    upload.error_log = '\n'.join(lines)
+    upload.processed_at = timezone.now()
+    upload.save(update_fields=['status', 'error_log', 'error_count', 'processed_at'])
+    if upload.processed_records and upload.upload_type in ('student_data', 'placement_records'):
+        # bulk_create sends no signals, so rebuild the dashboard snapshot here
+        refresh_dashboard_stats([upload.company_id])
+    return upload
+
+
+def process_upload(upload, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Ingest an ExcelUpload's file, updating its counters and status as it goes.
+    Returns the upload; its status ends as 'completed' (possibly with row
+    errors in error_log) or 'failed' when the file could not be read.
+
+    Each chunk commits together with the upload's progress (resume_row, the
+    counters and the row errors logged so far), so running it again continues
+    after the last committed row instead of importing earlier chunks twice.
+    Database and storage errors are raised for the job queue to retry;
+    fail_upload records the last one.
+    """
+    ingest = INGESTERS.get(upload.upload_type)
+    upload.status = 'processing'
+    upload.save(update_fields=['status'])
+
+    logged = upload.error_log.splitlines() if upload.error_log else []
+    try:
+        if ingest is None:
+            raise IngestionError(f'{upload.get_upload_type_display()} uploads are not supported yet.')
+        with upload.file.open('rb') as fileobj:
+            rows = iter_upload_rows(fileobj, upload.file.name, upload.upload_type)
+            rows = (item for item in rows if item[0] > upload.resume_row)
+            for chunk in _chunks(rows, chunk_size):
+                with transaction.atomic():
+                    created, chunk_errors = ingest(upload, chunk)
+                    chunk_errors.sort()
+                    upload.error_count += len(chunk_errors)
+                    logged.extend(_error_lines(chunk_errors[:max(MAX_LOGGED_ERRORS - len(logged), 0)]))
+                    upload.error_log = '\n'.join(logged)
+                    upload.total_records += len(chunk)
+                    upload.processed_records += created
+                    upload.resume_row = chunk[-1][0]
+                    upload.save(update_fields=PROGRESS_FIELDS)
+    except (IngestionError, UnicodeDecodeError, csv.Error) as error:
+        upload.error_count += 1
+        return _finish(upload, 'failed', [f'Could not read the file: {error}'] + logged)
+    except (DatabaseError, OSError):
+        # Transient (or at least not the file's fault): the job is retried and resumes after resume_row
+        raise
+    except Exception as error:
+        # openpyxl raises assorted errors for corrupt workbooks
+        upload.error_count += 1
+        return _finish(upload, 'failed', [f'Could not process the file: {error}'] + logged)
+    return _finish(upload, 'completed', logged)
+
+
+def fail_upload(upload, error):
+    """Mark an upload failed after its last attempt, keeping what it imported and the rows it logged."""
+    logged = upload.error_log.splitlines() if upload.error_log else []
+    upload.error_count += 1
+    return _finish(upload, 'failed', [
+        f'Processing stopped after row {upload.resume_row} '
+        f'({upload.processed_records} of {upload.total_records} records imported): {error}'
+    ] + logged)
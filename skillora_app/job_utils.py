@@ -0,0 +1,372 @@
+"""
+Database-backed background jobs
+
+Views enqueue a BackgroundJob and return; ``manage.py run_worker`` claims due
+jobs and runs them, in-process or in a process pool. A job is claimed with a
+conditional UPDATE (status still 'queued'), so several workers can share the
+table without a broker. Failed attempts are retried with exponential backoff
+up to ``max_attempts``; after the last one the task's failure handler marks
+the target row (upload, verification) as failed.
+
+A claimed job is leased to its worker: while it runs, a thread renews
+locked_at every fifth of settings.BACKGROUND_JOB_TIMEOUT. Only a job whose
+lease has not been renewed for the whole timeout (its worker died or hung)
+is requeued, and a worker records an outcome only while it still holds the
+job, so a long import is never handed to a second worker while the first is
+alive. Tasks must still tolerate being run again after a lost lease
+(process_upload resumes after its last committed chunk).
+
+Deployments without a worker process (settings.BACKGROUND_WORKER off, the
+default) run the queue in the web process instead: once the enqueuing
+transaction commits, a thread drains every due job, then sleeps until the
+next retry is due (or a lease can expire) and exits once nothing is pending.
+The dashboard's job poll starts it again when due jobs are left behind, e.g.
+by a web process that was restarted.
+"""
+
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from .ingestion_utils import fail_upload, process_upload
+from .models import AIVerification, BackgroundJob, ExcelUpload, Report, Teacher
+from .payment_utils import save_ledger_pdf
+from .recommendation_utils import refresh_stale_recommendations
+from .report_utils import build_report
+from .stats_utils import refresh_dashboard_stats, refresh_teacher_stats
+from .verification_utils import verify_document
+
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+MAX_ERROR_LENGTH = 4000
+OUTCOME_FIELDS = ('status', 'last_error', 'run_after', 'finished_at', 'locked_by', 'locked_at')
+
+
+# Tasks: run(**payload) does the work, fail(error, **payload) records a final failure
+
+def _ingest_upload(upload_id):
+    process_upload(ExcelUpload.objects.select_related('company').get(pk=upload_id))
+
+
+def _fail_upload(error, upload_id):
+    upload = ExcelUpload.objects.filter(pk=upload_id).first()
+    if upload is not None:
+        fail_upload(upload, error)
+
+
+def _verify_document(verification_id):
+    verify_document(AIVerification.objects.select_related('company').get(pk=verification_id))
+
+
+def _fail_verification(error, verification_id):
+    AIVerification.objects.filter(pk=verification_id).update(
+        status='failed', verification_result=f'Verification failed: {error}', processed_at=timezone.now()
+    )
+
+
+def _generate_report(report_id):
+    build_report(Report.objects.select_related('company').get(pk=report_id))
+
+
+def _fail_report(error, report_id):
+    # Reports have no status of their own; keep the reason with the parameters
+    report = Report.objects.filter(pk=report_id).first()
+    if report is not None:
+        report.parameters = {**report.parameters, 'error': str(error)}
+        report.save(update_fields=['parameters'])
+
+
+def _export_ledger_pdf(teacher_id, file_name):
+    save_ledger_pdf(Teacher.objects.select_related('user').get(pk=teacher_id), file_name)
+
+
+def _fail_ledger_pdf(error, teacher_id, file_name):
+    # The failed job is what the download view reports
+    pass
+
+
+def _refresh_teacher_stats(teacher_id):
+    refresh_teacher_stats([teacher_id])
+
+
+def _refresh_dashboard_stats(company_id):
+    refresh_dashboard_stats([company_id])
+
+
+def _fail_stats_refresh(error, **payload):
+    # The stale row keeps being served and the next page view queues another refresh
+    pass
+
+
+def _refresh_recommendations():
+    refresh_stale_recommendations()
+
+
+def _fail_recommendations(error):
+    # Stale rows stay stale and are rebuilt when their students next read them
+    pass
+
+
+TASKS = {
+    'ingest_upload': (_ingest_upload, _fail_upload),
+    'verify_document': (_verify_document, _fail_verification),
+    'generate_report': (_generate_report, _fail_report),
+    'export_ledger_pdf': (_export_ledger_pdf, _fail_ledger_pdf),
+    'refresh_recommendations': (_refresh_recommendations, _fail_recommendations),
+    'refresh_teacher_stats': (_refresh_teacher_stats, _fail_stats_refresh),
+    'refresh_dashboard_stats': (_refresh_dashboard_stats, _fail_stats_refresh),
+}
+
+TASK_LABELS = {
+    'ingest_upload': 'Spreadsheet import',
+    'verify_document': 'Document verification',
+    'generate_report': 'Report generation',
+    'export_ledger_pdf': 'Payment history PDF',
+    'refresh_recommendations': 'Recommendation refresh',
+    'refresh_teacher_stats': 'Teacher stats refresh',
+    'refresh_dashboard_stats': 'Dashboard stats refresh',
+}
+
+
+def enqueue(task, company=None, max_attempts=3, **payload):
+    """Queue ``task`` to run with ``payload`` as keyword arguments and return the job."""
+    if task not in TASKS:
+        raise ValueError(f'Unknown background task: {task}')
+    job = BackgroundJob.objects.create(task=task, payload=payload, company=company, max_attempts=max_attempts)
+    if not getattr(settings, 'BACKGROUND_WORKER', False):
+        transaction.on_commit(start_inline_runner)
+    return job
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt: 30s, 60s, 120s, ... up to an hour."""
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def claim_jobs(worker_id, limit):
+    """Mark up to ``limit`` due jobs as running for this worker and return their ids."""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    candidates = BackgroundJob.objects.filter(status='queued', run_after__lte=now).order_by(
+        'run_after', 'id'
+    ).values_list('id', flat=True)[:limit * 2]
+    claimed = []
+    for job_id in candidates:
+        # Only one worker's UPDATE can still see the job as queued
+        if BackgroundJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def lease_timeout():
+    return getattr(settings, 'BACKGROUND_JOB_TIMEOUT', 300)
+
+
+def _held(job):
+    """The job's row while this claim (worker and attempt) still holds it."""
+    return BackgroundJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by, attempts=job.attempts)
+
+
+@contextmanager
+def _renewing_lease(job):
+    """Keep renewing the job's lease from a thread for as long as the block runs."""
+    stop = threading.Event()
+    interval = max(lease_timeout() / 5, 1)
+
+    def renew():
+        try:
+            while not stop.wait(interval):
+                try:
+                    _held(job).update(locked_at=timezone.now())
+                except DatabaseError:
+                    # Busy database; the next renewal is still well inside the lease
+                    pass
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=renew, name=f'lease-{job.pk}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _store_outcome(job, claim):
+    """Save the job's outcome fields if ``claim`` still holds it; False when its lease was lost."""
+    return bool(claim.update(**{field: getattr(job, field) for field in OUTCOME_FIELDS}))
+
+
+def _run_failure_handler(job, error):
+    _, fail = TASKS.get(job.task, (None, None))
+    if fail is None:
+        return
+    try:
+        fail(error, **job.payload)
+    except Exception:
+        job.last_error += '\n\nFailure handler error:\n' + traceback.format_exc()
+        BackgroundJob.objects.filter(pk=job.pk).update(last_error=job.last_error)
+
+
+def run_job(job_id):
+    """Run a claimed job and record the outcome (succeeded, queued for retry, failed)."""
+    job = BackgroundJob.objects.get(pk=job_id)
+    claim = _held(job)
+    run, _ = TASKS.get(job.task, (None, None))
+    error = None
+    try:
+        if run is None:
+            raise ValueError(f'Unknown background task: {job.task}')
+        with _renewing_lease(job):
+            run(**job.payload)
+    except Exception as exception:
+        error = exception
+        job.last_error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+        if job.attempts < job.max_attempts and job.task in TASKS:
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+    else:
+        job.status = 'succeeded'
+        job.last_error = ''
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    if not _store_outcome(job, claim):
+        # The lease expired and the job was requeued; its current holder records the outcome
+        return 'lost'
+    if job.status == 'failed':
+        _run_failure_handler(job, error)
+    return job.status
+
+
+def run_pending(worker_id, limit=None):
+    """Run due jobs one at a time in this process until none are left (or ``limit`` ran)."""
+    ran = 0
+    while limit is None or ran < limit:
+        claimed = claim_jobs(worker_id, 1)
+        if not claimed:
+            break
+        run_job(claimed[0])
+        ran += 1
+    return ran
+
+
+def requeue_stale_jobs():
+    """Give jobs whose worker stopped renewing their lease back to the queue (or fail them)."""
+    timeout = lease_timeout()
+    stale = BackgroundJob.objects.filter(
+        status='running', locked_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+    requeued = 0
+    for job in stale:
+        # Renewed or requeued by someone else since it was read: leave it
+        claim = _held(job).filter(locked_at=job.locked_at)
+        job.last_error = f'Worker {job.locked_by} stopped renewing its lease for {timeout} seconds'
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = timezone.now()
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        job.locked_by = ''
+        job.locked_at = None
+        if not _store_outcome(job, claim):
+            continue
+        if job.status == 'failed':
+            _run_failure_handler(job, job.last_error)
+        requeued += 1
+    return requeued
+
+
+def next_job_due():
+    """When a pending job can next be run: the earliest queued run_after or lease expiry (None if none)."""
+    pending = BackgroundJob.objects.filter(status__in=('queued', 'running')).aggregate(
+        run_after=Min('run_after', filter=Q(status='queued')),
+        locked_at=Min('locked_at', filter=Q(status='running')),
+    )
+    times = [pending['run_after']]
+    if pending['locked_at'] is not None:
+        times.append(pending['locked_at'] + timedelta(seconds=lease_timeout()))
+    times = [time for time in times if time is not None]
+    return min(times) if times else None
+
+
+_inline = {'thread': None}
+_inline_wake = threading.Event()
+_inline_lock = threading.Lock()
+
+
+def _run_inline():
+    worker_id = f'{socket.gethostname()}:{os.getpid()}:inline'
+    try:
+        while True:
+            _inline_wake.clear()
+            requeue_stale_jobs()
+            run_pending(worker_id)
+            due = next_job_due()
+            with _inline_lock:
+                if due is None and not _inline_wake.is_set():
+                    _inline['thread'] = None
+                    return
+            # Sleep until the next retry or lease expiry; an enqueue wakes the thread sooner
+            wait = (due - timezone.now()).total_seconds() if due is not None else 0
+            _inline_wake.wait(max(wait, 1))
+    finally:
+        # This thread's own connections
+        connections.close_all()
+
+
+def start_inline_runner():
+    """Drain the queue in a thread of this process (a running drain is asked to go round again)."""
+    with _inline_lock:
+        _inline_wake.set()
+        thread = _inline['thread']
+        if thread is None or not thread.is_alive():
+            thread = _inline['thread'] = threading.Thread(target=_run_inline, name='background-jobs', daemon=True)
+            thread.start()
+
+
+def resume_inline_runner():
+    """Start the in-process runner when jobs are due or stale but no thread here is running them."""
+    if getattr(settings, 'BACKGROUND_WORKER', False):
+        return
+    with _inline_lock:
+        thread = _inline['thread']
+        if thread is not None and thread.is_alive():
+            return
+    due = next_job_due()
+    if due is not None and due <= timezone.now():
+        start_inline_runner()
+
+
+def job_status(job):
+    """JSON-ready summary of a job for the dashboard."""
+    error = job.last_error.strip().splitlines()[-1] if job.status == 'failed' and job.last_error.strip() else ''
+    return {
+        'id': job.id,
+        'task': job.task,
+        'label': TASK_LABELS.get(job.task, job.task),
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M'),
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M') if job.finished_at else None,
+        'error': error,
+    }
@@ -0,0 +1,43 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from skillora_app.models import StoredFile
+from skillora_app.storage_utils import BLOB_DIR, DedupFileSystemStorage, dedup_stats
+
+class Command(BaseCommand):
+    help = 'Move media files saved before deduplication into the content-addressed blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true', help='Only report deduplication statistics')
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            if not isinstance(default_storage, DedupFileSystemStorage):
+                raise CommandError('The default storage is not DedupFileSystemStorage (set MEDIA_DEDUP=True).')
+            linked = default_storage.link_missing()
+            adopted = self._adopt_legacy_files()
+            self.stdout.write(self.style.SUCCESS(
+                f'Moved {adopted} file(s) into the blob store and linked {linked} stored name(s).'
+            ))
+
+        stats = dedup_stats()
+        self.stdout.write(
+            f"{stats['files']} file(s) stored as {stats['blobs']} blob(s); "
+            f"{stats['duplicate_files']} duplicate(s), {stats['saved_bytes']} of {stats['logical_bytes']} bytes saved"
+            + (f" (ratio {stats['dedup_ratio']})" if stats['dedup_ratio'] else '')
+        )
+
+    def _adopt_legacy_files(self):
+        root = default_storage.location
+        adopted = 0
+        for directory, subdirectories, filenames in os.walk(root):
+            if directory == root and BLOB_DIR in subdirectories:
+                subdirectories.remove(BLOB_DIR)
+            names = [os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/') for filename in filenames]
+            known = set(StoredFile.objects.filter(name__in=names).values_list('name', flat=True))
+            for name in names:
+                if name not in known:
+                    default_storage.adopt(name)
+                    adopted += 1
+        return adopted
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from skillora_app.models import Payment
+from skillora_app.receipt_utils import receipt_data, store_receipt
+
+class Command(BaseCommand):
+    help = 'Render and store receipts for completed payments that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Payments fetched per query')
+
+    def handle(self, *args, **options):
+        payments = Payment.objects.filter(status='completed').select_related('user').prefetch_related('courses').order_by('id')
+        rendered = existing = 0
+        for payment in payments.iterator(chunk_size=options['batch_size']):
+            _, created = store_receipt(receipt_data(payment, payment.courses.all()))
+            if created:
+                rendered += 1
+            else:
+                existing += 1
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} receipt(s); {existing} already stored.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from skillora_app.enrollment_utils import rebuild_enrollment_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the enrollment index from Student/Course enrollments and active Enrollment rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report differences, do not write fixes')
+
+    def handle(self, *args, **options):
+        changes = rebuild_enrollment_index(commit=not options['dry_run'])
+        if not any(changes.values()):
+            self.stdout.write(self.style.SUCCESS('Enrollment index is up to date.'))
+            return
+
+        self.stdout.write(self.style.WARNING(
+            f"Index rows to create: {changes['created']}, update: {changes['updated']}, delete: {changes['deleted']}"
+        ))
+        if options['dry_run']:
+            self.stdout.write('Dry run: use without --dry-run to write the fixes')
+        else:
+            self.stdout.write(self.style.SUCCESS('Enrollment index rebuilt.'))
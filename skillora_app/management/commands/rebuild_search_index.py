@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from skillora_app.search_utils import rebuild_search_index, search_backend
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index and rewrite the documents of all jobs, internships and courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents written per batch')
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} document(s) ({search_backend()} search).'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from skillora_app.models import Skill
+from skillora_app.recommendation_utils import invalidate_recommendations
+from skillora_app.skill_utils import rebuild_skill_index
+
+class Command(BaseCommand):
+    help = 'Re-link courses, profiles and internships to normalized Skill rows from their skill text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows re-linked per batch')
+
+    def handle(self, *args, **options):
+        processed = rebuild_skill_index(batch_size=options['batch_size'])
+        # Matches compare skill ids, so re-linked skills can change them
+        invalidate_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Re-linked {processed} row(s) to {Skill.objects.count()} skill(s).'
+        ))
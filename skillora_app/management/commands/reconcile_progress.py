@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from skillora_app.progress_utils import rebuild_progress_counters
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized course/progress counters in bulk and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write fixes')
+        parser.add_argument('--verbose-drift', action='store_true', help='List every drifted row')
+
+    def handle(self, *args, **options):
+        commit = not options['dry_run']
+        report = rebuild_progress_counters(commit=commit)
+
+        self.stdout.write(f"Courses checked: {report['courses_checked']}")
+        self.stdout.write(f"Progress rows checked: {report['progress_checked']}")
+
+        drifted_courses = report['courses_drifted']
+        drifted_progress = report['progress_drifted']
+        if not drifted_courses and not drifted_progress:
+            self.stdout.write(self.style.SUCCESS('No drift found.'))
+            return
+
+        self.stdout.write(self.style.WARNING(
+            f"Drift found: {len(drifted_courses)} course(s), {len(drifted_progress)} progress row(s)"
+        ))
+        if options['verbose_drift']:
+            for row in drifted_courses:
+                self.stdout.write(
+                    f"Course {row['course_id']}: materials {row['materials'][0]} -> {row['materials'][1]}, "
+                    f"assignments {row['assignments'][0]} -> {row['assignments'][1]}"
+                )
+            for row in drifted_progress:
+                self.stdout.write(
+                    f"Progress {row['progress_id']}: viewed {row['materials_viewed'][0]} -> {row['materials_viewed'][1]}, "
+                    f"completed {row['assignments_completed'][0]} -> {row['assignments_completed'][1]}, "
+                    f"percentage {row['percentage'][0]} -> {row['percentage'][1]}"
+                )
+
+        if commit:
+            self.stdout.write(self.style.SUCCESS('Counters rebuilt.'))
+        else:
+            self.stdout.write('Dry run: use without --dry-run to write the fixes')
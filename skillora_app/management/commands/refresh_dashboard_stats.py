@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from skillora_app.stats_utils import refresh_dashboard_stats
+
+class Command(BaseCommand):
+    help = 'Rebuild the company dashboard snapshots (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', help='Only refresh this company id (repeatable)')
+
+    def handle(self, *args, **options):
+        refreshed = refresh_dashboard_stats(company_ids=options['company'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed dashboard stats for {refreshed} company(ies).'))
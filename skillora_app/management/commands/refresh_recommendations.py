@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from skillora_app.recommendation_utils import invalidate_recommendations, refresh_stale_recommendations
+
+class Command(BaseCommand):
+    help = 'Rebuild stale cached internship recommendations (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Mark every cached row stale first')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            invalidate_recommendations()
+        refreshed = refresh_stale_recommendations()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed recommendations for {refreshed} student(s).'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from skillora_app.stats_utils import refresh_teacher_stats
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed teacher stats (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teacher', type=int, action='append', help='Only refresh this teacher id (repeatable)')
+
+    def handle(self, *args, **options):
+        refreshed = refresh_teacher_stats(teacher_ids=options['teacher'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed stats for {refreshed} teacher(s).'))
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from skillora_app.job_utils import claim_jobs, requeue_stale_jobs, run_job, run_pending
+
+
+def _noop():
+    return os.getpid()
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (spreadsheet imports, document verification, reports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Jobs to run in parallel (worker processes)')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no jobs are due instead of polling')
+
+    def handle(self, *args, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        processes = max(1, options['processes'])
+        self.stdout.write(f'Worker {worker_id} started with {processes} process(es).')
+        try:
+            if processes == 1:
+                self._run_inline(worker_id, options)
+            else:
+                self._run_pool(worker_id, processes, options)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping worker.')
+
+    def _run_inline(self, worker_id, options):
+        while True:
+            requeue_stale_jobs()
+            ran = run_pending(worker_id)
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f'Ran {ran} job(s).'))
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['poll_interval'])
+
+    def _run_pool(self, worker_id, processes, options):
+        # Fork the workers before this process opens a database connection they could inherit
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            wait([pool.submit(_noop) for _ in range(processes)])
+            running = {}
+            while True:
+                requeue_stale_jobs()
+                for job_id in claim_jobs(worker_id, processes - len(running)):
+                    running[pool.submit(run_job, job_id)] = job_id
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as error:
+                        self.stderr.write(f'Job {job_id} crashed the worker process: {error}')
+                    else:
+                        self.stdout.write(f'Job {job_id}: {status}')
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_progress_counters(apps, schema_editor):
+    Course = apps.get_model('skillora_app', 'Course')
+    StudentProgress = apps.get_model('skillora_app', 'StudentProgress')
+
+    totals = {}
+    courses = []
+    for course in Course.objects.annotate(
+        actual_materials=Count('materials', filter=Q(materials__is_published=True), distinct=True),
+        actual_assignments=Count('assignments', filter=Q(assignments__is_published=True), distinct=True),
+    ).iterator(chunk_size=2000):
+        course.published_materials_count = course.actual_materials
+        course.published_assignments_count = course.actual_assignments
+        totals[course.id] = course.actual_materials + course.actual_assignments
+        courses.append(course)
+    Course.objects.bulk_update(courses, ['published_materials_count', 'published_assignments_count'], batch_size=500)
+
+    progress_rows = []
+    for progress in StudentProgress.objects.annotate(
+        actual_viewed=Count('materials_viewed', distinct=True),
+        actual_completed=Count('assignments_completed', distinct=True),
+    ).iterator(chunk_size=2000):
+        progress.materials_viewed_count = progress.actual_viewed
+        progress.assignments_completed_count = progress.actual_completed
+        total_items = totals.get(progress.course_id, 0)
+        completed_items = progress.actual_viewed + progress.actual_completed
+        progress.progress_percentage = round(completed_items * 100 / total_items, 2) if total_items else 0
+        progress_rows.append(progress)
+    StudentProgress.objects.bulk_update(
+        progress_rows,
+        ['materials_viewed_count', 'assignments_completed_count', 'progress_percentage'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0016_certificate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='published_assignments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='published_materials_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='assignments_completed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='materials_viewed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_progress_counters, migrations.RunPython.noop),
+    ]
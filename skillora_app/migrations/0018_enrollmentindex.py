@@ -0,0 +1,58 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_enrollment_index(apps, schema_editor):
+    Student = apps.get_model('skillora_app', 'Student')
+    Course = apps.get_model('skillora_app', 'Course')
+    Enrollment = apps.get_model('skillora_app', 'Enrollment')
+    EnrollmentIndex = apps.get_model('skillora_app', 'EnrollmentIndex')
+
+    sources = (
+        ('via_student_courses', Student.courses_enrolled.through.objects.values_list('student_id', 'course_id')),
+        ('via_course_students', Course.students_enrolled.through.objects.values_list('student_id', 'course_id')),
+        ('via_enrollment', Enrollment.objects.filter(
+            is_active=True, user__student__isnull=False
+        ).values_list('user__student', 'course_id')),
+    )
+    flags_by_pair = {}
+    for field, pairs in sources:
+        for pair in pairs.iterator(chunk_size=2000):
+            flags_by_pair.setdefault(pair, {})[field] = True
+
+    EnrollmentIndex.objects.bulk_create(
+        [
+            EnrollmentIndex(student_id=student_id, course_id=course_id, **flags)
+            for (student_id, course_id), flags in flags_by_pair.items()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0017_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('via_student_courses', models.BooleanField(default=False)),
+                ('via_course_students', models.BooleanField(default=False)),
+                ('via_enrollment', models.BooleanField(default=False)),
+                ('enrolled_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_index', to='skillora_app.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_index', to='skillora_app.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'student'], name='skillora_ap_course__d66589_idx')],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_enrollment_index, migrations.RunPython.noop),
+    ]
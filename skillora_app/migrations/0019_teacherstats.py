@@ -0,0 +1,25 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0018_enrollmentindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_students', models.IntegerField(default=0)),
+                ('total_courses', models.IntegerField(default=0)),
+                ('upcoming_classes', models.IntegerField(default=0)),
+                ('student_progress_avg', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='skillora_app.teacher')),
+            ],
+        ),
+    ]
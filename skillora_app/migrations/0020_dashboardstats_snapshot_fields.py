@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0019_teacherstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardstats',
+            name='students_with_profiles',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dashboardstats',
+            name='total_users',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dashboardstats',
+            name='active_users',
+            field=models.IntegerField(default=0),
+        ),
+    ]
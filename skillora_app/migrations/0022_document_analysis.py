@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0021_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiverification',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='DocumentAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('file_type', models.CharField(max_length=10)),
+                ('text', models.TextField(blank=True)),
+                ('extracted', models.JSONField(blank=True, default=dict)),
+                ('letterhead_hash', models.CharField(blank=True, db_index=True, max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
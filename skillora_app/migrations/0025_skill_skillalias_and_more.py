@@ -0,0 +1,125 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Common alternative spellings -> canonical skill name
+SEED_ALIASES = {
+    'javascript': ['js', 'java script', 'ecmascript', 'es6'],
+    'typescript': ['ts'],
+    'python': ['py', 'python3', 'python 3'],
+    'react': ['reactjs', 'react.js', 'react js'],
+    'node.js': ['node', 'nodejs', 'node js'],
+    'vue': ['vuejs', 'vue.js'],
+    'angular': ['angularjs', 'angular.js'],
+    'html': ['html5'],
+    'css': ['css3'],
+    'c++': ['cpp', 'c plus plus'],
+    'c#': ['csharp', 'c sharp'],
+    'go': ['golang'],
+    'postgresql': ['postgres', 'psql'],
+    'mongodb': ['mongo'],
+    'kubernetes': ['k8s'],
+    'machine learning': ['ml'],
+    'deep learning': ['dl'],
+    'artificial intelligence': ['ai'],
+    'natural language processing': ['nlp'],
+    'scikit-learn': ['sklearn', 'scikit learn'],
+    'tensorflow': ['tf'],
+    'amazon web services': ['aws'],
+    'google cloud platform': ['gcp', 'google cloud'],
+    'microsoft azure': ['azure'],
+    'ui/ux design': ['ui/ux', 'ux', 'ui design', 'ux design'],
+    'data structures and algorithms': ['dsa', 'data structures', 'algorithms'],
+    'microsoft excel': ['excel', 'ms excel'],
+}
+
+SKILL_FIELDS = [
+    ('course', 'skills', 'skill_tags'),
+    ('userprofile', 'skills', 'skill_tags'),
+    ('internship', 'required_skills', 'required_skill_tags'),
+    ('studentprofile', 'skills', 'skill_tags'),
+]
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split()).strip(' .,;:')[:100]
+
+
+def backfill_skills(apps, schema_editor):
+    Skill = apps.get_model('skillora_app', 'Skill')
+    SkillAlias = apps.get_model('skillora_app', 'SkillAlias')
+
+    aliases = {}
+    for name, spellings in SEED_ALIASES.items():
+        skill = Skill.objects.create(name=name, display_name=name)
+        for spelling in spellings:
+            aliases[spelling] = name
+            SkillAlias.objects.create(alias=spelling, skill=skill)
+    skills = {skill.name: skill.pk for skill in Skill.objects.all()}
+
+    for model_name, text_field, m2m_field in SKILL_FIELDS:
+        model = apps.get_model('skillora_app', model_name)
+        through = getattr(model, m2m_field).through
+        links = set()
+        for pk, text in model.objects.values_list('pk', text_field).iterator(chunk_size=2000):
+            for item in (text or '').split(','):
+                key = _normalize(item)
+                if not key:
+                    continue
+                name = aliases.get(key, key)
+                if name not in skills:
+                    skills[name] = Skill.objects.create(name=name, display_name=' '.join(item.split())[:100]).pk
+                links.add((pk, skills[name]))
+        through.objects.bulk_create(
+            [through(**{f'{model_name}_id': pk, 'skill_id': skill_id}) for pk, skill_id in links], batch_size=2000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0024_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('display_name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SkillAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100, unique=True)),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='skillora_app.skill')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, related_name='courses', to='skillora_app.skill'),
+        ),
+        migrations.AddField(
+            model_name='internship',
+            name='required_skill_tags',
+            field=models.ManyToManyField(blank=True, related_name='internships', to='skillora_app.skill'),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, related_name='student_profiles', to='skillora_app.skill'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, related_name='user_profiles', to='skillora_app.skill'),
+        ),
+        migrations.RunPython(backfill_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0025_skill_skillalias_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('internship_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('is_stale', models.BooleanField(db_index=True, default=False)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation_cache', to='skillora_app.student')),
+            ],
+        ),
+    ]
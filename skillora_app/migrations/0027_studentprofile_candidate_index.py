@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0026_recommendationcache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentprofile',
+            index=models.Index(fields=['is_placement_ready', 'department', 'cgpa'], name='skillora_ap_is_plac_37a3da_idx'),
+        ),
+    ]
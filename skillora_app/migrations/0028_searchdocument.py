@@ -0,0 +1,125 @@
+from django.db import migrations, models
+
+DOCUMENT_TABLE = 'skillora_app_searchdocument'
+FTS_TABLE = 'skillora_app_searchdocument_fts'
+
+SQLITE_INDEX_SQL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"title, tags, body, content='{DOCUMENT_TABLE}', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, body) VALUES ('delete', old.id, old.title, old.tags, old.body); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, body) VALUES ('delete', old.id, old.title, old.tags, old.body); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body); END",
+]
+SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRESQL_INDEX_SQL = [
+    f"ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(body, '')), 'D')) STORED",
+    f"CREATE INDEX {DOCUMENT_TABLE}_vector_gin ON {DOCUMENT_TABLE} USING gin (search_vector)",
+]
+POSTGRESQL_DROP_SQL = [
+    f"DROP INDEX IF EXISTS {DOCUMENT_TABLE}_vector_gin",
+    f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.skillora_fts5_probe USING fts5(probe)")
+    except Exception:
+        return False
+    cursor.execute("DROP TABLE temp.skillora_fts5_probe")
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            statements = SQLITE_INDEX_SQL if _fts5_available(cursor) else []
+        elif connection.vendor == 'postgresql':
+            statements = POSTGRESQL_INDEX_SQL
+        else:
+            statements = []
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    statements = {'sqlite': SQLITE_DROP_SQL, 'postgresql': POSTGRESQL_DROP_SQL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def index_existing(apps, schema_editor):
+    """Write the documents of the existing jobs, published internships and courses (the index fills itself)"""
+    Job = apps.get_model('skillora_app', 'Job')
+    Internship = apps.get_model('skillora_app', 'Internship')
+    Course = apps.get_model('skillora_app', 'Course')
+    SearchDocument = apps.get_model('skillora_app', 'SearchDocument')
+
+    documents = []
+    for job in Job.objects.all():
+        documents.append(SearchDocument(
+            kind='job', object_id=job.pk, title=job.title[:255],
+            tags=_join(job.company, job.location, job.job_type), body=_join(job.description, job.requirements),
+        ))
+    internships = Internship.objects.filter(status='published').select_related('company').prefetch_related('required_skill_tags')
+    for internship in internships:
+        skill_names = ', '.join(skill.name for skill in internship.required_skill_tags.all())
+        documents.append(SearchDocument(
+            kind='internship', object_id=internship.pk, title=internship.title[:255],
+            tags=_join(internship.company.company_name, internship.company.industry, internship.location,
+                       internship.required_skills, skill_names),
+            body=_join(internship.description, internship.requirements),
+        ))
+    for course in Course.objects.all():
+        documents.append(SearchDocument(
+            kind='course', object_id=course.pk, title=course.title[:255],
+            tags=_join(course.category, course.level, course.skills),
+            body=_join(course.description, course.syllabus, course.additional_info),
+        ))
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0027_studentprofile_candidate_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('job', 'Job'), ('internship', 'Internship'), ('course', 'Course')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('tags', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0028_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='published_materials_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='published_assignments_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0029_course_counters_not_editable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='excelupload',
+            name='resume_row',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='excelupload',
+            name='error_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
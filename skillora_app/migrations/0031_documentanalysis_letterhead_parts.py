@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+PART_BITS = 16
+PARTS = 4
+
+
+def split_letterheads(apps, schema_editor):
+    DocumentAnalysis = apps.get_model('skillora_app', 'DocumentAnalysis')
+    mask = (1 << PART_BITS) - 1
+    batch = []
+    for analysis in DocumentAnalysis.objects.exclude(letterhead_hash='').only('letterhead_hash').iterator():
+        value = int(analysis.letterhead_hash, 16)
+        for index in range(PARTS):
+            setattr(analysis, f'letterhead_part{index}', value >> (PART_BITS * (PARTS - 1 - index)) & mask)
+        batch.append(analysis)
+    DocumentAnalysis.objects.bulk_update(
+        batch, [f'letterhead_part{index}' for index in range(PARTS)], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillora_app', '0030_excelupload_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentanalysis',
+            name='letterhead_part0',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentanalysis',
+            name='letterhead_part1',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentanalysis',
+            name='letterhead_part2',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentanalysis',
+            name='letterhead_part3',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(split_letterheads, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,26 @@ USER_ROLES = [
     ('company', 'Company'),
 ]
 
+class Skill(models.Model):
+    """A canonical skill; the comma-separated skill fields are linked to these on save (see skill_utils)"""
+    name = models.CharField(max_length=100, unique=True)  # normalized key, e.g. "machine learning"
+    display_name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.display_name
+    
+    class Meta:
+        ordering = ['name']
+
+class SkillAlias(models.Model):
+    """Another spelling of a skill (e.g. "js" for JavaScript), matched after normalization"""
+    alias = models.CharField(max_length=100, unique=True)
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='aliases')
+    
+    def __str__(self):
+        return f"{self.alias} -> {self.skill.name}"
+
 class Course(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -20,6 +40,7 @@ class Course(models.Model):
     level = models.CharField(max_length=50)
     # New fields for detailed course information
     skills = models.TextField(blank=True, help_text="Comma-separated list of skills (e.g., HTML, CSS, JavaScript)")
+    skill_tags = models.ManyToManyField(Skill, blank=True, related_name='courses')
     syllabus = models.TextField(blank=True, help_text="Course syllabus topics (one per line or JSON format)")
     lectures = models.IntegerField(default=0)
     language = models.CharField(max_length=50, default='English')
@@ -28,6 +49,10 @@ class Course(models.Model):
     additional_info = models.TextField(blank=True, help_text="Any additional details about the course")
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0, help_text="Course rating out of 5.0")
     learners_count = models.IntegerField(default=0, help_text="Number of learners enrolled")
+    # Denormalized counters maintained by signals (see progress_utils); never
+    # written by a full save of a loaded course, see progress_utils.save_course_details
+    published_materials_count = models.IntegerField(default=0, editable=False)
+    published_assignments_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     students_enrolled = models.ManyToManyField('Student', blank=True, related_name='enrolled_courses')
@@ -203,6 +228,7 @@ class UserProfile(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
     skills = models.TextField(blank=True)
+    skill_tags = models.ManyToManyField(Skill, blank=True, related_name='user_profiles')
     experience = models.TextField(blank=True)
     education = models.TextField(blank=True)
 
@@ -219,6 +245,29 @@ class Student(models.Model):
     def __str__(self):
         return f"Student: {self.user.username}"
 
+class EnrollmentIndex(models.Model):
+    """One row per enrolled (student, course) pair, whichever way the enrollment was recorded.
+
+    Students can be enrolled through Student.courses_enrolled, Course.students_enrolled
+    or an active Enrollment; the flags record which of those currently apply and the
+    row is removed once none do. Maintained by signals (see enrollment_utils).
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='enrollment_index')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollment_index')
+    via_student_courses = models.BooleanField(default=False)
+    via_course_students = models.BooleanField(default=False)
+    via_enrollment = models.BooleanField(default=False)
+    enrolled_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['course', 'student']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.user.username} enrolled in {self.course.title}"
+
 class Teacher(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     specialization = models.CharField(max_length=100, default="Not specified")
@@ -236,16 +285,22 @@ class Teacher(models.Model):
         return f"Teacher: {self.user.username}"
     
     def update_stats(self):
-        """Update teacher statistics"""
-        # Compute stats based on courses where this teacher is the instructor
-        instructor_courses = Course.objects.filter(instructor=self)
-        self.total_courses = instructor_courses.count()
-        # Calculate total students across all instructor courses
-        total_students = 0
-        for course in instructor_courses:
-            total_students += course.students_enrolled.count() if hasattr(course, 'students_enrolled') else 0
-        self.total_students = total_students
-        self.save()
+        """Refresh this teacher's precomputed stats now and copy them onto the instance"""
+        from .stats_utils import load_teacher_stats, refresh_teacher_stats
+        refresh_teacher_stats(teacher_ids=[self.pk])
+        return load_teacher_stats(self)
+
+class TeacherStats(models.Model):
+    """Precomputed teacher dashboard numbers, refreshed on events and by refresh_teacher_stats"""
+    teacher = models.OneToOneField(Teacher, on_delete=models.CASCADE, related_name='stats')
+    total_students = models.IntegerField(default=0)
+    total_courses = models.IntegerField(default=0)
+    upcoming_classes = models.IntegerField(default=0)
+    student_progress_avg = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.teacher.user.username} - Teacher Stats"
 
 class Company(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -282,6 +337,7 @@ class Internship(models.Model):
     description = models.TextField()
     requirements = models.TextField()
     required_skills = models.TextField(help_text="Comma-separated skills")
+    required_skill_tags = models.ManyToManyField(Skill, blank=True, related_name='internships')
     department_preference = models.CharField(max_length=100, blank=True)
     location = models.CharField(max_length=200)
     duration_months = models.IntegerField(help_text="Duration in months")
@@ -350,6 +406,7 @@ class StudentProfile(models.Model):
     resume = models.FileField(upload_to='resumes/', null=True, blank=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
     skills = models.TextField(help_text="Comma-separated skills", blank=True)
+    skill_tags = models.ManyToManyField(Skill, blank=True, related_name='student_profiles')
     cgpa = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
     department = models.CharField(max_length=100, blank=True)
     year_of_study = models.IntegerField(choices=[(i, f"Year {i}") for i in range(1, 5)], null=True, blank=True)
@@ -359,6 +416,13 @@ class StudentProfile(models.Model):
     internship_preferences = models.CharField(max_length=20, choices=INTERNSHIP_TYPES, default='internship')
     is_placement_ready = models.BooleanField(default=False)
     placement_preference_salary_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Candidate ranking filters placement-ready profiles by department and CGPA
+            models.Index(fields=['is_placement_ready', 'department', 'cgpa']),
+        ]
     
     def __str__(self):
         return f"Profile: {self.student.user.username}"
@@ -372,6 +436,24 @@ class StudentProfile(models.Model):
     def get_preferred_industries_list(self):
         return [ind.strip() for ind in self.preferred_industries.split(',') if ind.strip()]
 
+class RecommendationCache(models.Model):
+    """A student's top internship matches, best first, kept by recommendation_utils.
+
+    Marked stale (and its version bumped) when the student's profile or applications
+    change or when a published internship changes; rebuilt on the next read or by the
+    refresh_recommendations job. expires_at is the earliest deadline among the matches.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='recommendation_cache')
+    internship_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    is_stale = models.BooleanField(default=False, db_index=True)
+    version = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.student.user.username} - Recommendations"
+
 FEEDBACK_RATING = [
     (1, 'Poor'),
     (2, 'Below Average'),
@@ -615,6 +697,10 @@ class StudentProgress(models.Model):
     materials_viewed = models.ManyToManyField(CourseMaterial, blank=True)
     assignments_completed = models.ManyToManyField(Assignment, blank=True)
     
+    # Denormalized counters maintained by signals (see progress_utils)
+    materials_viewed_count = models.IntegerField(default=0)
+    assignments_completed_count = models.IntegerField(default=0)
+    
     # Overall progress percentage
     progress_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     
@@ -629,22 +715,10 @@ class StudentProgress(models.Model):
         return f"{self.student.user.username} - {self.course.title} ({self.progress_percentage}%)"
     
     def update_progress(self):
-        """Calculate and update progress percentage"""
-        total_materials = self.course.materials.filter(is_published=True).count()
-        total_assignments = self.course.assignments.filter(is_published=True).count()
-        
-        viewed_materials = self.materials_viewed.count()
-        completed_assignments = self.assignments_completed.count()
-        
-        total_items = total_materials + total_assignments
-        completed_items = viewed_materials + completed_assignments
-        
-        if total_items > 0:
-            self.progress_percentage = (completed_items / total_items) * 100
-        else:
-            self.progress_percentage = 0
-        
-        self.save()
+        """Recount the progress counters from scratch and return the percentage"""
+        from .progress_utils import rebuild_progress_counters
+        rebuild_progress_counters(progress=StudentProgress.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['materials_viewed_count', 'assignments_completed_count', 'progress_percentage'])
         return self.progress_percentage
     
     class Meta:
@@ -719,6 +793,9 @@ class ExcelUpload(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploaded')
     processed_records = models.IntegerField(default=0)
     total_records = models.IntegerField(default=0)
+    # Import progress (see ingestion_utils): last source row committed and all row errors, logged or not
+    resume_row = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
     error_log = models.TextField(blank=True)
     report_file = models.FileField(upload_to='reports/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -753,6 +830,7 @@ class AIVerification(models.Model):
     confidence_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     verification_result = models.TextField(blank=True)
     ai_analysis = models.JSONField(default=dict, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
     
@@ -762,6 +840,23 @@ class AIVerification(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class DocumentAnalysis(models.Model):
+    """Content extracted from a verification document, shared by identical uploads (see verification_utils)"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    file_type = models.CharField(max_length=10)
+    text = models.TextField(blank=True)
+    extracted = models.JSONField(default=dict, blank=True)
+    letterhead_hash = models.CharField(max_length=16, blank=True, db_index=True)
+    # letterhead_hash split into 16-bit parts, indexed for near-duplicate lookups
+    letterhead_part0 = models.IntegerField(null=True, blank=True, db_index=True)
+    letterhead_part1 = models.IntegerField(null=True, blank=True, db_index=True)
+    letterhead_part2 = models.IntegerField(null=True, blank=True, db_index=True)
+    letterhead_part3 = models.IntegerField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.file_type} document {self.content_hash[:12]}"
+
 class Report(models.Model):
     REPORT_TYPES = [
         ('placement_summary', 'Placement Summary'),
@@ -785,6 +880,55 @@ class Report(models.Model):
     class Meta:
         ordering = ['-generated_at']
 
+class BackgroundJob(models.Model):
+    """A unit of work for ``manage.py run_worker`` (see job_utils)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='background_jobs', null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+class MediaBlob(models.Model):
+    """One stored copy of uploaded file content, shared by every StoredFile with the same bytes (see storage_utils)"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} reference(s))"
+
+class StoredFile(models.Model):
+    """A file name handed out by the media storage, pointing at its content blob"""
+    name = models.CharField(max_length=255, unique=True)
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, related_name='files')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 # Dashboard Models
 
 class PlacementRecord(models.Model):
@@ -802,6 +946,7 @@ class PlacementRecord(models.Model):
         ('rejected', 'Rejected')
     ], default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.student.user.get_full_name()} - {self.job_title}"
@@ -825,6 +970,9 @@ class DashboardStats(models.Model):
     iqac_pending = models.IntegerField(default=0)
     iqac_rejected = models.IntegerField(default=0)
     partner_companies = models.IntegerField(default=0)
+    students_with_profiles = models.IntegerField(default=0)
+    total_users = models.IntegerField(default=0)
+    active_users = models.IntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
     
     def __str__(self):
@@ -841,3 +989,32 @@ class DepartmentStats(models.Model):
     
     def __str__(self):
         return f"{self.company.company_name} - {self.department_name} ({self.batch_year})"
+
+SEARCH_KINDS = [
+    ('job', 'Job'),
+    ('internship', 'Internship'),
+    ('course', 'Course'),
+]
+
+class SearchDocument(models.Model):
+    """The searchable text of a job, internship or course, indexed by the database (see search_utils)"""
+    kind = models.CharField(max_length=20, choices=SEARCH_KINDS)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=255)
+    tags = models.TextField(blank=True)  # company, skills, category, location
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+class AutocompleteVersion(models.Model):
+    """Single row counting changes to the autocomplete sources, so every process sees them (see autocomplete_utils)"""
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Autocomplete version {self.version}"
@@ -0,0 +1,180 @@
+"""
+Keyset (cursor) pagination for the JSON list endpoints
+
+Pages are cut with ``WHERE (sort, id) > (last sort value, last id)`` instead of
+OFFSET, so every page costs the same however deep the client scrolls and rows
+inserted meanwhile do not shift the pages. Rows are read with ``.values()``
+limited to the columns the client asked for (``fields=``). Query parameters:
+
+    sort    a sortable column, prefixed with ``-`` for descending
+    limit   page size (1..MAX_PAGE_SIZE)
+    cursor  ``next_cursor`` from the previous page
+    fields  comma-separated columns to return (``id`` is always included)
+    count   ``exact`` (default), ``estimate`` or ``none``
+
+export_rows() walks the whole result with the same sort and columns through
+``QuerySet.iterator()`` for streaming exports.
+"""
+
+import base64
+import binascii
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+COUNT_MODES = ('exact', 'estimate', 'none')
+# Without planner statistics an estimate is an exact count up to this many rows
+ESTIMATE_COUNT_LIMIT = 10000
+EXPORT_CHUNK_SIZE = 2000
+
+
+class PageParamError(ValueError):
+    """An invalid pagination parameter; the endpoints answer it with a 400."""
+
+
+def column(path, transform=None):
+    """A column read from one ``.values()`` path, optionally transformed."""
+    if transform is None:
+        return (path,), lambda row: row[path]
+    return (path,), lambda row: transform(row[path])
+
+
+def _encode_cursor(sort, value, pk):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    elif value is not None and not isinstance(value, (int, float, str)):
+        value = str(value)
+    raw = json.dumps([sort, value, pk], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor, sort):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, pk = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise PageParamError('Invalid cursor')
+    if cursor_sort != sort:
+        raise PageParamError('Cursor does not match the requested sort')
+    return value, pk
+
+
+def _page_size(value):
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise PageParamError('limit must be a number')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def count_rows(queryset, mode):
+    """Return (count or None, exact) for the given count mode."""
+    if mode == 'none':
+        return None, False
+    if mode == 'exact':
+        return queryset.count(), True
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+    total = queryset[:ESTIMATE_COUNT_LIMIT + 1].count()
+    return min(total, ESTIMATE_COUNT_LIMIT), total <= ESTIMATE_COUNT_LIMIT
+
+
+def _list_options(params, sorts, default_sort, columns):
+    """Validate sort= and fields=; returns (sort, sort field, descending, fields, values paths)."""
+    sort = params.get('sort') or default_sort
+    descending = sort.startswith('-')
+    sort_name = sort.lstrip('-')
+    if sort_name not in sorts:
+        raise PageParamError(f"Unknown sort '{sort_name}'. Choose from: {', '.join(sorts)}")
+    sort_field = sorts[sort_name]
+
+    requested = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in requested if name not in columns]
+    if unknown:
+        raise PageParamError(f"Unknown fields: {', '.join(unknown)}")
+    fields = ['id'] + [name for name in (requested or columns) if name != 'id']
+
+    paths = {'pk', sort_field}
+    for name in fields:
+        paths.update(columns[name][0])
+    return sort, sort_field, descending, fields, paths
+
+
+def _ordered(queryset, sort_field, descending):
+    prefix = '-' if descending else ''
+    return queryset.order_by(f'{prefix}{sort_field}', f'{prefix}pk')
+
+
+def keyset_page(queryset, params, sorts, default_sort, columns):
+    """
+    Return one page of ``queryset`` as a dict with ``results``, ``next_cursor``,
+    ``has_more``, ``total_count``, ``total_count_exact``, ``sort`` and ``fields``.
+
+    ``sorts`` maps public sort names to non-null model fields; ``columns`` maps
+    public column names to ``(values paths, row formatter)`` (see column()).
+    Raises PageParamError for invalid parameters.
+    """
+    sort, sort_field, descending, fields, paths = _list_options(params, sorts, default_sort, columns)
+
+    count_mode = params.get('count') or 'exact'
+    if count_mode not in COUNT_MODES:
+        raise PageParamError(f"count must be one of: {', '.join(COUNT_MODES)}")
+    limit = _page_size(params.get('limit'))
+
+    total_count, total_exact = count_rows(queryset, count_mode)
+
+    cursor = params.get('cursor')
+    if cursor:
+        value, pk = _decode_cursor(cursor, sort)
+        after = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{sort_field}__{after}': value}) | Q(**{sort_field: value, f'pk__{after}': pk})
+        )
+
+    rows = list(_ordered(queryset, sort_field, descending).values(*paths)[:limit + 1])
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_cursor(sort, last[sort_field], last['pk'])
+
+    return {
+        'results': [{name: columns[name][1](row) for name in fields} for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'total_count': total_count,
+        'total_count_exact': total_exact,
+        'sort': sort,
+        'fields': fields,
+    }
+
+
+def export_rows(queryset, params, sorts, default_sort, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Every row of ``queryset`` formatted like keyset_page() results, as an
+    iterator reading ``chunk_size`` rows at a time. Parameters are validated
+    here (PageParamError), before any row is produced.
+    """
+    _, sort_field, descending, fields, paths = _list_options(params, sorts, default_sort, columns)
+    rows = _ordered(queryset, sort_field, descending).values(*paths)
+
+    def generate():
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield {name: columns[name][1](row) for name in fields}
+
+    return generate()
@@ -0,0 +1,305 @@
+"""
+Payment ledger queries shared by the teacher payment pages
+
+A teacher's ledger is every Enrollment with a payment in one of their courses.
+Totals, status counts, monthly and per-course earnings are computed in the
+database with one query per aggregate family and returned as Decimals. When a
+teacher has no payments yet the pages fall back to a small demo ledger.
+
+Ledgers longer than settings.LEDGER_PDF_INLINE_ROWS are too slow to draw as a
+PDF within a request; the background worker renders those into media storage
+(save_ledger_pdf) and the teacher downloads the file once it is ready.
+"""
+
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Enrollment, Payment
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+ZERO = Decimal('0.00')
+
+STATUS_LABELS = dict(Payment.PAYMENT_STATUS)
+
+PDF_ROWS_FIRST_PAGE = 22
+PDF_ROWS_PER_PAGE = 34
+LEDGER_EXPORT_DIR = 'exports'
+
+COMPLETED = Q(payment__status='completed')
+PENDING = Q(payment__status='pending')
+
+SAMPLE_LEDGER = [
+    {'id': 1, 'payment_id': 'PAY001', 'course': 'React for Beginners', 'student': 'John Doe', 'amount': Decimal('99.99'), 'created_at': datetime(2024, 1, 15), 'status': 'Completed', 'status_code': 'completed'},
+    {'id': 2, 'payment_id': 'PAY002', 'course': 'JavaScript Essentials', 'student': 'Jane Smith', 'amount': Decimal('79.99'), 'created_at': datetime(2024, 1, 14), 'status': 'Completed', 'status_code': 'completed'},
+    {'id': 3, 'payment_id': 'PAY003', 'course': 'CSS for Styling', 'student': 'Mike Johnson', 'amount': Decimal('59.99'), 'created_at': datetime(2024, 1, 13), 'status': 'Pending', 'status_code': 'pending'},
+]
+
+
+def _money(value):
+    """Quantize a money amount to cents (SQLite returns sums with float noise)."""
+    return Decimal(value or 0).quantize(ZERO)
+
+
+def _money_sum(condition):
+    return Coalesce(
+        Sum('payment__amount', filter=condition),
+        Value(ZERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def teacher_ledger(teacher):
+    """Enrollments with a payment in the teacher's courses."""
+    return Enrollment.objects.filter(course__instructor=teacher, payment__isnull=False)
+
+
+def iter_ledger_rows(teacher, chunk_size=2000):
+    """Yield the ledger as display rows, newest first, streaming from the database."""
+    rows = teacher_ledger(teacher).order_by('-payment__created_at', '-id').values_list(
+        'payment_id', 'payment__payment_id', 'course__title', 'user__first_name', 'user__last_name',
+        'user__username', 'payment__amount', 'payment__created_at', 'payment__status',
+    )
+    for (payment_pk, payment_id, course, first_name, last_name, username,
+         amount, created_at, status) in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'id': payment_pk,
+            'payment_id': payment_id,
+            'course': course,
+            'student': f"{first_name} {last_name}".strip() or username,
+            'amount': amount,
+            'created_at': created_at,
+            'status': STATUS_LABELS.get(status, status),
+            'status_code': status,
+        }
+
+
+def ledger_entries(teacher):
+    """The ledger as a list of display rows, newest first, in a single query."""
+    return list(iter_ledger_rows(teacher))
+
+
+def ledger_summary(teacher, now=None):
+    """Totals and counts by status, this month and the last 30 days, in one aggregate query."""
+    now = now or timezone.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    this_month = Q(payment__created_at__gte=month_start)
+    summary = teacher_ledger(teacher).aggregate(
+        total_earnings=_money_sum(COMPLETED),
+        completed_count=Count('id', filter=COMPLETED),
+        pending_count=Count('id', filter=PENDING),
+        this_month_count=Count('id', filter=this_month),
+        this_month_earnings=_money_sum(COMPLETED & this_month),
+        recent_earnings=_money_sum(COMPLETED & Q(payment__created_at__gte=now - timedelta(days=30))),
+    )
+    for key in ('total_earnings', 'this_month_earnings', 'recent_earnings'):
+        summary[key] = _money(summary[key])
+    return summary
+
+
+def monthly_earnings(teacher):
+    """Completed earnings per calendar month as [(month start, total)], oldest first."""
+    rows = teacher_ledger(teacher).filter(COMPLETED).annotate(
+        month=TruncMonth('payment__created_at')
+    ).values('month').annotate(total=Sum('payment__amount')).order_by('month')
+    return [(row['month'], _money(row['total'])) for row in rows]
+
+
+def course_earnings(teacher):
+    """Completed earnings per course title, highest first."""
+    rows = teacher_ledger(teacher).filter(COMPLETED).values('course__title').annotate(
+        total=Sum('payment__amount')
+    ).order_by('-total', 'course__title')
+    return {row['course__title']: _money(row['total']) for row in rows}
+
+
+def earnings_by_month_name(monthly):
+    """Fold [(month, total)] into {month name: total} as the templates chart it."""
+    by_name = {}
+    for month, total in monthly:
+        name = MONTH_NAMES[month.month - 1]
+        by_name[name] = by_name.get(name, ZERO) + total
+    return by_name
+
+
+def _sample_report(now):
+    completed = [entry for entry in SAMPLE_LEDGER if entry['status_code'] == 'completed']
+    this_month = [entry for entry in SAMPLE_LEDGER
+                  if (entry['created_at'].year, entry['created_at'].month) == (now.year, now.month)]
+    monthly, by_course = {}, {}
+    for entry in completed:
+        month = entry['created_at'].replace(day=1)
+        monthly[month] = monthly.get(month, ZERO) + entry['amount']
+        by_course[entry['course']] = by_course.get(entry['course'], ZERO) + entry['amount']
+    recent_since = (now - timedelta(days=30)).replace(tzinfo=None)
+    return {
+        'entries': SAMPLE_LEDGER,
+        'summary': {
+            'total_earnings': sum((entry['amount'] for entry in completed), ZERO),
+            'completed_count': len(completed),
+            'pending_count': sum(1 for entry in SAMPLE_LEDGER if entry['status_code'] == 'pending'),
+            'this_month_count': len(this_month),
+            'this_month_earnings': sum((entry['amount'] for entry in this_month if entry['status_code'] == 'completed'), ZERO),
+            'recent_earnings': sum((entry['amount'] for entry in completed if entry['created_at'] >= recent_since), ZERO),
+        },
+        'monthly': sorted(monthly.items()),
+        'by_course': by_course,
+        'is_sample': True,
+    }
+
+
+def payment_report(teacher, include_breakdowns=True):
+    """
+    Everything the payment pages show: ``entries``, ``summary``, ``monthly`` and
+    ``by_course``. Falls back to the demo ledger when the teacher has no payments.
+    """
+    now = timezone.now()
+    entries = ledger_entries(teacher)
+    if not entries:
+        return _sample_report(now)
+    return {
+        'entries': entries,
+        'summary': ledger_summary(teacher, now=now),
+        'monthly': monthly_earnings(teacher) if include_breakdowns else [],
+        'by_course': course_earnings(teacher) if include_breakdowns else {},
+        'is_sample': False,
+    }
+
+
+def ledger_export(teacher):
+    """Return (summary, row iterator) for exports; the demo ledger if there are no payments."""
+    if not teacher_ledger(teacher).exists():
+        report = _sample_report(timezone.now())
+        return report['summary'], iter(report['entries'])
+    return ledger_summary(teacher), iter_ledger_rows(teacher)
+
+
+def _chunks(rows, first_size, size):
+    chunk, limit = [], first_size
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == limit:
+            yield chunk
+            chunk, limit = [], size
+    if chunk:
+        yield chunk
+
+
+def write_ledger_pdf(fileobj, teacher, summary, rows):
+    """
+    Draw the payment history PDF into ``fileobj`` one page at a time.
+
+    Each page's table is built from the next chunk of ``rows`` and drawn
+    straight onto the canvas, so only a page worth of rows is held at once.
+    Requires reportlab (ImportError otherwise).
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Paragraph, Table, TableStyle
+
+    page_width, page_height = letter
+    margin = inch
+    frame_width = page_width - 2 * margin
+    pdf = canvas.Canvas(fileobj, pagesize=letter)
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#fb873f'),
+        spaceAfter=30,
+    )
+    payments_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ])
+
+    def draw(flowable, top):
+        _, height = flowable.wrapOn(pdf, frame_width, top - margin)
+        flowable.drawOn(pdf, margin, top - height)
+        return top - height
+
+    # Title, teacher info and summary on the first page
+    top = page_height - margin
+    top = draw(Paragraph("Payment History Report", title_style), top) - title_style.spaceAfter
+    top = draw(Paragraph(f"<b>Teacher:</b> {teacher.user.get_full_name() or teacher.user.username}<br/>"
+                         f"<b>Generated:</b> {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                         styles['Normal']), top) - 0.3 * inch
+    summary_table = Table([
+        ['Total Earnings', f"${summary['total_earnings']:.2f}"],
+        ['Completed Payments', str(summary['completed_count'])],
+        ['Pending Payments', str(summary['pending_count'])],
+    ], colWidths=[3 * inch, 2 * inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    top = draw(summary_table, top) - 0.3 * inch
+
+    # Payments table, repeating the header on every page
+    header = ['Course', 'Student', 'Amount', 'Date', 'Status']
+    for page_number, chunk in enumerate(_chunks(rows, PDF_ROWS_FIRST_PAGE, PDF_ROWS_PER_PAGE)):
+        if page_number:
+            pdf.showPage()
+            top = page_height - margin
+        table = Table(
+            [header] + [
+                [row['course'][:40], row['student'][:30], f"${row['amount']:.2f}",
+                 row['created_at'].strftime('%Y-%m-%d'), row['status']]
+                for row in chunk
+            ],
+            colWidths=[2 * inch, 1.5 * inch, 1 * inch, 1 * inch, 1 * inch],
+        )
+        table.setStyle(payments_style)
+        draw(table, top)
+    pdf.showPage()
+    pdf.save()
+
+
+def ledger_pdf_inline(teacher):
+    """Whether the teacher's ledger is short enough to draw as a PDF within the request."""
+    limit = getattr(settings, 'LEDGER_PDF_INLINE_ROWS', 1000)
+    return not teacher_ledger(teacher)[limit:limit + 1].exists()
+
+
+def ledger_pdf_name(teacher):
+    """A fresh storage name for a background-rendered ledger PDF."""
+    return f'{LEDGER_EXPORT_DIR}/payment_history_{teacher.pk}_{uuid.uuid4().hex}.pdf'
+
+
+def save_ledger_pdf(teacher, file_name):
+    """Render the teacher's ledger PDF into default storage as ``file_name`` (skipped if already there)."""
+    if default_storage.exists(file_name):
+        return file_name
+    summary, rows = ledger_export(teacher)
+    with tempfile.TemporaryFile() as pdf_file:
+        write_ledger_pdf(pdf_file, teacher, summary, rows)
+        pdf_file.seek(0)
+        return default_storage.save(file_name, File(pdf_file))
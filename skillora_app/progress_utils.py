@@ -0,0 +1,336 @@
+"""
+Helpers for the denormalized StudentProgress counters
+
+Course keeps the number of published materials/assignments and every
+StudentProgress row keeps its viewed/completed counts, so reading a progress
+percentage never has to COUNT anything. The counters are adjusted by the
+signal handlers in signals.py and can be rebuilt in bulk with
+``manage.py reconcile_progress``.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import AssignmentSubmission, Course, EnrollmentIndex, StudentProgress
+
+PERCENT_QUANTUM = Decimal('0.01')
+COURSE_COUNTER_FIELDS = ('published_materials_count', 'published_assignments_count')
+
+
+def calculate_percentage(completed_items, total_items):
+    """Return the progress percentage for the given counts, rounded like the model field."""
+    if total_items <= 0:
+        return Decimal('0.00')
+    return (Decimal(completed_items) * 100 / Decimal(total_items)).quantize(PERCENT_QUANTUM)
+
+
+def _percentage_expression():
+    """SQL expression computing progress_percentage from the stored counters."""
+    course_total = Subquery(
+        Course.objects.filter(pk=OuterRef('course_id')).annotate(
+            total_items=F('published_materials_count') + F('published_assignments_count')
+        ).values('total_items')[:1]
+    )
+    completed = Cast(F('materials_viewed_count') + F('assignments_completed_count'), FloatField())
+    return Coalesce(
+        completed * Value(100.0) / NullIf(course_total, Value(0)),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def recalculate_percentages(progress_queryset):
+    """Refresh progress_percentage from the counters with a single UPDATE."""
+    return progress_queryset.update(progress_percentage=_percentage_expression())
+
+
+def save_course_details(course):
+    """Save an edited course without writing back the counters it was loaded with.
+
+    A material or assignment published while the course was being edited has
+    already moved the counters in the database; a full save would undo that.
+    """
+    fields = [
+        field.name for field in Course._meta.concrete_fields
+        if not field.primary_key and field.name not in COURSE_COUNTER_FIELDS
+    ]
+    course.save(update_fields=fields)
+
+
+def adjust_course_totals(course_id, materials=0, assignments=0):
+    """Shift a course's published item totals and refresh its students' percentages."""
+    changes = {}
+    if materials:
+        changes['published_materials_count'] = F('published_materials_count') + materials
+    if assignments:
+        changes['published_assignments_count'] = F('published_assignments_count') + assignments
+    if changes:
+        Course.objects.filter(pk=course_id).update(**changes)
+    recalculate_percentages(StudentProgress.objects.filter(course_id=course_id))
+
+
+def adjust_progress_counts(progress_ids, materials=0, assignments=0):
+    """Shift the viewed/completed counters of the given progress rows."""
+    changes = {}
+    if materials:
+        changes['materials_viewed_count'] = F('materials_viewed_count') + materials
+    if assignments:
+        changes['assignments_completed_count'] = F('assignments_completed_count') + assignments
+    progress_rows = StudentProgress.objects.filter(pk__in=progress_ids)
+    if changes:
+        progress_rows.update(**changes)
+    recalculate_percentages(progress_rows)
+
+
+def recount_progress(progress_ids):
+    """Recount the viewed/completed counters of the given rows from their M2M tables."""
+    viewed = StudentProgress.materials_viewed.through.objects.filter(
+        studentprogress_id=OuterRef('pk')
+    ).values('studentprogress_id').annotate(total=Count('id')).values('total')
+    completed = StudentProgress.assignments_completed.through.objects.filter(
+        studentprogress_id=OuterRef('pk')
+    ).values('studentprogress_id').annotate(total=Count('id')).values('total')
+    progress_rows = StudentProgress.objects.filter(pk__in=progress_ids)
+    progress_rows.update(
+        materials_viewed_count=Coalesce(Subquery(viewed[:1]), Value(0)),
+        assignments_completed_count=Coalesce(Subquery(completed[:1]), Value(0)),
+    )
+    recalculate_percentages(progress_rows)
+
+
+def ensure_student_progress(student, courses):
+    """
+    Return a dict of course id -> StudentProgress for the given courses.
+
+    Missing rows are created in one bulk_create; nothing is recalculated because
+    the stored counters are always current.
+    """
+    course_ids = [course.id for course in courses]
+    if not course_ids:
+        return {}
+
+    progress_by_course = {
+        progress.course_id: progress
+        for progress in StudentProgress.objects.filter(student=student, course_id__in=course_ids)
+    }
+    missing = [
+        StudentProgress(student=student, course_id=course_id)
+        for course_id in course_ids if course_id not in progress_by_course
+    ]
+    if missing:
+        StudentProgress.objects.bulk_create(missing, ignore_conflicts=True)
+        progress_by_course.update({
+            progress.course_id: progress
+            for progress in StudentProgress.objects.filter(
+                student=student, course_id__in=[p.course_id for p in missing]
+            )
+        })
+    return progress_by_course
+
+
+def rebuild_progress_counters(courses=None, progress=None, commit=True, batch_size=500):
+    """
+    Recount course totals and progress counters with grouped queries.
+
+    ``courses`` and ``progress`` narrow the rebuild to the given querysets; by
+    default every row is checked, and a narrowed ``progress`` only rebuilds the
+    courses it belongs to. Rows whose stored values drifted are written
+    back with bulk_update unless ``commit`` is False. Returns a drift report.
+    """
+    if progress is None:
+        progress = StudentProgress.objects.all()
+        if courses is None:
+            courses = Course.objects.all()
+    elif courses is None:
+        courses = Course.objects.filter(id__in=progress.values('course_id'))
+
+    report = {
+        'courses_checked': 0,
+        'courses_drifted': [],
+        'progress_checked': 0,
+        'progress_drifted': [],
+    }
+
+    # Published materials and assignments grouped by course
+    totals = {}
+    drifted_courses = []
+    course_rows = courses.annotate(
+        actual_materials=Count('materials', filter=Q(materials__is_published=True), distinct=True),
+        actual_assignments=Count('assignments', filter=Q(assignments__is_published=True), distinct=True),
+    ).order_by()
+    for course in course_rows.iterator(chunk_size=2000):
+        report['courses_checked'] += 1
+        totals[course.id] = course.actual_materials + course.actual_assignments
+        if (course.published_materials_count != course.actual_materials or
+                course.published_assignments_count != course.actual_assignments):
+            report['courses_drifted'].append({
+                'course_id': course.id,
+                'materials': (course.published_materials_count, course.actual_materials),
+                'assignments': (course.published_assignments_count, course.actual_assignments),
+            })
+            course.published_materials_count = course.actual_materials
+            course.published_assignments_count = course.actual_assignments
+            drifted_courses.append(course)
+
+    if commit and drifted_courses:
+        Course.objects.bulk_update(
+            drifted_courses,
+            ['published_materials_count', 'published_assignments_count'],
+            batch_size=batch_size,
+        )
+
+    # Viewed materials and completed assignments grouped by progress row
+    drifted_progress = []
+    progress_rows = progress.annotate(
+        actual_viewed=Count('materials_viewed', distinct=True),
+        actual_completed=Count('assignments_completed', distinct=True),
+    ).order_by()
+    for row in progress_rows.iterator(chunk_size=2000):
+        report['progress_checked'] += 1
+        percentage = calculate_percentage(row.actual_viewed + row.actual_completed, totals.get(row.course_id, 0))
+        if (row.materials_viewed_count != row.actual_viewed or
+                row.assignments_completed_count != row.actual_completed or
+                row.progress_percentage != percentage):
+            report['progress_drifted'].append({
+                'progress_id': row.id,
+                'materials_viewed': (row.materials_viewed_count, row.actual_viewed),
+                'assignments_completed': (row.assignments_completed_count, row.actual_completed),
+                'percentage': (row.progress_percentage, percentage),
+            })
+            row.materials_viewed_count = row.actual_viewed
+            row.assignments_completed_count = row.actual_completed
+            row.progress_percentage = percentage
+            drifted_progress.append(row)
+
+    if commit and drifted_progress:
+        StudentProgress.objects.bulk_update(
+            drifted_progress,
+            ['materials_viewed_count', 'assignments_completed_count', 'progress_percentage'],
+            batch_size=batch_size,
+        )
+
+    return report
+
+
+def build_progress_analytics(teacher, course_id=None):
+    """
+    Per-course and per-student progress/grade analytics for a teacher's courses.
+
+    Read-only and independent of the number of students: one query each for the
+    courses, the rosters, the progress rows, the grouped submission points and
+    the submission rows, then everything is joined in Python. Course totals come
+    from the stored counters. ``course_id`` narrows every query in SQL.
+    """
+    courses = Course.objects.filter(instructor=teacher).order_by('-created_at')
+    if course_id is not None:
+        courses = courses.filter(id=course_id)
+    courses = list(courses)
+    course_ids = [course.id for course in courses]
+
+    students_by_course = {cid: [] for cid in course_ids}
+    for row in EnrollmentIndex.objects.filter(
+        course_id__in=course_ids
+    ).select_related('student__user').order_by('student_id'):
+        students_by_course[row.course_id].append(row.student)
+
+    progress_by_key = {
+        (progress.student_id, progress.course_id): progress
+        for progress in StudentProgress.objects.filter(course_id__in=course_ids)
+    }
+
+    points_by_key = {
+        (row['student_id'], row['assignment__course_id']): row
+        for row in AssignmentSubmission.objects.filter(
+            assignment__course_id__in=course_ids
+        ).values('student_id', 'assignment__course_id').annotate(
+            points_earned=Coalesce(Sum('points_earned'), Value(0)),
+            points_possible=Coalesce(Sum('assignment__max_points'), Value(0)),
+        )
+    }
+
+    submissions_by_key = {}
+    for submission in AssignmentSubmission.objects.filter(
+        assignment__course_id__in=course_ids
+    ).select_related('assignment').order_by('id'):
+        points_earned = submission.points_earned if submission.points_earned is not None else 0
+        max_points = submission.assignment.max_points
+        submissions_by_key.setdefault((submission.student_id, submission.assignment.course_id), []).append({
+            'assignment': submission.assignment,
+            'submission': submission,
+            'points_earned': points_earned,
+            'max_points': max_points,
+            'grade_percentage': (points_earned / max_points * 100) if max_points > 0 else 0,
+            'status': submission.get_status_display(),
+        })
+
+    courses_analytics = []
+    all_students_data = {}
+    for course in courses:
+        total_materials = course.published_materials_count
+        total_assignments = course.published_assignments_count
+        students_analytics = []
+        for student in students_by_course[course.id]:
+            key = (student.id, course.id)
+            progress = progress_by_key.get(key)
+            progress_percentage = float(progress.progress_percentage) if progress else 0.0
+            points = points_by_key.get(key, {'points_earned': 0, 'points_possible': 0})
+            total_points_earned = points['points_earned']
+            total_points_possible = points['points_possible']
+            overall_grade = (total_points_earned / total_points_possible * 100) if total_points_possible > 0 else 0
+
+            students_analytics.append({
+                'student': student,
+                'progress': progress,
+                'progress_percentage': progress_percentage,
+                'materials_viewed': progress.materials_viewed_count if progress else 0,
+                'total_materials': total_materials,
+                'assignments_completed': progress.assignments_completed_count if progress else 0,
+                'total_assignments': total_assignments,
+                'assignments': submissions_by_key.get(key, []),
+                'total_points_earned': total_points_earned,
+                'total_points_possible': total_points_possible,
+                'overall_grade': overall_grade,
+            })
+
+            student_info = all_students_data.setdefault(student.id, {
+                'student': student,
+                'courses': [],
+                'total_progress': 0,
+                'course_count': 0,
+            })
+            student_info['courses'].append({
+                'course': course,
+                'progress_percentage': progress_percentage,
+                'overall_grade': overall_grade,
+            })
+            student_info['total_progress'] += progress_percentage
+            student_info['course_count'] += 1
+
+        avg_progress = (
+            sum(s['progress_percentage'] for s in students_analytics) / len(students_analytics)
+            if students_analytics else 0
+        )
+        courses_analytics.append({
+            'course': course,
+            'students_count': len(students_analytics),
+            'students_analytics': students_analytics,
+            'avg_progress': avg_progress,
+            'total_materials': total_materials,
+            'total_assignments': total_assignments,
+        })
+
+    for student_info in all_students_data.values():
+        student_info['avg_progress'] = student_info['total_progress'] / student_info['course_count']
+
+    overall_avg_progress = (
+        sum(course_data['avg_progress'] for course_data in courses_analytics) / len(courses_analytics)
+        if courses_analytics else 0
+    )
+    return {
+        'courses_analytics': courses_analytics,
+        'all_students_data': list(all_students_data.values()),
+        'overall_avg_progress': overall_avg_progress,
+        'total_assignments_count': sum(course_data['total_assignments'] for course_data in courses_analytics),
+    }
@@ -0,0 +1,132 @@
+"""
+Payment receipt rendering with a content-addressed cache
+
+A receipt is fully determined by its inputs (payment, student, course lines),
+so it is rendered once, stored in MEDIA_ROOT under receipts/<sha256>.pdf and
+served from there afterwards. The same hash is used as the ETag. Only
+completed payments are cached; other receipts can still change. Reportlab and
+the styles are loaded once per process.
+"""
+
+import hashlib
+import io
+import json
+from functools import lru_cache
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Bump when the receipt layout changes so cached files are re-rendered
+RECEIPT_TEMPLATE_VERSION = 1
+RECEIPT_DIR = 'receipts'
+
+
+def receipt_data(payment, courses):
+    """The values printed on the receipt, which also identify it."""
+    paid_at = payment.completed_at or payment.created_at
+    return {
+        'version': RECEIPT_TEMPLATE_VERSION,
+        'payment_id': payment.payment_id,
+        'date': paid_at.strftime('%B %d, %Y'),
+        'student': payment.user.get_full_name() or payment.user.username,
+        'courses': [[course.title, course.category, str(course.price)] for course in courses],
+        'amount': str(payment.amount),
+    }
+
+
+def receipt_fingerprint(data):
+    """sha256 hex digest of the receipt data."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def receipt_path(fingerprint):
+    return f'{RECEIPT_DIR}/{fingerprint}.pdf'
+
+
+@lru_cache(maxsize=1)
+def _receipt_styles():
+    """Build the reportlab styles once per process (ImportError without reportlab)."""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=1,  # Center alignment
+    )
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    return styles, title_style, table_style
+
+
+def render_receipt(data):
+    """Render the receipt PDF for ``receipt_data()`` output and return its bytes."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+    styles, title_style, table_style = _receipt_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+
+    table = Table([['Course Title', 'Category', 'Price']] + [
+        [title, category, f"₹{price}"] for title, category, price in data['courses']
+    ])
+    table.setStyle(table_style)
+
+    doc.build([
+        Paragraph("Skillora - Payment Receipt", title_style),
+        Spacer(1, 20),
+        Paragraph(f"<b>Payment ID:</b> {data['payment_id']}", styles['Normal']),
+        Paragraph(f"<b>Date:</b> {data['date']}", styles['Normal']),
+        Paragraph(f"<b>Student:</b> {data['student']}", styles['Normal']),
+        Spacer(1, 20),
+        Paragraph("<b>Enrolled Courses:</b>", styles['Heading2']),
+        Spacer(1, 10),
+        table,
+        Spacer(1, 20),
+        Paragraph(f"<b>Total Amount:</b> ₹{data['amount']}", styles['Heading2']),
+        Spacer(1, 20),
+        Paragraph("Thank you for choosing Skillora!", styles['Normal']),
+        Paragraph("Visit our website: www.skillora.com", styles['Normal']),
+    ])
+    return buffer.getvalue()
+
+
+def store_receipt(data, fingerprint=None):
+    """Render and save the receipt unless it is already stored. Returns (path, rendered)."""
+    fingerprint = fingerprint or receipt_fingerprint(data)
+    path = receipt_path(fingerprint)
+    if default_storage.exists(path):
+        return path, False
+    saved = default_storage.save(path, ContentFile(render_receipt(data)))
+    if saved != path:
+        # Another request stored the same receipt first; keep a single copy
+        default_storage.delete(saved)
+    return path, True
+
+
+def receipt_for_payment(payment, courses=None):
+    """
+    Return (fingerprint, path or None, pdf bytes or None) for a payment.
+
+    Completed payments get a stored receipt (path); anything else is rendered
+    on the fly (bytes) because its details may still change.
+    """
+    data = receipt_data(payment, payment.courses.all() if courses is None else courses)
+    fingerprint = receipt_fingerprint(data)
+    if payment.status != 'completed':
+        return fingerprint, None, render_receipt(data)
+    path, _ = store_receipt(data, fingerprint)
+    return fingerprint, path, None
@@ -0,0 +1,462 @@
+"""
+Internship recommendations
+
+Scores follow calculate_match_score's weights (0-100):
+
+    skills       40 x share of the required skills the student has (20 if none are required)
+    location     20 exact preferred location, 15 partial, 10 without a preference
+    industry     20 exact preferred industry, 15 partial, 10 without a preference
+    type         10 preferred internship type, 8 for the close 'internship'/'industrial_training' match
+    placement    10 placement-ready student and placement potential, 5 potential only
+
+Skills are compared as canonical Skill ids from the skill ManyToMany
+(skill_utils), so "JS" on a profile matches "JavaScript" on an internship.
+A student's fields are read once into ProfileTokens, the open internships'
+into InternshipFeatures, which is built from one query on the internships
+(company industry included) and one on their skill links, and kept per
+process until a published internship or the skill links change. All internships are then scored in one pass -- with
+NumPy when it is installed (skills as a sparse CSR matrix over a skill
+vocabulary, the other factors looked up per distinct location, industry and
+type), with a plain loop otherwise -- and the top K are taken with heapq.
+
+Each student's top matches are kept in a RecommendationCache row, so the
+internship list reads them by student id. Signals mark rows stale when the
+student's profile or applications change, and mark all of them stale when a
+published internship changes. A stale row is rebuilt on its next read or by
+the refresh_recommendations background job. Matches whose deadline passes
+expire the row. Every invalidation bumps the row's version. A rebuild only
+saves if the version has not moved since it started, so a rebuild racing an
+invalidation cannot mark its result fresh.
+
+Companies get the reverse ranking: rank_candidates() scores placement-ready
+student profiles against one internship with the same weights. The CGPA and
+department filters run in SQL. Skill overlap is counted per profile by one
+grouped query on the skill links. The preference scores are computed once
+per distinct preferences text, so a pass over 50k profiles is a loop of
+dictionary lookups. The ranking is cached until the internship or the
+matching profiles change.
+"""
+
+import hashlib
+import heapq
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from .models import Internship, InternshipApplication, RecommendationCache, StudentProfile
+
+SKILLS_WEIGHT = 40
+NO_SKILLS_REQUIRED_SCORE = 20
+PREFERENCE_MATCH_SCORE = 20
+PREFERENCE_PARTIAL_SCORE = 15
+NO_PREFERENCE_SCORE = 10
+TYPE_MATCH_SCORE = 10
+TYPE_CLOSE_SCORE = 8
+PLACEMENT_READY_SCORE = 10
+PLACEMENT_POTENTIAL_SCORE = 5
+MAX_SCORE = 100
+DEFAULT_RECOMMENDATIONS = 10
+DEFAULT_CANDIDATES = 100
+MAX_CANDIDATES = 1000
+CANDIDATE_CACHE_TIMEOUT = 300
+
+ProfileTokens = namedtuple('ProfileTokens', 'skills locations industries preference placement_ready')
+RequiredSkill = Internship.required_skill_tags.through
+ProfileSkill = StudentProfile.skill_tags.through
+
+
+def _numpy():
+    """NumPy if installed; the recommender falls back to plain Python without it."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def split_tokens(text):
+    """Lowercased, stripped items of a comma-separated field."""
+    return frozenset(item.strip().lower() for item in (text or '').split(',') if item.strip())
+
+
+def skill_ids(instance, m2m_field='skill_tags'):
+    """Ids of the canonical skills linked to a saved profile, course or internship."""
+    return frozenset(getattr(instance, m2m_field).values_list('id', flat=True))
+
+
+def profile_tokens(profile):
+    return ProfileTokens(
+        skills=skill_ids(profile),
+        locations=split_tokens(profile.preferred_locations),
+        industries=split_tokens(profile.preferred_industries),
+        preference=profile.internship_preferences,
+        placement_ready=profile.is_placement_ready,
+    )
+
+
+def preference_score(value, preferred):
+    if not preferred:
+        return NO_PREFERENCE_SCORE
+    if value in preferred:
+        return PREFERENCE_MATCH_SCORE
+    if any(item in value for item in preferred):
+        return PREFERENCE_PARTIAL_SCORE
+    return 0
+
+
+def type_score(preference, internship_type):
+    if preference == internship_type:
+        return TYPE_MATCH_SCORE
+    if preference == 'internship' and internship_type in ('internship', 'industrial_training'):
+        return TYPE_CLOSE_SCORE
+    return 0
+
+
+def placement_score(placement_ready, placement_potential):
+    if placement_potential:
+        return PLACEMENT_READY_SCORE if placement_ready else PLACEMENT_POTENTIAL_SCORE
+    return 0
+
+
+def skills_score(skills, required):
+    if not required:
+        return NO_SKILLS_REQUIRED_SCORE
+    return len(skills & required) / len(required) * SKILLS_WEIGHT
+
+
+def match_score(tokens, required_skills, location, industry, internship_type, placement_potential):
+    """Score one internship for a student's ProfileTokens (the reference for the batched scorers)."""
+    score = skills_score(tokens.skills, required_skills)
+    score += preference_score(location, tokens.locations)
+    score += preference_score(industry, tokens.industries)
+    score += type_score(tokens.preference, internship_type)
+    score += placement_score(tokens.placement_ready, placement_potential)
+    return min(score, MAX_SCORE)
+
+
+def _distinct(values):
+    """(distinct values in first-seen order, index of each value in that list)"""
+    positions = {}
+    index = [positions.setdefault(value, len(positions)) for value in values]
+    return list(positions), index
+
+
+class InternshipFeatures:
+    """Parsed matching fields of every published internship with seats left."""
+
+    def __init__(self, rows, required_skills):
+        self.ids = []
+        self.skills = []
+        self.deadlines = []
+        self.placement = []
+        locations, industries, types = [], [], []
+        for pk, location, industry, internship_type, potential, deadline in rows:
+            self.ids.append(pk)
+            self.skills.append(required_skills.get(pk, frozenset()))
+            locations.append(location.lower())
+            industries.append(industry.lower())
+            types.append(internship_type)
+            self.placement.append(potential)
+            self.deadlines.append(deadline)
+        self.locations, self.location_index = _distinct(locations)
+        self.industries, self.industry_index = _distinct(industries)
+        self.types, self.type_index = _distinct(types)
+
+        self.arrays = None
+        np = _numpy()
+        if np is not None:
+            self.arrays = self._build_arrays(np)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build_arrays(self, np):
+        vocabulary = {}
+        indices = []
+        indptr = [0]
+        for required in self.skills:
+            indices.extend(vocabulary.setdefault(skill, len(vocabulary)) for skill in required)
+            indptr.append(len(indices))
+        indptr = np.array(indptr, dtype=np.int64)
+        return {
+            'ids': np.array(self.ids, dtype=np.int64),
+            'vocabulary': vocabulary,
+            'skill_indices': np.array(indices, dtype=np.int64),
+            'skill_indptr': indptr,
+            'required_counts': np.diff(indptr),
+            'location_index': np.array(self.location_index, dtype=np.int64),
+            'industry_index': np.array(self.industry_index, dtype=np.int64),
+            'type_index': np.array(self.type_index, dtype=np.int64),
+            'placement': np.array(self.placement, dtype=bool),
+            'deadlines': np.array([deadline.timestamp() for deadline in self.deadlines], dtype=np.float64),
+        }
+
+    def scores(self, tokens):
+        """Match score of every internship, in ``ids`` order (a list of floats)."""
+        if self.arrays is not None:
+            return self._scores_numpy(tokens)
+        location_scores = [preference_score(location, tokens.locations) for location in self.locations]
+        industry_scores = [preference_score(industry, tokens.industries) for industry in self.industries]
+        type_scores = [type_score(tokens.preference, internship_type) for internship_type in self.types]
+        return [
+            min(
+                skills_score(tokens.skills, self.skills[i])
+                + location_scores[self.location_index[i]]
+                + industry_scores[self.industry_index[i]]
+                + type_scores[self.type_index[i]]
+                + placement_score(tokens.placement_ready, self.placement[i]),
+                MAX_SCORE,
+            )
+            for i in range(len(self.ids))
+        ]
+
+    def _scores_numpy(self, tokens):
+        np = _numpy()
+        arrays = self.arrays
+        # Sparse skills: which vocabulary entries the student has, summed per CSR row
+        has_skill = np.zeros(len(arrays['vocabulary']), dtype=np.int64)
+        known = [arrays['vocabulary'][skill] for skill in tokens.skills if skill in arrays['vocabulary']]
+        has_skill[known] = 1
+        cumulative = np.concatenate(([0], np.cumsum(has_skill[arrays['skill_indices']])))
+        indptr = arrays['skill_indptr']
+        overlap = cumulative[indptr[1:]] - cumulative[indptr[:-1]]
+        required = arrays['required_counts']
+        score = np.where(
+            required > 0, overlap / np.maximum(required, 1) * SKILLS_WEIGHT, float(NO_SKILLS_REQUIRED_SCORE)
+        )
+
+        location_scores = np.array([preference_score(location, tokens.locations) for location in self.locations], dtype=np.float64)
+        industry_scores = np.array([preference_score(industry, tokens.industries) for industry in self.industries], dtype=np.float64)
+        type_scores = np.array([type_score(tokens.preference, internship_type) for internship_type in self.types], dtype=np.float64)
+        score = score + location_scores[arrays['location_index']]
+        score = score + industry_scores[arrays['industry_index']]
+        score = score + type_scores[arrays['type_index']]
+        score = score + np.where(
+            arrays['placement'],
+            float(placement_score(tokens.placement_ready, True)),
+            float(placement_score(tokens.placement_ready, False)),
+        )
+        return np.minimum(score, MAX_SCORE).tolist()
+
+    def open_mask(self, now, excluded_ids=()):
+        """Whether each internship still takes applications and is not in ``excluded_ids``."""
+        excluded = set(excluded_ids)
+        if self.arrays is not None:
+            np = _numpy()
+            mask = self.arrays['deadlines'] > now.timestamp()
+            if excluded:
+                mask &= ~np.isin(self.arrays['ids'], np.array(list(excluded), dtype=np.int64))
+            return mask.tolist()
+        return [deadline > now and pk not in excluded for pk, deadline in zip(self.ids, self.deadlines)]
+
+
+def _open_internships():
+    return Internship.objects.filter(status='published', seats_filled__lt=F('seats_available'))
+
+
+_features_cache = {'signature': None, 'features': None}
+
+
+def internship_features():
+    """InternshipFeatures for the open internships, rebuilt only when a published internship or a skill link changed."""
+    signature = Internship.objects.filter(status='published').aggregate(
+        count=Count('id'), changed=Max('updated_at'), last_id=Max('id')
+    )
+    signature.update(RequiredSkill.objects.aggregate(links=Count('id'), last_link=Max('id')))
+    if _features_cache['signature'] != signature or _features_cache['features'] is None:
+        open_internships = _open_internships()
+        required_skills = {}
+        links = RequiredSkill.objects.filter(internship__in=open_internships).values_list('internship_id', 'skill_id')
+        for pk, skill_id in links.iterator(chunk_size=5000):
+            required_skills.setdefault(pk, set()).add(skill_id)
+        rows = open_internships.order_by('id').values_list(
+            'id', 'location', 'company__industry', 'internship_type',
+            'has_placement_potential', 'application_deadline',
+        )
+        features = InternshipFeatures(rows.iterator(chunk_size=2000), required_skills)
+        _features_cache.update(signature=signature, features=features)
+    return _features_cache['features']
+
+
+def _best_indices(features, tokens, limit, excluded_ids):
+    if not len(features):
+        return [], []
+    scores = features.scores(tokens)
+    candidates = [i for i, is_open in enumerate(features.open_mask(timezone.now(), excluded_ids)) if is_open]
+    return heapq.nlargest(limit, candidates, key=scores.__getitem__), scores
+
+
+def top_matches(tokens, limit=DEFAULT_RECOMMENDATIONS, excluded_ids=(), features=None):
+    """The ``limit`` best (internship id, score) pairs, best first; ties keep internship id order."""
+    features = features or internship_features()
+    best, scores = _best_indices(features, tokens, limit, excluded_ids)
+    return [(features.ids[i], scores[i]) for i in best]
+
+
+def _applied_ids(student):
+    return list(InternshipApplication.objects.filter(student=student).values_list('internship_id', flat=True))
+
+
+def _with_scores(matches):
+    """Internships (company loaded) for (id, score) pairs, in order, with ``match_score`` set."""
+    internships = Internship.objects.select_related('company').in_bulk([pk for pk, _ in matches])
+    recommended = []
+    for pk, score in matches:
+        internship = internships.get(pk)
+        if internship is not None:
+            internship.match_score = score
+            recommended.append(internship)
+    return recommended
+
+
+def recommend_internships(student, profile, limit=DEFAULT_RECOMMENDATIONS):
+    """The student's best matching open internships they have not applied to, with ``match_score`` set."""
+    return _with_scores(top_matches(profile_tokens(profile), limit=limit, excluded_ids=_applied_ids(student)))
+
+
+# Per-student cache
+
+def refresh_recommendations(student, profile, row=None, features=None):
+    """Recompute and store the student's RecommendationCache row; returns it with the new matches."""
+    if row is None:
+        row, _ = RecommendationCache.objects.get_or_create(student=student, defaults={'is_stale': True})
+    version = row.version
+    features = features or internship_features()
+    best, scores = _best_indices(features, profile_tokens(profile), DEFAULT_RECOMMENDATIONS, _applied_ids(student))
+    values = {
+        'internship_ids': [features.ids[i] for i in best],
+        'scores': [scores[i] for i in best],
+        'expires_at': min((features.deadlines[i] for i in best), default=None),
+        'refreshed_at': timezone.now(),
+        'is_stale': False,
+    }
+    # Left stale if it was invalidated while the matches were computed
+    RecommendationCache.objects.filter(pk=row.pk, version=version).update(**values)
+    for field, value in values.items():
+        setattr(row, field, value)
+    return row
+
+
+def cached_recommendations(student, profile):
+    """
+    recommend_internships() read from the student's cache row, which is
+    rebuilt first when it is missing, stale or past a match's deadline.
+    """
+    row = RecommendationCache.objects.filter(student=student).first()
+    if row is None or row.is_stale or (row.expires_at and row.expires_at <= timezone.now()):
+        row = refresh_recommendations(student, profile, row)
+    return _with_scores(list(zip(row.internship_ids, row.scores)))
+
+
+def invalidate_recommendations(student_ids=None):
+    """Mark the students' cached recommendations (everyone's by default) stale."""
+    rows = RecommendationCache.objects.all()
+    if student_ids is not None:
+        rows = rows.filter(student_id__in=[student_id for student_id in student_ids if student_id])
+    return rows.update(is_stale=True, version=F('version') + 1)
+
+
+def schedule_recommendation_invalidation(student_ids=None):
+    """invalidate_recommendations() once the transaction commits."""
+    student_ids = None if student_ids is None else set(student_ids)
+    transaction.on_commit(lambda: invalidate_recommendations(student_ids))
+
+
+def refresh_stale_recommendations(batch_size=200):
+    """Rebuild every stale cache row (dropping those of students without a profile); returns the number rebuilt."""
+    features = internship_features()
+    refreshed = 0
+    stale = RecommendationCache.objects.filter(is_stale=True).select_related('student__placement_profile')
+    for row in stale.iterator(chunk_size=batch_size):
+        profile = getattr(row.student, 'placement_profile', None)
+        if profile is None:
+            row.delete()
+            continue
+        refresh_recommendations(row.student, profile, row, features=features)
+        refreshed += 1
+    return refreshed
+
+
+# Candidates for an internship
+
+def candidate_profiles(min_cgpa=None, departments=()):
+    """Placement-ready student profiles, optionally with a minimum CGPA and in the given departments."""
+    profiles = StudentProfile.objects.filter(is_placement_ready=True)
+    if min_cgpa is not None:
+        profiles = profiles.filter(cgpa__gte=min_cgpa)
+    if departments:
+        profiles = profiles.filter(department__in=list(departments))
+    return profiles
+
+
+class _ScoreMemo(dict):
+    """Score per distinct value, computed on first use."""
+
+    def __init__(self, compute):
+        super().__init__()
+        self.compute = compute
+
+    def __missing__(self, key):
+        value = self[key] = self.compute(key)
+        return value
+
+
+def _score_candidates(internship, profiles, limit):
+    required = skill_ids(internship, 'required_skill_tags')
+    overlap = {}
+    if required:
+        overlap = dict(
+            ProfileSkill.objects.filter(skill_id__in=required, studentprofile__in=profiles)
+            .values('studentprofile_id').annotate(matched=Count('id')).values_list('studentprofile_id', 'matched')
+        )
+    location = internship.location.lower()
+    industry = internship.company.industry.lower()
+    location_scores = _ScoreMemo(lambda text: preference_score(location, split_tokens(text)))
+    industry_scores = _ScoreMemo(lambda text: preference_score(industry, split_tokens(text)))
+    type_scores = _ScoreMemo(lambda preference: type_score(preference, internship.internship_type))
+    placement_scores = {
+        ready: placement_score(ready, internship.has_placement_potential) for ready in (True, False)
+    }
+
+    def scored(rows):
+        for pk, locations, industries, preference, ready, cgpa in rows:
+            if required:
+                skills = overlap.get(pk, 0) / len(required) * SKILLS_WEIGHT
+            else:
+                skills = NO_SKILLS_REQUIRED_SCORE
+            score = min(
+                skills + location_scores[locations] + industry_scores[industries]
+                + type_scores[preference] + placement_scores[ready],
+                MAX_SCORE,
+            )
+            # Higher CGPA first among equal scores, then the older profile
+            yield score, float(cgpa or 0), -pk
+
+    rows = profiles.values_list(
+        'id', 'preferred_locations', 'preferred_industries', 'internship_preferences', 'is_placement_ready', 'cgpa'
+    )
+    best = heapq.nlargest(limit, scored(rows.iterator(chunk_size=5000)))
+    return [(-negative_pk, score) for score, _, negative_pk in best]
+
+
+def rank_candidates(internship, min_cgpa=None, departments=(), limit=DEFAULT_CANDIDATES):
+    """
+    The ``limit`` best (student profile id, score) pairs for ``internship``
+    among candidate_profiles(), best first. Cached until the internship or a
+    matching profile changes.
+    """
+    profiles = candidate_profiles(min_cgpa, departments)
+    signature = profiles.aggregate(count=Count('id'), changed=Max('updated_at'))
+    key = hashlib.sha256(repr((
+        internship.pk, internship.updated_at, str(min_cgpa), sorted(departments), limit,
+        signature['count'], signature['changed'],
+    )).encode('utf-8')).hexdigest()
+    cache_key = f'candidates:{key}'
+    ranked = cache.get(cache_key)
+    if ranked is None:
+        ranked = _score_candidates(internship, profiles, limit)
+        cache.set(cache_key, ranked, CANDIDATE_CACHE_TIMEOUT)
+    return ranked
@@ -0,0 +1,470 @@
+"""
+Company report generation
+
+Runs in the background worker (job_utils); the view only creates the Report row.
+
+Each report type is computed with a handful of grouped queries over the
+company's PlacementRecords, StudentProfiles, InternshipApplications,
+JobApplications and ExcelUploads within ``parameters['start_date']`` ..
+``parameters['end_date']``, and rendered as CSV, PDF (reportlab) or XLSX
+(openpyxl). A report is laid out as a title, summary (label, value) pairs and
+a list of tables, so every format renders every type.
+
+Results are keyed by (company, report type, date range, format) plus a
+signature of the source rows in that range (count, last id, last change).
+The rendered file is stored under that key and the report's heading (title,
+company, range), so regenerating a range whose data has not changed reuses
+the stored file without computing anything but
+the signature; the computed numbers are also cached (Django cache) so asking
+for another format of the same range does not run the grouped queries again.
+"""
+
+import csv
+import hashlib
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Count, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import (APPLICATION_STATUS, ExcelUpload, InternshipApplication, JobApplication, PlacementRecord,
+                     StudentProfile)
+
+# Bump when the numbers or layout change so stored reports are rebuilt
+REPORT_VERSION = 1
+REPORT_DIR = 'reports'
+REPORT_FORMATS = {
+    'csv': 'text/csv',
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+DEFAULT_REPORT_FORMAT = 'csv'
+TOP_ROWS = 20
+ZERO = Decimal('0.01')
+INTERNSHIP_STATUS_LABELS = dict(APPLICATION_STATUS)
+JOB_STATUS_LABELS = dict(JobApplication.APPLICATION_STATUS)
+
+
+class ReportError(ValueError):
+    """Invalid report parameters; the report is not generated."""
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(ZERO)
+
+
+def _percent(part, whole):
+    return round(part * 100.0 / whole, 2) if whole else 0.0
+
+
+def _department(path):
+    # Students without a profile and profiles without a department are reported together
+    return Coalesce(path, Value(''))
+
+
+def _month(value):
+    return value.strftime('%Y-%m') if value else ''
+
+
+def report_range(parameters):
+    """(start date, end date) from the report parameters; ReportError if missing or reversed."""
+    try:
+        start = date.fromisoformat(parameters['start_date'])
+        end = date.fromisoformat(parameters['end_date'])
+    except (KeyError, TypeError, ValueError):
+        raise ReportError('Start and end dates must be given as YYYY-MM-DD.')
+    if start > end:
+        raise ReportError('The start date must not be after the end date.')
+    return start, end
+
+
+# Source rows of each report type, restricted to the company and range
+
+def _placements(company, start, end):
+    return PlacementRecord.objects.filter(company=company, placement_date__range=(start, end))
+
+
+def _placed_profiles(company, start, end):
+    return StudentProfile.objects.filter(student__in=_placements(company, start, end).values('student_id'))
+
+
+def _internship_applications(company, start, end):
+    return InternshipApplication.objects.filter(
+        Q(internship__company=company) | Q(internship__posted_by=company), applied_at__date__range=(start, end)
+    )
+
+
+def _job_applications(company, start, end):
+    # Jobs name their company as free text
+    return JobApplication.objects.filter(job__company__iexact=company.company_name, applied_date__date__range=(start, end))
+
+
+def _uploads(company, start, end):
+    return ExcelUpload.objects.filter(company=company, created_at__date__range=(start, end))
+
+
+# (source rows, field that changes when a row changes) per report type
+SOURCES = {
+    'placement_summary': [(_placements, 'updated_at')],
+    'student_analytics': [(_placements, 'updated_at'), (_placed_profiles, 'updated_at'),
+                          (_internship_applications, 'updated_at')],
+    'company_performance': [(_placements, 'updated_at'), (_internship_applications, 'updated_at'),
+                            (_job_applications, 'updated_at')],
+    'recruitment_trends': [(_placements, 'updated_at'), (_internship_applications, 'updated_at'),
+                           (_job_applications, 'updated_at')],
+    'excel_analysis': [(_uploads, 'processed_at')],
+}
+
+
+def data_signature(company, report_type, start, end):
+    """Counts and last changes of the rows a report reads; changes whenever its numbers can."""
+    signature = []
+    for source, changed_field in SOURCES[report_type]:
+        row = source(company, start, end).aggregate(rows=Count('id'), last_id=Max('id'), changed=Max(changed_field))
+        signature.append([row['rows'], row['last_id'], row['changed']])
+    return signature
+
+
+def report_key(company, report_type, start, end):
+    """Cache key of a report's numbers: company, type, range and the data signature."""
+    raw = json.dumps(
+        [REPORT_VERSION, company.id, report_type, start, end, data_signature(company, report_type, start, end)],
+        cls=DjangoJSONEncoder,
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# Report builders: each returns {'summary': [(label, value)], 'tables': [{'title', 'header', 'rows'}]}
+
+def _placement_summary(company, start, end):
+    placements = _placements(company, start, end)
+    totals = placements.aggregate(
+        offers=Count('id'),
+        students=Count('student', distinct=True),
+        average_package=Avg('package_amount'),
+        highest_package=Max('package_amount'),
+        lowest_package=Min('package_amount'),
+        max_stipend=Max('stipend_amount'),
+        approved=Count('id', filter=Q(iqac_status='approved')),
+        pending=Count('id', filter=Q(iqac_status='pending')),
+        rejected=Count('id', filter=Q(iqac_status='rejected')),
+    )
+    monthly = placements.annotate(month=TruncMonth('placement_date')).values('month').annotate(
+        offers=Count('id'), students=Count('student', distinct=True), average_package=Avg('package_amount'),
+    ).order_by('month')
+    roles = placements.values('job_title').annotate(
+        offers=Count('id'), average_package=Avg('package_amount'), highest_package=Max('package_amount'),
+    ).order_by('-offers', 'job_title')[:TOP_ROWS]
+    return {
+        'summary': [
+            ('Offers', totals['offers']),
+            ('Students placed', totals['students']),
+            ('Average package', _money(totals['average_package'])),
+            ('Highest package', _money(totals['highest_package'])),
+            ('Lowest package', _money(totals['lowest_package'])),
+            ('Highest stipend', _money(totals['max_stipend'])),
+            ('IQAC approved', totals['approved']),
+            ('IQAC pending', totals['pending']),
+            ('IQAC rejected', totals['rejected']),
+        ],
+        'tables': [
+            {
+                'title': 'Offers by month',
+                'header': ['Month', 'Offers', 'Students', 'Average package'],
+                'rows': [[_month(row['month']), row['offers'], row['students'], _money(row['average_package'])]
+                         for row in monthly],
+            },
+            {
+                'title': 'Top roles',
+                'header': ['Job title', 'Offers', 'Average package', 'Highest package'],
+                'rows': [[row['job_title'], row['offers'], _money(row['average_package']), _money(row['highest_package'])]
+                         for row in roles],
+            },
+        ],
+    }
+
+
+def _student_analytics(company, start, end):
+    profiles = _placed_profiles(company, start, end)
+    totals = profiles.aggregate(
+        students=Count('id'), average_cgpa=Avg('cgpa'), ready=Count('id', filter=Q(is_placement_ready=True)),
+    )
+    departments = profiles.values('department').annotate(
+        students=Count('id'), average_cgpa=Avg('cgpa'),
+    ).order_by('-students', 'department')
+    packages = dict(
+        (row['department'], row['average_package'])
+        for row in _placements(company, start, end).annotate(
+            department=_department('student__placement_profile__department')
+        ).values('department').annotate(average_package=Avg('package_amount'))
+    )
+    batches = profiles.values('graduation_year').annotate(students=Count('id'), average_cgpa=Avg('cgpa')).order_by('graduation_year')
+    applications = _internship_applications(company, start, end).annotate(
+        department=_department('student__placement_profile__department')
+    ).values('department').annotate(
+        applications=Count('id'), selected=Count('id', filter=Q(status='selected')),
+    ).order_by('-applications')
+    return {
+        'summary': [
+            ('Placed students with a profile', totals['students']),
+            ('Average CGPA', round(totals['average_cgpa'] or 0, 2)),
+            ('Marked placement ready', totals['ready']),
+        ],
+        'tables': [
+            {
+                'title': 'Placed students by department',
+                'header': ['Department', 'Students', 'Average CGPA', 'Average package'],
+                'rows': [[row['department'] or 'Unknown', row['students'], round(row['average_cgpa'] or 0, 2),
+                          _money(packages.get(row['department']))] for row in departments],
+            },
+            {
+                'title': 'Placed students by graduation year',
+                'header': ['Graduation year', 'Students', 'Average CGPA'],
+                'rows': [[row['graduation_year'] or 'Unknown', row['students'], round(row['average_cgpa'] or 0, 2)]
+                         for row in batches],
+            },
+            {
+                'title': 'Internship applications by department',
+                'header': ['Department', 'Applications', 'Selected', 'Selection rate %'],
+                'rows': [[row['department'] or 'Unknown', row['applications'], row['selected'],
+                          _percent(row['selected'], row['applications'])] for row in applications],
+            },
+        ],
+    }
+
+
+def _company_performance(company, start, end):
+    placements = _placements(company, start, end).aggregate(offers=Count('id'), students=Count('student', distinct=True))
+    applications = _internship_applications(company, start, end)
+    by_status = applications.values('status').annotate(applications=Count('id')).order_by('-applications')
+    internships = applications.values('internship__title', 'internship__seats_available', 'internship__seats_filled').annotate(
+        applications=Count('id'),
+        shortlisted=Count('id', filter=Q(status__in=['shortlisted', 'interview_scheduled', 'interview_completed', 'selected'])),
+        selected=Count('id', filter=Q(status='selected')),
+    ).order_by('-applications', 'internship__title')[:TOP_ROWS]
+    jobs = _job_applications(company, start, end)
+    job_status = jobs.values('status').annotate(applications=Count('id')).order_by('-applications')
+    total_applications = applications.count()
+    selected = applications.filter(status='selected').count()
+    return {
+        'summary': [
+            ('Offers made', placements['offers']),
+            ('Students placed', placements['students']),
+            ('Internship applications', total_applications),
+            ('Internship selections', selected),
+            ('Selection rate %', _percent(selected, total_applications)),
+            ('Job applications', jobs.count()),
+        ],
+        'tables': [
+            {
+                'title': 'Internship applications by status',
+                'header': ['Status', 'Applications'],
+                'rows': [[INTERNSHIP_STATUS_LABELS.get(row['status'], row['status']), row['applications']]
+                         for row in by_status],
+            },
+            {
+                'title': 'Internships',
+                'header': ['Internship', 'Applications', 'Shortlisted', 'Selected', 'Seats filled', 'Seats'],
+                'rows': [[row['internship__title'], row['applications'], row['shortlisted'], row['selected'],
+                          row['internship__seats_filled'], row['internship__seats_available']] for row in internships],
+            },
+            {
+                'title': 'Job applications by status',
+                'header': ['Status', 'Applications'],
+                'rows': [[JOB_STATUS_LABELS.get(row['status'], row['status']), row['applications']]
+                         for row in job_status],
+            },
+        ],
+    }
+
+
+def _recruitment_trends(company, start, end):
+    months = {}
+
+    def merge(rows, column):
+        for row in rows:
+            months.setdefault(_month(row['month']), [0, 0, 0, 0])[column] = row['total']
+
+    merge(_placements(company, start, end).annotate(month=TruncMonth('placement_date'))
+          .values('month').annotate(total=Count('id')), 0)
+    merge(_internship_applications(company, start, end).annotate(month=TruncMonth('applied_at'))
+          .values('month').annotate(total=Count('id')), 1)
+    merge(_internship_applications(company, start, end).filter(status='selected').annotate(month=TruncMonth('applied_at'))
+          .values('month').annotate(total=Count('id')), 2)
+    merge(_job_applications(company, start, end).annotate(month=TruncMonth('applied_date'))
+          .values('month').annotate(total=Count('id')), 3)
+
+    rows = [[month] + counts for month, counts in sorted(months.items())]
+    busiest = max(rows, key=lambda row: row[1] + row[2] + row[4], default=None)
+    return {
+        'summary': [
+            ('Months with activity', len(rows)),
+            ('Offers', sum(row[1] for row in rows)),
+            ('Internship applications', sum(row[2] for row in rows)),
+            ('Job applications', sum(row[4] for row in rows)),
+            ('Busiest month', busiest[0] if busiest else ''),
+        ],
+        'tables': [{
+            'title': 'Activity by month',
+            'header': ['Month', 'Offers', 'Internship applications', 'Internship selections', 'Job applications'],
+            'rows': rows,
+        }],
+    }
+
+
+def _excel_analysis(company, start, end):
+    uploads = _uploads(company, start, end)
+    totals = uploads.aggregate(
+        files=Count('id'), records=Sum('total_records'), processed=Sum('processed_records'),
+        failed=Count('id', filter=Q(status='failed')),
+    )
+    by_type = uploads.values('upload_type').annotate(
+        files=Count('id'), records=Sum('total_records'), processed=Sum('processed_records'),
+        failed=Count('id', filter=Q(status='failed')),
+    ).order_by('upload_type')
+    return {
+        'summary': [
+            ('Files uploaded', totals['files']),
+            ('Rows read', totals['records'] or 0),
+            ('Rows imported', totals['processed'] or 0),
+            ('Import rate %', _percent(totals['processed'] or 0, totals['records'] or 0)),
+            ('Failed files', totals['failed']),
+        ],
+        'tables': [{
+            'title': 'Uploads by type',
+            'header': ['Upload type', 'Files', 'Rows read', 'Rows imported', 'Import rate %', 'Failed files'],
+            'rows': [[row['upload_type'], row['files'], row['records'] or 0, row['processed'] or 0,
+                      _percent(row['processed'] or 0, row['records'] or 0), row['failed']] for row in by_type],
+        }],
+    }
+
+
+BUILDERS = {
+    'placement_summary': _placement_summary,
+    'student_analytics': _student_analytics,
+    'company_performance': _company_performance,
+    'recruitment_trends': _recruitment_trends,
+    'excel_analysis': _excel_analysis,
+}
+
+
+def report_data(company, report_type, start, end, key=None):
+    """The report's numbers, cached under its key until the source rows change."""
+    key = key or report_key(company, report_type, start, end)
+    data = cache.get(f'report_data:{key}')
+    if data is None:
+        data = BUILDERS[report_type](company, start, end)
+        cache.set(f'report_data:{key}', data, getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600))
+    return data
+
+
+# Renderers: (title lines, data) -> bytes
+
+def _render_csv(heading, data):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line in heading:
+        writer.writerow([line])
+    writer.writerow([])
+    writer.writerow(['Summary'])
+    writer.writerows(data['summary'])
+    for table in data['tables']:
+        writer.writerow([])
+        writer.writerow([table['title']])
+        writer.writerow(table['header'])
+        writer.writerows(table['rows'])
+    return buffer.getvalue().encode('utf-8')
+
+
+def _render_pdf(heading, data):
+    """Requires reportlab (ImportError otherwise)."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ])
+    story = [Paragraph(heading[0], styles['Title'])]
+    story += [Paragraph(line, styles['Normal']) for line in heading[1:]]
+    story += [Spacer(1, 12), Table([['Summary', '']] + [[label, str(value)] for label, value in data['summary']],
+                                   style=table_style, hAlign='LEFT')]
+    for table in data['tables']:
+        story += [Spacer(1, 18), Paragraph(table['title'], styles['Heading3'])]
+        if table['rows']:
+            rows = [table['header']] + [[str(value) for value in row] for row in table['rows']]
+            story.append(Table(rows, style=table_style, hAlign='LEFT', repeatRows=1))
+        else:
+            story.append(Paragraph('No data in this range.', styles['Italic']))
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title=heading[0]).build(story)
+    return buffer.getvalue()
+
+
+def _render_xlsx(heading, data):
+    """Requires openpyxl (ImportError otherwise)."""
+    from openpyxl import Workbook
+
+    def cell(value):
+        return float(value) if isinstance(value, Decimal) else value
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Summary')
+    for line in heading:
+        sheet.append([line])
+    sheet.append([])
+    for label, value in data['summary']:
+        sheet.append([label, cell(value)])
+    for table in data['tables']:
+        # Sheet titles are limited to 31 characters
+        sheet = workbook.create_sheet(table['title'][:31])
+        sheet.append(table['header'])
+        for row in table['rows']:
+            sheet.append([cell(value) for value in row])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {'csv': _render_csv, 'pdf': _render_pdf, 'xlsx': _render_xlsx}
+
+
+def build_report(report):
+    """Render the report's file from its parameters (reusing a stored identical one) and save it"""
+    company = report.company
+    start, end = report_range(report.parameters)
+    report_format = report.parameters.get('format', DEFAULT_REPORT_FORMAT)
+    if report.report_type not in BUILDERS or report_format not in RENDERERS:
+        raise ReportError(f'Unsupported report: {report.report_type} as {report_format}')
+
+    key = report_key(company, report.report_type, start, end)
+    # The file shows the title, so reports only share a file when their titles match too;
+    # it carries no per-report timestamp (Report.generated_at has that)
+    heading = [
+        report.title,
+        f'Generated for: {company.company_name}',
+        f'Date range: {start} to {end}',
+    ]
+    file_key = hashlib.sha256(json.dumps([key, heading]).encode('utf-8')).hexdigest()
+    path = f'{REPORT_DIR}/{report.report_type}_{company.id}_{start:%Y%m%d}_{end:%Y%m%d}_{file_key[:16]}.{report_format}'
+    if not default_storage.exists(path):
+        data = report_data(company, report.report_type, start, end, key=key)
+        path = default_storage.save(path, ContentFile(RENDERERS[report_format](heading, data)))
+
+    report.file.name = path
+    report.parameters = {**report.parameters, 'format': report_format, 'data_key': key}
+    report.save(update_fields=['file', 'parameters'])
+    return report
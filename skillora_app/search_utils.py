@@ -0,0 +1,345 @@
+"""
+Full-text search over jobs, internships and courses
+
+Every job, published internship and course has a SearchDocument row (title;
+tags: company, location, skills, category; body: description, requirements,
+syllabus), written by signals on save (index_objects() for rows saved with
+bulk_create) and removed on delete. The database
+indexes those rows itself:
+
+    SQLite      an FTS5 virtual table over the documents (external content),
+                kept in step by triggers, ranked with bm25()
+    PostgreSQL  a generated, weighted tsvector column with a GIN index,
+                ranked with ts_rank()
+
+Other backends (or SQLite built without FTS5) fall back to icontains over the
+documents. search() is the one query API for all three catalogs; it returns
+SearchHits with an HTML snippet in which the matched words are wrapped in
+<mark> (the rest of the text is escaped). search_queryset() narrows and
+orders a Job/Internship/Course queryset by the same ranking for the list
+pages.
+
+Query words are prefix-matched and all must appear. A query naming a known
+skill by an alias ("js") also matches its canonical name ("javascript").
+SQLite drops a table's triggers when a migration rebuilds it, so
+``manage.py rebuild_search_index`` reinstalls the index and refills it.
+"""
+
+import html
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, TextField, Value, When
+from django.utils.safestring import mark_safe
+
+from .models import Course, Internship, Job, SearchDocument
+from .skill_utils import find_skill, normalize_skill
+
+DOCUMENT_TABLE = SearchDocument._meta.db_table
+FTS_TABLE = f'{DOCUMENT_TABLE}_fts'
+DEFAULT_SEARCH_RESULTS = 20
+SEARCH_MAX_RESULTS = 500
+MAX_QUERY_TERMS = 12
+SNIPPET_WORDS = 24
+# bm25() column weights, in FTS column order (title, tags, body)
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+# Snippet highlight markers, replaced by <mark> tags once the text is escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+SearchHit = namedtuple('SearchHit', 'kind object_id title rank snippet')
+
+
+# Documents
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def _job_document(job):
+    return job.title, _join(job.company, job.location, job.job_type), _join(job.description, job.requirements)
+
+
+def _internship_document(internship):
+    # .all() so rebuild_search_index's prefetch is used
+    skill_names = ', '.join(skill.name for skill in internship.required_skill_tags.all())
+    tags = _join(
+        internship.company.company_name, internship.company.industry, internship.location,
+        internship.required_skills, skill_names,
+    )
+    return internship.title, tags, _join(internship.description, internship.requirements)
+
+
+def _course_document(course):
+    tags = _join(course.category, course.level, course.skills)
+    return course.title, tags, _join(course.description, course.syllabus, course.additional_info)
+
+
+# model -> (kind, document builder, whether an instance is searchable)
+DOCUMENTS = {
+    Job: ('job', _job_document, lambda job: True),
+    Internship: ('internship', _internship_document, lambda internship: internship.status == 'published'),
+    Course: ('course', _course_document, lambda course: True),
+}
+KIND_MODELS = {kind: model for model, (kind, _, _) in DOCUMENTS.items()}
+
+
+def _document_values(build, instance):
+    title, tags, body = build(instance)
+    return {'title': title[:255], 'tags': tags, 'body': body}
+
+
+def index_object(instance):
+    """Write the search document of a saved job, internship or course (or drop it when not searchable)."""
+    kind, build, searchable = DOCUMENTS[type(instance)]
+    if not searchable(instance):
+        unindex_object(instance)
+        return
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk, defaults=_document_values(build, instance)
+    )
+
+
+def index_objects(instances):
+    """Write the search documents of newly created rows, which bulk_create saved without signals."""
+    documents = []
+    for instance in instances:
+        kind, build, searchable = DOCUMENTS[type(instance)]
+        if searchable(instance):
+            documents.append(SearchDocument(kind=kind, object_id=instance.pk, **_document_values(build, instance)))
+    SearchDocument.objects.bulk_create(documents)
+    return len(documents)
+
+
+def unindex_object(instance):
+    kind = DOCUMENTS[type(instance)][0]
+    SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
+
+
+def rebuild_search_index(batch_size=500):
+    """Reinstall the database index and rewrite every document; returns the number indexed."""
+    SearchDocument.objects.all().delete()
+    install_search_index()
+    indexed = 0
+    for model, (kind, build, searchable) in DOCUMENTS.items():
+        queryset = model.objects.all()
+        if model is Internship:
+            queryset = queryset.select_related('company').prefetch_related('required_skill_tags')
+        batch = []
+        for instance in queryset.iterator(chunk_size=batch_size):
+            if searchable(instance):
+                batch.append(SearchDocument(kind=kind, object_id=instance.pk, **_document_values(build, instance)))
+            if len(batch) == batch_size:
+                SearchDocument.objects.bulk_create(batch)
+                indexed += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        indexed += len(batch)
+    return indexed
+
+
+# Database index
+
+SQLITE_INDEX_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, tags, body, content='{DOCUMENT_TABLE}', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, body) VALUES ('delete', old.id, old.title, old.tags, old.body); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, body) VALUES ('delete', old.id, old.title, old.tags, old.body); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, tags, body) VALUES (new.id, new.title, new.tags, new.body); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+POSTGRESQL_INDEX_SQL = [
+    f"ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(body, '')), 'D')) STORED",
+    f"CREATE INDEX IF NOT EXISTS {DOCUMENT_TABLE}_vector_gin ON {DOCUMENT_TABLE} USING gin (search_vector)",
+]
+
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.skillora_fts5_probe USING fts5(probe)")
+    except Exception:
+        return False
+    cursor.execute("DROP TABLE temp.skillora_fts5_probe")
+    return True
+
+
+def install_search_index(using=connection):
+    """Create the backend's full-text index over SearchDocument if it is missing (no-op elsewhere)."""
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite' and _fts5_available(cursor):
+            for sql in SQLITE_INDEX_SQL:
+                cursor.execute(sql)
+        elif using.vendor == 'postgresql':
+            for sql in POSTGRESQL_INDEX_SQL:
+                cursor.execute(sql)
+
+
+def search_backend():
+    """'fts5', 'postgresql' or 'basic' (icontains) for the default database."""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return 'fts5'
+    return 'basic'
+
+
+# Queries
+
+def query_terms(query):
+    """The lowercased words of a query (letters, digits, underscores), at most MAX_QUERY_TERMS."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_QUERY_TERMS]
+
+
+def _alternatives(query):
+    """Term lists any of which may match: the query's words, plus a skill's canonical name it is an alias of."""
+    terms = query_terms(query)
+    alternatives = [terms] if terms else []
+    skill = find_skill(query) if terms else None
+    if skill is not None and skill.name != normalize_skill(query):
+        canonical = query_terms(skill.name)
+        if canonical and canonical != terms:
+            alternatives.append(canonical)
+    return alternatives
+
+
+def _fts5_expression(alternatives):
+    return ' OR '.join('(' + ' '.join(f'"{term}"*' for term in terms) + ')' for terms in alternatives)
+
+
+def _tsquery_expression(alternatives):
+    return ' | '.join('(' + ' & '.join(f'{term}:*' for term in terms) + ')' for terms in alternatives)
+
+
+def format_snippet(raw):
+    """Escape a marked snippet and turn the markers into <mark> tags."""
+    escaped = html.escape(raw or '')
+    return mark_safe(escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def _python_snippet(text, terms):
+    """Snippet for the icontains fallback: words around the first match, matches marked."""
+    words = text.split()
+    lowered = [word.lower() for word in words]
+    first = next((i for i, word in enumerate(lowered) if any(term in word for term in terms)), 0)
+    start = max(0, first - SNIPPET_WORDS // 3)
+    window = words[start:start + SNIPPET_WORDS]
+    marked = [
+        f'{MARK_START}{word}{MARK_END}' if any(term in word.lower() for term in terms) else word for word in window
+    ]
+    prefix = '… ' if start else ''
+    suffix = ' …' if start + SNIPPET_WORDS < len(words) else ''
+    return prefix + ' '.join(marked) + suffix
+
+
+def _kinds_clause(kinds, column='kind'):
+    return f"{column} IN ({', '.join(['%s'] * len(kinds))})"
+
+
+def _within_clause(within, column='object_id'):
+    """SQL narrowing documents to the rows of the ``within`` queryset (a subquery), and its params."""
+    if within is None:
+        return '', []
+    sql, params = within.order_by().values('pk').query.sql_with_params()
+    return f" AND {column} IN ({sql})", list(params)
+
+
+def _search_fts5(alternatives, kinds, limit, offset, within=None):
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    within_sql, within_params = _within_clause(within, 'd.object_id')
+    sql = (
+        f"SELECT d.kind, d.object_id, d.title, bm25({FTS_TABLE}, {weights}) AS rank, "
+        f"snippet({FTS_TABLE}, -1, %s, %s, '…', {SNIPPET_WORDS}) "
+        f"FROM {FTS_TABLE} JOIN {DOCUMENT_TABLE} d ON d.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND {_kinds_clause(kinds, 'd.kind')}{within_sql} "
+        f"ORDER BY rank, d.id LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            MARK_START, MARK_END, _fts5_expression(alternatives), *kinds, *within_params, limit, offset,
+        ])
+        # bm25() is lower for better matches
+        return [(kind, pk, title, -rank, snippet) for kind, pk, title, rank, snippet in cursor.fetchall()]
+
+
+def _search_postgresql(alternatives, kinds, limit, offset, within=None):
+    options = f'StartSel="{MARK_START}", StopSel="{MARK_END}", MaxWords={SNIPPET_WORDS}, MinWords=8'
+    within_sql, within_params = _within_clause(within)
+    sql = (
+        f"SELECT kind, object_id, title, ts_rank(search_vector, query) AS rank, "
+        f"ts_headline('english', concat_ws(' ', title, tags, body), query, %s) "
+        f"FROM {DOCUMENT_TABLE}, to_tsquery('english', %s) query "
+        f"WHERE search_vector @@ query AND {_kinds_clause(kinds)}{within_sql} "
+        f"ORDER BY rank DESC, id LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [options, _tsquery_expression(alternatives), *kinds, *within_params, limit, offset])
+        return cursor.fetchall()
+
+
+def _search_basic(alternatives, kinds, limit, offset, within=None):
+    condition = Q()
+    for terms in alternatives:
+        matches_all = Q()
+        for term in terms:
+            matches_all &= Q(title__icontains=term) | Q(tags__icontains=term) | Q(body__icontains=term)
+        condition |= matches_all
+    documents = SearchDocument.objects.filter(condition, kind__in=kinds).order_by('-updated_at', 'id')
+    if within is not None:
+        documents = documents.filter(object_id__in=within.order_by().values('pk'))
+    all_terms = [term for terms in alternatives for term in terms]
+    return [
+        (document.kind, document.object_id, document.title, 0.0,
+         _python_snippet(_join(document.title, document.body), all_terms))
+        for document in documents[offset:offset + limit]
+    ]
+
+
+BACKENDS = {'fts5': _search_fts5, 'postgresql': _search_postgresql, 'basic': _search_basic}
+
+
+def search(query, kinds=None, limit=DEFAULT_SEARCH_RESULTS, offset=0, within=None):
+    """
+    Ranked SearchHits for ``query`` among the given kinds ('job', 'internship',
+    'course'; all by default), best first. ``rank`` is higher for better
+    matches and only comparable within one backend. ``within`` (a Job,
+    Internship or Course queryset) restricts the search to its rows before
+    ranking, and to its kind.
+    """
+    if within is not None:
+        kinds = [DOCUMENTS[within.model][0]]
+    kinds = list(kinds or KIND_MODELS)
+    unknown = set(kinds) - set(KIND_MODELS)
+    if unknown:
+        raise ValueError(f"Unknown search kind(s): {', '.join(sorted(unknown))}")
+    alternatives = _alternatives(query)
+    if not alternatives or limit <= 0:
+        return []
+    rows = BACKENDS[search_backend()](alternatives, kinds, limit, offset, within)
+    return [
+        SearchHit(kind, object_id, title, rank, format_snippet(snippet))
+        for kind, object_id, title, rank, snippet in rows
+    ]
+
+
+def search_queryset(queryset, query, limit=SEARCH_MAX_RESULTS):
+    """
+    ``queryset`` (jobs, internships or courses) narrowed to its best ``limit``
+    matches of ``query`` in rank order, with ``search_snippet`` annotated. The
+    queryset's own filters apply before ranking, so a filtered page never loses
+    matches that rank below other rows of the kind.
+    """
+    hits = search(query, limit=limit, within=queryset)
+    if not hits:
+        return queryset.none()
+    position = Case(*[When(pk=hit.object_id, then=Value(i)) for i, hit in enumerate(hits)], output_field=IntegerField())
+    snippet = Case(*[When(pk=hit.object_id, then=Value(str(hit.snippet))) for hit in hits], output_field=TextField())
+    return queryset.filter(pk__in=[hit.object_id for hit in hits]).annotate(
+        search_position=position, search_snippet=snippet
+    ).order_by('search_position')
@@ -0,0 +1,363 @@
+"""
+Signal handlers keeping denormalized data in sync with the models it is derived from
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .autocomplete_utils import update_autocomplete
+from .enrollment_utils import sync_enrollments
+from .job_utils import enqueue
+from .models import (Assignment, BackgroundJob, Company, Course, CourseMaterial, Enrollment, Internship,
+                     InternshipApplication, Job, PlacementRecord, ScheduledClass, Skill, SkillAlias, Student,
+                     StudentProfile, StudentProgress, UserProfile)
+from .progress_utils import adjust_course_totals, adjust_progress_counts, recount_progress
+from .recommendation_utils import schedule_recommendation_invalidation
+from .search_utils import index_object, unindex_object
+from .skill_utils import SKILL_FIELDS, sync_skill_tags
+from .stats_utils import schedule_dashboard_stats_refresh, schedule_teacher_stats_refresh
+
+
+# Progress counters
+
+def _item_kind(sender):
+    return 'materials' if sender is CourseMaterial else 'assignments'
+
+
+@receiver(pre_save, sender=CourseMaterial)
+@receiver(pre_save, sender=Assignment)
+def remember_publish_state(sender, instance, **kwargs):
+    """Keep the stored course/publish state so post_save can apply the difference"""
+    instance._previous_publish_state = None
+    if instance.pk:
+        instance._previous_publish_state = sender.objects.filter(pk=instance.pk).values(
+            'course_id', 'is_published'
+        ).first()
+
+
+@receiver(post_save, sender=CourseMaterial)
+@receiver(post_save, sender=Assignment)
+def update_course_totals_on_save(sender, instance, created, **kwargs):
+    """Count an item towards its course's published total when it is published or moved"""
+    previous = getattr(instance, '_previous_publish_state', None)
+    current = {'course_id': instance.course_id, 'is_published': instance.is_published}
+    if previous == current:
+        return
+    kind = _item_kind(sender)
+    if previous and previous['is_published']:
+        adjust_course_totals(previous['course_id'], **{kind: -1})
+    if instance.is_published:
+        adjust_course_totals(instance.course_id, **{kind: 1})
+    # Percentages moved, and with them the instructors' progress averages
+    schedule_teacher_stats_refresh(course_ids=[previous and previous['course_id'], instance.course_id])
+
+
+@receiver(pre_delete, sender=CourseMaterial)
+@receiver(pre_delete, sender=Assignment)
+def release_progress_on_delete(sender, instance, **kwargs):
+    """Cascading deletes of M2M rows send no m2m_changed, so drop the counts here"""
+    if sender is CourseMaterial:
+        progress_ids = list(StudentProgress.objects.filter(materials_viewed=instance).values_list('id', flat=True))
+    else:
+        progress_ids = list(StudentProgress.objects.filter(assignments_completed=instance).values_list('id', flat=True))
+    if progress_ids:
+        adjust_progress_counts(progress_ids, **{_item_kind(sender): -1})
+
+
+@receiver(post_delete, sender=CourseMaterial)
+@receiver(post_delete, sender=Assignment)
+def update_course_totals_on_delete(sender, instance, **kwargs):
+    if instance.is_published:
+        adjust_course_totals(instance.course_id, **{_item_kind(sender): -1})
+    schedule_teacher_stats_refresh(course_ids=[instance.course_id])
+
+
+def _progress_m2m_changed(kind, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # Remember who is affected before the rows disappear
+        if reverse:
+            field = 'materials_viewed' if kind == 'materials' else 'assignments_completed'
+            instance._cleared_progress_ids = list(
+                StudentProgress.objects.filter(**{field: instance}).values_list('id', flat=True)
+            )
+        return
+
+    if action == 'post_add' and pk_set:
+        if reverse:
+            adjust_progress_counts(pk_set, **{kind: 1})
+        else:
+            adjust_progress_counts([instance.pk], **{kind: len(pk_set)})
+    elif action == 'post_remove' and pk_set:
+        # pk_set holds what was requested, not what existed, so recount
+        recount_progress(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        if reverse:
+            recount_progress(getattr(instance, '_cleared_progress_ids', []))
+        else:
+            recount_progress([instance.pk])
+    else:
+        return
+    # Progress rows and course items both belong to one course, whose instructor's average moved
+    schedule_teacher_stats_refresh(course_ids=[instance.course_id])
+
+
+@receiver(m2m_changed, sender=StudentProgress.materials_viewed.through)
+def update_progress_on_material_viewed(sender, **kwargs):
+    _progress_m2m_changed('materials', **kwargs)
+
+
+@receiver(m2m_changed, sender=StudentProgress.assignments_completed.through)
+def update_progress_on_assignment_completed(sender, **kwargs):
+    _progress_m2m_changed('assignments', **kwargs)
+
+
+# Enrollment index
+
+def _sync_enrollments(pairs):
+    """Sync the index rows and refresh the stats of the affected courses' teachers"""
+    pairs = list(pairs)
+    sync_enrollments(pairs)
+    schedule_teacher_stats_refresh(course_ids=[course_id for _, course_id in pairs])
+
+
+def _enrollment_pairs(instance, pk_set):
+    if isinstance(instance, Student):
+        return [(instance.pk, course_id) for course_id in pk_set]
+    return [(student_id, instance.pk) for student_id in pk_set]
+
+
+def _enrollment_m2m_changed(sender, instance, action, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The cleared ids are not passed to post_clear, so collect them first
+        lookup = 'student_id' if isinstance(instance, Student) else 'course_id'
+        instance._cleared_enrollment_pairs = list(
+            sender.objects.filter(**{lookup: instance.pk}).values_list('student_id', 'course_id')
+        )
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _sync_enrollments(_enrollment_pairs(instance, pk_set))
+    elif action == 'post_clear':
+        _sync_enrollments(getattr(instance, '_cleared_enrollment_pairs', []))
+
+
+@receiver(m2m_changed, sender=Student.courses_enrolled.through)
+def update_index_on_student_courses(sender, **kwargs):
+    _enrollment_m2m_changed(sender, **kwargs)
+
+
+@receiver(m2m_changed, sender=Course.students_enrolled.through)
+def update_index_on_course_students(sender, **kwargs):
+    _enrollment_m2m_changed(sender, **kwargs)
+
+
+def _enrollment_pair(user_id, course_id):
+    student_id = Student.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    return (student_id, course_id)
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_enrollment_pair(sender, instance, **kwargs):
+    instance._previous_enrollment = None
+    if instance.pk:
+        instance._previous_enrollment = sender.objects.filter(pk=instance.pk).values_list('user_id', 'course_id').first()
+
+
+@receiver(post_save, sender=Enrollment)
+def update_index_on_enrollment_save(sender, instance, **kwargs):
+    pairs = [_enrollment_pair(instance.user_id, instance.course_id)]
+    previous = getattr(instance, '_previous_enrollment', None)
+    if previous and previous != (instance.user_id, instance.course_id):
+        pairs.append(_enrollment_pair(*previous))
+    _sync_enrollments(pairs)
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_index_on_enrollment_delete(sender, instance, **kwargs):
+    # May be part of a cascade (course, user, payment), so sync once the delete has settled
+    pair = _enrollment_pair(instance.user_id, instance.course_id)
+    transaction.on_commit(lambda: sync_enrollments([pair]))
+    schedule_teacher_stats_refresh(course_ids=[instance.course_id])
+
+
+@receiver(post_save, sender=Student)
+def index_enrollments_for_new_student(sender, instance, created, **kwargs):
+    """Enrollments are keyed on the user, so pick up any made before the Student row existed"""
+    if created:
+        course_ids = Enrollment.objects.filter(user_id=instance.user_id, is_active=True).values_list('course_id', flat=True)
+        _sync_enrollments([(instance.pk, course_id) for course_id in course_ids])
+
+
+# Teacher stats
+
+@receiver(pre_save, sender=Course)
+def remember_course_instructor(sender, instance, **kwargs):
+    instance._previous_instructor_id = None
+    if instance.pk:
+        instance._previous_instructor_id = sender.objects.filter(pk=instance.pk).values_list('instructor_id', flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+def refresh_stats_on_course_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_instructor_id', None)
+    if created or previous != instance.instructor_id:
+        schedule_teacher_stats_refresh(teacher_ids=[previous, instance.instructor_id])
+
+
+@receiver(post_delete, sender=Course)
+def refresh_stats_on_course_delete(sender, instance, **kwargs):
+    schedule_teacher_stats_refresh(teacher_ids=[instance.instructor_id])
+
+
+@receiver(post_save, sender=ScheduledClass)
+@receiver(post_delete, sender=ScheduledClass)
+def refresh_stats_on_scheduled_class(sender, instance, **kwargs):
+    schedule_teacher_stats_refresh(teacher_ids=[instance.teacher_id])
+
+
+# Company dashboard snapshot
+
+@receiver(pre_save, sender=PlacementRecord)
+def remember_placement_company(sender, instance, **kwargs):
+    instance._previous_company_id = None
+    if instance.pk:
+        instance._previous_company_id = sender.objects.filter(pk=instance.pk).values_list('company_id', flat=True).first()
+
+
+@receiver(post_save, sender=PlacementRecord)
+@receiver(post_delete, sender=PlacementRecord)
+def refresh_dashboard_on_placement(sender, instance, **kwargs):
+    schedule_dashboard_stats_refresh([getattr(instance, '_previous_company_id', None), instance.company_id])
+
+
+# Skill index
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=UserProfile)
+@receiver(pre_save, sender=Internship)
+@receiver(pre_save, sender=StudentProfile)
+def remember_skills_text(sender, instance, **kwargs):
+    text_field, _ = SKILL_FIELDS[sender]
+    instance._previous_skills_text = None
+    if instance.pk:
+        instance._previous_skills_text = sender.objects.filter(pk=instance.pk).values_list(text_field, flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=Internship)
+@receiver(post_save, sender=StudentProfile)
+def update_skill_tags_on_save(sender, instance, created, **kwargs):
+    """Re-link the skill rows when the comma-separated field was added or edited"""
+    text_field, _ = SKILL_FIELDS[sender]
+    if created or getattr(instance, '_previous_skills_text', None) != getattr(instance, text_field):
+        sync_skill_tags(sender, [instance])
+
+
+# Recommendation cache
+
+# Internship fields that decide whether and how well it matches
+MATCH_FIELDS = (
+    'status', 'seats_available', 'seats_filled', 'application_deadline', 'required_skills', 'location',
+    'internship_type', 'has_placement_potential', 'company_id',
+)
+
+
+def _refresh_all_recommendations():
+    schedule_recommendation_invalidation()
+
+    def queue_rebuild():
+        if not BackgroundJob.objects.filter(task='refresh_recommendations', status='queued').exists():
+            enqueue('refresh_recommendations')
+
+    transaction.on_commit(queue_rebuild)
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_delete, sender=InternshipApplication)
+def invalidate_student_recommendations(sender, instance, **kwargs):
+    schedule_recommendation_invalidation([instance.student_id])
+
+
+@receiver(post_save, sender=InternshipApplication)
+def invalidate_recommendations_on_apply(sender, instance, created, **kwargs):
+    """Applied-to internships drop out of the student's matches; status changes do not matter"""
+    if created:
+        schedule_recommendation_invalidation([instance.student_id])
+
+
+@receiver(pre_save, sender=Internship)
+def remember_match_fields(sender, instance, **kwargs):
+    instance._previous_match_fields = None
+    if instance.pk:
+        instance._previous_match_fields = sender.objects.filter(pk=instance.pk).values(*MATCH_FIELDS).first()
+
+
+@receiver(post_save, sender=Internship)
+def invalidate_recommendations_on_internship_save(sender, instance, **kwargs):
+    """Published, closed, filled or edited while published: any student's matches may change"""
+    previous = getattr(instance, '_previous_match_fields', None)
+    current = {field: getattr(instance, field) for field in MATCH_FIELDS}
+    was_published = previous is not None and previous['status'] == 'published'
+    if previous != current and (was_published or instance.status == 'published'):
+        _refresh_all_recommendations()
+
+
+@receiver(post_delete, sender=Internship)
+def invalidate_recommendations_on_internship_delete(sender, instance, **kwargs):
+    if instance.status == 'published':
+        _refresh_all_recommendations()
+
+
+# Search index
+
+@receiver(post_save, sender=Job)
+@receiver(post_save, sender=Internship)
+@receiver(post_save, sender=Course)
+def update_search_document(sender, instance, **kwargs):
+    """Registered after the skill index handlers, so an internship's canonical skills are linked already"""
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Job)
+@receiver(post_delete, sender=Internship)
+@receiver(post_delete, sender=Course)
+def remove_search_document(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+@receiver(post_save, sender=Company)
+def update_company_internship_documents(sender, instance, created, **kwargs):
+    """Internship documents carry the company name and industry"""
+    if not created:
+        for internship in instance.internships_posted.filter(status='published').prefetch_related('required_skill_tags'):
+            index_object(internship)
+
+
+# Autocomplete index
+
+@receiver(post_save, sender=Job)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Internship)
+@receiver(post_save, sender=Skill)
+def update_autocomplete_on_save(sender, instance, **kwargs):
+    update_autocomplete(instance)
+
+
+@receiver(post_delete, sender=Job)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Internship)
+@receiver(post_delete, sender=Skill)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    update_autocomplete(instance, deleted=True)
+
+
+@receiver(post_save, sender=SkillAlias)
+@receiver(post_delete, sender=SkillAlias)
+def update_autocomplete_on_alias(sender, instance, **kwargs):
+    """A skill's aliases are matched as its words"""
+    skill = Skill.objects.filter(pk=instance.skill_id).first()
+    if skill is not None:
+        update_autocomplete(skill)
@@ -0,0 +1,136 @@
+"""
+Normalized skills
+
+Course.skills, UserProfile.skills, Internship.required_skills and
+StudentProfile.skills stay comma-separated text (the forms edit them as
+such), and each is mirrored into a ManyToMany of canonical Skill rows on save
+(signals), so skill lookups are indexed joins:
+
+    Skill 'python' -> .internships, .student_profiles, .user_profiles, .courses
+
+A raw skill is normalized (lowercase, single spaces, no trailing
+punctuation) and mapped through SkillAlias ("js" -> "javascript", "ml" ->
+"machine learning", ...). Skills not seen before are created, keeping the
+first spelling as display_name. bulk_create sends no signals, so bulk
+imports call sync_skill_tags() and ``manage.py rebuild_skill_index``
+re-links everything after aliases change.
+"""
+
+from django.db.models import Q
+
+from .models import Course, Internship, Skill, SkillAlias, StudentProfile, UserProfile
+
+# model -> (text field, ManyToMany field)
+SKILL_FIELDS = {
+    Course: ('skills', 'skill_tags'),
+    UserProfile: ('skills', 'skill_tags'),
+    Internship: ('required_skills', 'required_skill_tags'),
+    StudentProfile: ('skills', 'skill_tags'),
+}
+MAX_SKILL_LENGTH = 100
+
+
+def normalize_skill(text):
+    """The lookup key of a raw skill: 'Machine  Learning.' -> 'machine learning'."""
+    return ' '.join(text.lower().split()).strip(' .,;:')[:MAX_SKILL_LENGTH]
+
+
+def split_skills(text):
+    """(key, spelling) for each distinct skill of a comma-separated field, in order."""
+    skills = {}
+    for item in (text or '').split(','):
+        key = normalize_skill(item)
+        if key and key not in skills:
+            skills[key] = ' '.join(item.split())[:MAX_SKILL_LENGTH]
+    return list(skills.items())
+
+
+def canonical_names(keys):
+    """Map normalized keys to canonical skill names through SkillAlias."""
+    aliases = dict(SkillAlias.objects.filter(alias__in=keys).values_list('alias', 'skill__name'))
+    return {key: aliases.get(key, key) for key in keys}
+
+
+def resolve_skills(spellings, create=True):
+    """
+    {key: Skill} for an iterable of (key, spelling) pairs, creating unknown
+    skills unless ``create`` is False (then they are left out).
+    """
+    spellings = dict(spellings)
+    canonical = canonical_names(list(spellings))
+    names = set(canonical.values())
+    skills = {skill.name: skill for skill in Skill.objects.filter(name__in=names)}
+    missing = names - set(skills)
+    if missing and create:
+        display = {}
+        for key, name in canonical.items():
+            display.setdefault(name, spellings[key])
+        Skill.objects.bulk_create(
+            [Skill(name=name, display_name=display[name]) for name in missing], ignore_conflicts=True
+        )
+        skills.update((skill.name, skill) for skill in Skill.objects.filter(name__in=missing))
+    return {key: skills[name] for key, name in canonical.items() if name in skills}
+
+
+def find_skill(text):
+    """The existing Skill a raw name refers to (aliases included), or None."""
+    key = normalize_skill(text)
+    return resolve_skills([(key, text)], create=False).get(key) if key else None
+
+
+def sync_skill_tags(model, instances):
+    """
+    Re-link the skill ManyToMany of ``instances`` (saved rows of ``model``)
+    from their text field with a fixed number of queries.
+    """
+    text_field, m2m_field = SKILL_FIELDS[model]
+    instances = [instance for instance in instances if instance.pk]
+    if not instances:
+        return
+    parsed = {instance.pk: split_skills(getattr(instance, text_field)) for instance in instances}
+    skills = resolve_skills(pair for pairs in parsed.values() for pair in pairs)
+
+    through = getattr(model, m2m_field).through
+    source = f'{model._meta.model_name}_id'
+    through.objects.filter(**{f'{source}__in': list(parsed)}).delete()
+    links = {
+        (pk, skills[key].pk)
+        for pk, pairs in parsed.items()
+        for key, _ in pairs
+        if key in skills
+    }
+    through.objects.bulk_create([through(**{source: pk, 'skill_id': skill_id}) for pk, skill_id in links])
+
+
+def rebuild_skill_index(batch_size=1000):
+    """Re-link every row of every skill model; returns the number of rows processed."""
+    processed = 0
+    for model, (text_field, _) in SKILL_FIELDS.items():
+        batch = []
+        for instance in model.objects.only('pk', text_field).iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) == batch_size:
+                sync_skill_tags(model, batch)
+                processed += len(batch)
+                batch = []
+        sync_skill_tags(model, batch)
+        processed += len(batch)
+    return processed
+
+
+def internships_requiring(text):
+    """Internships that list a skill (any spelling of it)."""
+    skill = find_skill(text)
+    return Internship.objects.filter(required_skill_tags=skill) if skill else Internship.objects.none()
+
+
+def students_with_skill(text):
+    """Student profiles that list a skill (any spelling of it)."""
+    skill = find_skill(text)
+    return StudentProfile.objects.filter(skill_tags=skill) if skill else StudentProfile.objects.none()
+
+
+def skill_search_filter(search, m2m_field):
+    """Q matching rows linked to the skill named by ``search``, for combining with other search terms."""
+    skill = find_skill(search)
+    return Q(**{m2m_field: skill}) if skill else Q(pk__in=[])
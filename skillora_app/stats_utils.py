@@ -0,0 +1,361 @@
+"""
+Precomputed dashboard statistics
+
+TeacherStats rows are refreshed after the transactions that change a teacher's
+courses, enrollments, scheduled classes or student progress commit, and
+periodically by ``manage.py refresh_teacher_stats``. Page views only read
+them. A row older than settings.TEACHER_STATS_MAX_AGE (upcoming classes drift
+without any event) is still served, and the view queues a background refresh.
+A missing row is computed in memory until that refresh has saved it.
+
+The company dashboard snapshot (DashboardStats plus one DepartmentStats row per
+department and batch) is rebuilt when a company's placement records change
+and by ``manage.py refresh_dashboard_stats``. Student and user counts change
+without a placement event, so a dashboard read that finds the snapshot older
+than settings.DASHBOARD_STATS_MAX_AGE queues a background rebuild and serves
+the stale snapshot meanwhile.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import (BackgroundJob, Company, Course, DashboardStats, DepartmentStats, EnrollmentIndex,
+                     PlacementRecord, ScheduledClass, Student, StudentProfile, StudentProgress, Teacher,
+                     TeacherStats)
+
+STATS_FIELDS = ('total_students', 'total_courses', 'upcoming_classes', 'student_progress_avg')
+
+DASHBOARD_FIELDS = (
+    'total_students', 'total_offers', 'placement_rate', 'placed_students', 'not_placed',
+    'highest_package', 'average_package', 'max_stipend', 'iqac_approved', 'iqac_pending',
+    'iqac_rejected', 'partner_companies', 'students_with_profiles', 'total_users', 'active_users',
+)
+
+# DepartmentStats.batch_year is required; students without a graduation year go here
+UNKNOWN_BATCH = 0
+
+DEPARTMENT_BREAKDOWN_KEY = 'dashboard:department-breakdown:{}:{}'
+
+
+def compute_teacher_stats(teacher_ids):
+    """Return {teacher_id: stats dict} computed with one grouped query per figure."""
+    teacher_ids = list(teacher_ids)
+    stats = {
+        teacher_id: {
+            'total_students': 0,
+            'total_courses': 0,
+            'upcoming_classes': 0,
+            'student_progress_avg': Decimal('0.00'),
+        }
+        for teacher_id in teacher_ids
+    }
+    if not teacher_ids:
+        return stats
+
+    for row in Course.objects.filter(instructor_id__in=teacher_ids).values('instructor_id').annotate(total=Count('id')):
+        stats[row['instructor_id']]['total_courses'] = row['total']
+    # Enrollments summed over courses, as the teacher pages have always counted them
+    for row in EnrollmentIndex.objects.filter(
+        course__instructor_id__in=teacher_ids
+    ).values('course__instructor_id').annotate(total=Count('id')):
+        stats[row['course__instructor_id']]['total_students'] = row['total']
+    for row in ScheduledClass.objects.filter(
+        teacher_id__in=teacher_ids
+    ).values('teacher_id').annotate(
+        total=Count('id', filter=Q(scheduled_date__gt=timezone.now(), is_completed=False))
+    ):
+        stats[row['teacher_id']]['upcoming_classes'] = row['total']
+    for row in StudentProgress.objects.filter(
+        course__instructor_id__in=teacher_ids
+    ).values('course__instructor_id').annotate(average=Avg('progress_percentage')):
+        if row['average'] is not None:
+            stats[row['course__instructor_id']]['student_progress_avg'] = Decimal(
+                str(row['average'])
+            ).quantize(Decimal('0.01'))
+    return stats
+
+
+def refresh_teacher_stats(teacher_ids=None, batch_size=500):
+    """Recompute and store TeacherStats for the given teachers (all by default)."""
+    if teacher_ids is None:
+        teacher_ids = Teacher.objects.values_list('id', flat=True)
+    teacher_ids = set(Teacher.objects.filter(id__in=list(teacher_ids)).values_list('id', flat=True))
+    computed = compute_teacher_stats(teacher_ids)
+    now = timezone.now()
+
+    existing = {row.teacher_id: row for row in TeacherStats.objects.filter(teacher_id__in=teacher_ids)}
+    to_create = []
+    for teacher_id, values in computed.items():
+        row = existing.get(teacher_id)
+        if row is None:
+            to_create.append(TeacherStats(teacher_id=teacher_id, refreshed_at=now, **values))
+            continue
+        for field, value in values.items():
+            setattr(row, field, value)
+        row.refreshed_at = now
+    TeacherStats.objects.bulk_update(existing.values(), list(STATS_FIELDS) + ['refreshed_at'], batch_size=batch_size)
+    TeacherStats.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+    return len(computed)
+
+
+def schedule_teacher_stats_refresh(teacher_ids=(), course_ids=()):
+    """Refresh the stats of the given teachers, or of the courses' instructors, once the transaction commits."""
+    teacher_ids = {teacher_id for teacher_id in teacher_ids if teacher_id}
+    course_ids = {course_id for course_id in course_ids if course_id}
+    if not teacher_ids and not course_ids:
+        return
+
+    def refresh():
+        ids = set(teacher_ids)
+        if course_ids:
+            ids.update(Course.objects.filter(id__in=course_ids, instructor__isnull=False).values_list('instructor_id', flat=True))
+        if ids:
+            refresh_teacher_stats(ids)
+
+    transaction.on_commit(refresh)
+
+
+def queue_stats_refresh(task, **payload):
+    """Queue a background stats refresh unless one for the same row is already waiting or running."""
+    # job_utils imports this module (through ingestion_utils)
+    from .job_utils import enqueue
+    filters = {f'payload__{key}': value for key, value in payload.items()}
+    if not BackgroundJob.objects.filter(task=task, status__in=('queued', 'running'), **filters).exists():
+        enqueue(task, max_attempts=1, **payload)
+
+
+def load_teacher_stats(teacher):
+    """
+    Copy the teacher's stats onto the instance for the templates and return it.
+
+    Nothing is saved here: a missing or stale row queues a background refresh,
+    meanwhile the stale row is served (a missing one is computed in memory).
+    """
+    max_age = timedelta(seconds=getattr(settings, 'TEACHER_STATS_MAX_AGE', 900))
+    row = TeacherStats.objects.filter(teacher=teacher).first()
+    if row is None or row.refreshed_at < timezone.now() - max_age:
+        queue_stats_refresh('refresh_teacher_stats', teacher_id=teacher.pk)
+    if row is None:
+        values = compute_teacher_stats([teacher.pk])[teacher.pk]
+    else:
+        values = {field: getattr(row, field) for field in STATS_FIELDS}
+    for field, value in values.items():
+        setattr(teacher, field, value)
+    return teacher
+
+
+# Company dashboard
+
+def _rate(part, total):
+    return (Decimal(part * 100) / total).quantize(Decimal('0.01')) if total else Decimal('0.00')
+
+
+def _amount(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def department_batch_rows(company):
+    """
+    Students and students placed by ``company`` per (department, graduation year),
+    for every department present in the data, in one grouped query.
+    """
+    placed_here = Q(student__placement_records__company=company)
+    return list(StudentProfile.objects.values('department', 'graduation_year').annotate(
+        total=Count('id', distinct=True),
+        placed=Count('student', distinct=True, filter=placed_here),
+    ).order_by('department', 'graduation_year'))
+
+
+def compute_dashboard_stats(company_ids):
+    """
+    Return {company_id: (stats dict, department rows)}: three platform-wide
+    aggregates shared by all companies, then one placement aggregate and one
+    department/batch query per company.
+    """
+    company_ids = list(company_ids)
+    if not company_ids:
+        return {}
+
+    students = Student.objects.aggregate(
+        total=Count('id'),
+        with_profiles=Count('id', filter=Q(placement_profile__isnull=False)),
+    )
+    users = User.objects.aggregate(total=Count('id'), active=Count('id', filter=Q(is_active=True)))
+    partner_companies = Company.objects.count()
+
+    placements = {
+        row['company_id']: row
+        for row in PlacementRecord.objects.filter(company_id__in=company_ids).values('company_id').annotate(
+            total_offers=Count('id'),
+            placed_students=Count('student', distinct=True),
+            highest_package=Max('package_amount'),
+            average_package=Avg('package_amount'),
+            max_stipend=Max('stipend_amount'),
+            iqac_approved=Count('id', filter=Q(iqac_status='approved')),
+            iqac_pending=Count('id', filter=Q(iqac_status='pending')),
+            iqac_rejected=Count('id', filter=Q(iqac_status='rejected')),
+        )
+    }
+
+    snapshot = {}
+    for company_id in company_ids:
+        row = placements.get(company_id, {})
+        placed = row.get('placed_students', 0)
+        stats = {
+            'total_students': students['total'],
+            'total_offers': row.get('total_offers', 0),
+            'placement_rate': _rate(placed, students['total']),
+            'placed_students': placed,
+            'not_placed': max(students['total'] - placed, 0),
+            'highest_package': _amount(row.get('highest_package')),
+            'average_package': _amount(row.get('average_package')),
+            'max_stipend': _amount(row.get('max_stipend')),
+            'iqac_approved': row.get('iqac_approved', 0),
+            'iqac_pending': row.get('iqac_pending', 0),
+            'iqac_rejected': row.get('iqac_rejected', 0),
+            'partner_companies': partner_companies,
+            'students_with_profiles': students['with_profiles'],
+            'total_users': users['total'],
+            'active_users': users['active'],
+        }
+        departments = [
+            {
+                'department_name': dept['department'],
+                'batch_year': dept['graduation_year'] or UNKNOWN_BATCH,
+                'total_students': dept['total'],
+                'placed_students': dept['placed'],
+                'placement_percentage': _rate(dept['placed'], dept['total']),
+            }
+            for dept in department_batch_rows(company_id)
+        ]
+        snapshot[company_id] = (stats, departments)
+    return snapshot
+
+
+def refresh_dashboard_stats(company_ids=None):
+    """Rebuild the dashboard snapshot of the given companies (all by default)."""
+    if company_ids is None:
+        company_ids = Company.objects.values_list('id', flat=True)
+    company_ids = set(Company.objects.filter(id__in=list(company_ids)).values_list('id', flat=True))
+    computed = compute_dashboard_stats(company_ids)
+    now = timezone.now()
+
+    existing = {}
+    for row in DashboardStats.objects.filter(company_id__in=company_ids).order_by('-last_updated', '-id'):
+        existing.setdefault(row.company_id, row)
+
+    with transaction.atomic():
+        to_update, to_create = [], []
+        for company_id, (values, _) in computed.items():
+            row = existing.get(company_id)
+            if row is None:
+                to_create.append(DashboardStats(company_id=company_id, last_updated=now, **values))
+                continue
+            # higher_studies and the other outcome counts are entered by hand, so keep them
+            for field, value in values.items():
+                setattr(row, field, value)
+            row.last_updated = now
+            to_update.append(row)
+        DashboardStats.objects.bulk_update(to_update, list(DASHBOARD_FIELDS) + ['last_updated'])
+        DashboardStats.objects.bulk_create(to_create)
+
+        DepartmentStats.objects.filter(company_id__in=company_ids).delete()
+        DepartmentStats.objects.bulk_create([
+            DepartmentStats(company_id=company_id, **department)
+            for company_id, (_, departments) in computed.items()
+            for department in departments
+        ], batch_size=500)
+    return len(computed)
+
+
+def schedule_dashboard_stats_refresh(company_ids):
+    """Rebuild the companies' dashboard snapshots once the transaction commits."""
+    company_ids = {company_id for company_id in company_ids if company_id}
+    if company_ids:
+        transaction.on_commit(lambda: refresh_dashboard_stats(company_ids))
+
+
+def load_dashboard_stats(company):
+    """
+    Return the company's DashboardStats snapshot without writing it. One that is
+    missing or older than settings.DASHBOARD_STATS_MAX_AGE queues a background
+    rebuild; meanwhile the stale snapshot is returned, or an unsaved one
+    computed in memory when there is none yet.
+    """
+    max_age = timedelta(seconds=getattr(settings, 'DASHBOARD_STATS_MAX_AGE', 300))
+    row = DashboardStats.objects.filter(company=company).order_by('-last_updated', '-id').first()
+    if row is None or row.last_updated < timezone.now() - max_age:
+        queue_stats_refresh('refresh_dashboard_stats', company_id=company.pk)
+    if row is None:
+        values, _ = compute_dashboard_stats([company.pk])[company.pk]
+        row = DashboardStats(company=company, last_updated=timezone.now(), **values)
+    return row
+
+
+def department_batch_counts(company):
+    """Number of distinct departments and graduation batches in the company's snapshot."""
+    return DepartmentStats.objects.filter(company=company).aggregate(
+        departments=Count('department_name', distinct=True, filter=~Q(department_name='')),
+        batches=Count('batch_year', distinct=True, filter=~Q(batch_year=UNKNOWN_BATCH)),
+    )
+
+
+def _breakdown_entries(totals, label):
+    return [
+        {label: key, 'total_students': total, 'placed_students': placed,
+         'placement_rate': float(_rate(placed, total))}
+        for key, (total, placed) in sorted(totals.items())
+    ]
+
+
+def department_breakdown(company, snapshot=None):
+    """
+    Placement breakdown by department, by batch and by both for the reports
+    tab, built from department_batch_rows() and cached per company until the
+    next snapshot rebuild (at most settings.DASHBOARD_STATS_MAX_AGE).
+
+    The cache key includes the snapshot's last_updated, read from the
+    database, so a rebuild by any process (the worker, another gunicorn
+    worker) retires the cached value even with a per-process cache backend.
+    """
+    if snapshot is None:
+        snapshot = DashboardStats.objects.filter(company=company).order_by('-last_updated', '-id').first()
+    # An unsaved snapshot (load_dashboard_stats before the first rebuild) counts as none
+    version = snapshot.last_updated.timestamp() if snapshot is not None and snapshot.pk is not None else 0
+    key = DEPARTMENT_BREAKDOWN_KEY.format(company.pk, version)
+    breakdown = cache.get(key)
+    if breakdown is not None:
+        return breakdown
+
+    by_department, by_batch, combined = {}, {}, []
+    for row in department_batch_rows(company):
+        total, placed = row['total'], row['placed']
+        if row['department']:
+            counts = by_department.setdefault(row['department'], [0, 0])
+            counts[0] += total
+            counts[1] += placed
+        if row['graduation_year'] is not None:
+            counts = by_batch.setdefault(row['graduation_year'], [0, 0])
+            counts[0] += total
+            counts[1] += placed
+        combined.append({
+            'department': row['department'],
+            'batch': row['graduation_year'],
+            'total_students': total,
+            'placed_students': placed,
+            'placement_rate': float(_rate(placed, total)),
+        })
+    breakdown = {
+        'department_stats': _breakdown_entries(by_department, 'department'),
+        'batch_stats': _breakdown_entries(by_batch, 'batch'),
+        'department_batch_stats': combined,
+    }
+    cache.set(key, breakdown, getattr(settings, 'DASHBOARD_STATS_MAX_AGE', 300))
+    return breakdown
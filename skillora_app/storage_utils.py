@@ -0,0 +1,209 @@
+"""
+Content-addressed media storage
+
+Resumes, submissions, offer letters and verification documents are often the
+same bytes uploaded again under another name. DedupFileSystemStorage keeps
+each distinct content once, as ``blobs/ab/cd/<sha256><ext>`` under
+MEDIA_ROOT (a MediaBlob row), and every name it hands out is a hard link to
+that blob, recorded as a StoredFile. Names therefore resolve like any
+FileSystemStorage name: path() and url() need no query, and downloads keep
+their original file names. Blobs are reference-counted: deleting a name drops
+one reference and the blob file goes with the last one. On a filesystem
+without hard links the name gets a copy instead (correct, but not deduplicated).
+
+The SHA-256 is computed while the upload streams in (HashingMemoryFileUploadHandler
+and HashingTemporaryFileUploadHandler in FILE_UPLOAD_HANDLERS), so saving a
+file whose content is already stored writes no data. Content saved without a
+precomputed hash is spooled to a temporary file and hashed in the same pass.
+
+Files saved before this storage was enabled are plain files under their name;
+``manage.py dedup_media`` moves them into the blob store (and links any
+StoredFile name that has no file yet), and ``manage.py dedup_media --stats``
+reports the savings.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import MediaBlob, StoredFile
+
+BLOB_DIR = 'blobs'
+
+
+class HashingUploadMixin:
+    """Hash upload chunks as they arrive and attach the digest as ``content_sha256``."""
+
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # This handler kept the chunk; one that passes it on leaves hashing to the next
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.content_sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def blob_name(sha256, name):
+    """Storage-relative path of the blob for ``sha256``, keeping the extension of ``name``."""
+    extension = os.path.splitext(name)[1].lower()[:10]
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256 + extension)
+
+
+class DedupFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage that stores identical content once (see module docstring)."""
+
+    def exists(self, name):
+        return StoredFile.objects.filter(name=name).exists() or super().exists(name)
+
+    def _spool(self, content):
+        """Copy ``content`` to a temporary file beside the blobs; returns (temp path, sha256, size)."""
+        directory = super().path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(handle, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, digest.hexdigest(), size
+
+    def _link(self, blob_path, name):
+        """Point ``name`` at the blob's file, replacing whatever file had that name."""
+        source = self.path(blob_path)
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f'{target}.{uuid.uuid4().hex}.tmp'
+        try:
+            try:
+                os.link(source, temp_path)
+            except OSError:
+                # No hard links here (or across devices): fall back to a copy
+                shutil.copyfile(source, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _add_reference(self, name, sha256, size, temp_path=None, content=None):
+        """
+        Record ``name`` as one more reference to the blob of ``sha256`` and link it,
+        writing the blob from ``temp_path`` (moved) or ``content`` when it is new.
+        Returns the temporary file if it was not used.
+        """
+        with transaction.atomic():
+            blob, _ = MediaBlob.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'path': blob_name(sha256, name), 'size': size}
+            )
+            target = self.path(blob.path)
+            if not os.path.exists(target):
+                if temp_path is None:
+                    temp_path, _, _ = self._spool(content)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp_path, target)
+                temp_path = None
+                if self.file_permissions_mode is not None:
+                    os.chmod(target, self.file_permissions_mode)
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            StoredFile.objects.create(name=name, blob=blob)
+            self._link(blob.path, name)
+        return temp_path
+
+    def _save(self, name, content):
+        sha256 = getattr(content, 'content_sha256', None)
+        temp_path = None
+        if sha256 is None:
+            temp_path, sha256, size = self._spool(content)
+        else:
+            size = content.size
+        try:
+            temp_path = self._add_reference(name, sha256, size, temp_path=temp_path, content=content)
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+        return name
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        with transaction.atomic():
+            stored = StoredFile.objects.filter(name=name).first()
+            if stored is None:
+                return super().delete(name)
+            blob = MediaBlob.objects.select_for_update().get(pk=stored.blob_id)
+            stored.delete()
+            super().delete(name)
+            blob.ref_count -= 1
+            if blob.ref_count > 0:
+                blob.save(update_fields=['ref_count'])
+                return
+            blob.delete()
+            # Removed under the row lock so a concurrent save of the same bytes rewrites it
+            super().delete(blob.path)
+
+    def adopt(self, name):
+        """Move a file saved before this storage was enabled into the blob store, keeping its name."""
+        with open(self.path(name), 'rb') as handle:
+            temp_path, sha256, size = self._spool(File(handle))
+        try:
+            temp_path = self._add_reference(name, sha256, size, temp_path=temp_path)
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+
+    def link_missing(self):
+        """Link every StoredFile name that has no file of its own (names recorded before names were links)."""
+        linked = 0
+        for name, blob_path in StoredFile.objects.values_list('name', 'blob__path').iterator():
+            if not os.path.lexists(self.path(name)):
+                self._link(blob_path, name)
+                linked += 1
+        return linked
+
+
+def dedup_stats():
+    """Files, blobs and bytes saved by storing identical content once."""
+    blobs = MediaBlob.objects.aggregate(blobs=Count('id'), stored_bytes=Sum('size'))
+    files = StoredFile.objects.aggregate(files=Count('id'), logical_bytes=Sum('blob__size'))
+    stored_bytes = blobs['stored_bytes'] or 0
+    logical_bytes = files['logical_bytes'] or 0
+    return {
+        'files': files['files'],
+        'blobs': blobs['blobs'],
+        'duplicate_files': files['files'] - blobs['blobs'],
+        'logical_bytes': logical_bytes,
+        'stored_bytes': stored_bytes,
+        'saved_bytes': logical_bytes - stored_bytes,
+        'dedup_ratio': round(logical_bytes / stored_bytes, 2) if stored_bytes else None,
+    }
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from .models import MediaBlob, StoredFile
+from .storage_utils import DedupFileSystemStorage
+
+
+class DedupFileSystemStorageTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = DedupFileSystemStorage(location=self.root, base_url='/media/')
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('resumes/alice.pdf', ContentFile(b'same bytes'))
+        second = self.storage.save('resumes/bob.pdf', ContentFile(b'same bytes'))
+
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(StoredFile.objects.filter(blob=blob).count(), 2)
+        self.assertEqual(os.stat(self.storage.path(first)).st_ino, os.stat(self.storage.path(second)).st_ino)
+        with self.storage.open(second) as handle:
+            self.assertEqual(handle.read(), b'same bytes')
+
+    def test_names_resolve_without_queries(self):
+        name = self.storage.save('submissions/report.pdf', ContentFile(b'content'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.storage.url(name), '/media/submissions/report.pdf')
+            self.assertEqual(self.storage.path(name), os.path.join(self.root, 'submissions', 'report.pdf'))
+
+    def test_taken_names_get_a_new_name(self):
+        self.storage.save('docs/offer.pdf', ContentFile(b'one'))
+        second = self.storage.save('docs/offer.pdf', ContentFile(b'two'))
+
+        self.assertNotEqual(second, 'docs/offer.pdf')
+        self.assertEqual(MediaBlob.objects.count(), 2)
+
+    def test_delete_drops_one_reference(self):
+        first = self.storage.save('a.txt', ContentFile(b'shared'))
+        second = self.storage.save('b.txt', ContentFile(b'shared'))
+        blob = MediaBlob.objects.get()
+
+        self.storage.delete(first)
+
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertFalse(self.storage.exists(first))
+        self.assertTrue(os.path.exists(self.storage.path(blob.path)))
+        with self.storage.open(second) as handle:
+            self.assertEqual(handle.read(), b'shared')
+
+    def test_deleting_the_last_reference_removes_the_blob(self):
+        name = self.storage.save('a.txt', ContentFile(b'only copy'))
+        blob_path = self.storage.path(MediaBlob.objects.get().path)
+
+        self.storage.delete(name)
+
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertFalse(os.path.exists(blob_path))
+        self.assertFalse(os.path.exists(self.storage.path(name)))
+
+    def test_adopt_moves_a_legacy_file_into_the_blob_store(self):
+        self.storage.save('new.txt', ContentFile(b'legacy bytes'))
+        legacy = os.path.join(self.root, 'old', 'legacy.txt')
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, 'wb') as handle:
+            handle.write(b'legacy bytes')
+
+        self.storage.adopt('old/legacy.txt')
+
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertTrue(StoredFile.objects.filter(name='old/legacy.txt', blob=blob).exists())
+        self.assertEqual(os.stat(legacy).st_ino, os.stat(self.storage.path(blob.path)).st_ino)
+
+    def test_link_missing_restores_names_without_a_file(self):
+        name = self.storage.save('a.txt', ContentFile(b'bytes'))
+        os.remove(self.storage.path(name))
+
+        self.assertEqual(self.storage.link_missing(), 1)
+        with self.storage.open(name) as handle:
+            self.assertEqual(handle.read(), b'bytes')
+
+    def test_uploads_with_a_precomputed_hash_are_not_rehashed(self):
+        self.storage.save('a.txt', ContentFile(b'uploaded'))
+        upload = ContentFile(b'uploaded')
+        upload.content_sha256 = MediaBlob.objects.get().sha256
+
+        name = self.storage.save('b.txt', upload)
+
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        with self.storage.open(name) as handle:
+            self.assertEqual(handle.read(), b'uploaded')
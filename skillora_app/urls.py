@@ -39,6 +39,8 @@ urlpatterns = [
     path('teacher/payments/', views.teacher_payments, name='teacher_payments'),
     path('teacher/payments/approve/<str:payment_id>/', views.approve_payment, name='approve_payment'),
     path('teacher/payments/export/', views.export_payments_pdf, name='export_payments_pdf'),
+    path('teacher/payments/export/<int:job_id>/', views.download_payments_pdf, name='download_payments_pdf'),
+    path('teacher/payments/export/data/', views.export_payments_data, name='export_payments_data'),
     path('teacher/payments/analytics/', views.payment_analytics, name='payment_analytics'),
     path('teacher/create-course/', views.create_course, name='create_course'),
     path('teacher/edit-course/<int:course_id>/', views.edit_course, name='edit_course'),
@@ -83,6 +85,7 @@ urlpatterns = [
     path('api/dashboard/students/', views.dashboard_students_api, name='dashboard_students_api'),
     path('api/dashboard/placements/', views.dashboard_placements_api, name='dashboard_placements_api'),
     path('api/dashboard/reports/', views.dashboard_reports_api, name='dashboard_reports_api'),
+    path('api/dashboard/jobs/', views.dashboard_jobs_api, name='dashboard_jobs_api'),
     path('api/dashboard/users/', views.dashboard_users_api, name='dashboard_users_api'),
     path('api/dashboard/add-student/', views.add_student, name='add_student'),
     path('api/dashboard/add-placement/', views.add_placement, name='add_placement'),
@@ -91,6 +94,7 @@ urlpatterns = [
     path('api/dashboard/delete-user/', views.delete_user, name='delete_user'),
     path('api/dashboard/edit-student/', views.edit_student, name='edit_student'),
     path('api/dashboard/edit-placement/', views.edit_placement, name='edit_placement'),
+    path('api/internships/<int:internship_id>/candidates/', views.internship_candidates_api, name='internship_candidates_api'),
     
     # Cart and Payment Routes
     path('add-to-cart/<int:course_id>/', views.add_to_cart, name='add_to_cart'),
@@ -103,6 +107,8 @@ urlpatterns = [
     path('my-certificates/', views.my_certificates, name='my_certificates'),
     path('certificate/<str:certificate_id>/', views.view_certificate, name='view_certificate'),
     path('api/chatbot/', views.chatbot_api, name='chatbot_api'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/autocomplete/', views.autocomplete_api, name='autocomplete_api'),
     path('download-receipt/<str:payment_id>/', views.download_receipt, name='download_receipt'),
     
     # Skill Category Detail Route
@@ -0,0 +1,649 @@
+"""
+Document verification for AIVerification uploads
+
+Offer letters, resumes and certificates are analysed offline in two stages:
+
+1. Analysis (expensive, memoized): the file's text is extracted (PDF, DOCX or
+   plain text), dates, amounts and e-mail addresses are pulled out of it, and
+   a perceptual hash (dHash) of the letterhead is computed with Pillow. The
+   result is stored in DocumentAnalysis under the file's SHA-256, so an
+   identical re-upload skips this stage entirely.
+2. Checks (cheap, run every time): the extracted fields are compared with the
+   company's PlacementRecords, Students, Certificates and earlier
+   verifications. Each check passes, fails or does not apply; the confidence
+   score is the weighted share of applicable checks that passed.
+
+New documents are analysed by the background worker (job_utils); a document
+whose analysis is already stored is answered in the request by
+verify_if_known(). PDF text is read with pypdf when it is installed, with a
+built-in reader of uncompressed/Flate text streams otherwise. Scanned images
+have no text layer (there is no OCR), so they are marked failed for manual
+review after the letterhead and duplicate checks.
+"""
+
+import base64
+import binascii
+import hashlib
+import re
+import zipfile
+import zlib
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from io import BytesIO
+from itertools import combinations
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from PIL import Image
+
+from .models import AIVerification, Certificate, Company, DocumentAnalysis, PlacementRecord
+
+# Bump when extraction changes so stored analyses are recomputed
+ANALYSIS_VERSION = 1
+MAX_DOCUMENT_SIZE = 20 * 1024 * 1024
+MAX_TEXT_LENGTH = 100000
+MAX_PDF_PAGES = 20
+MAX_EXTRACTED_VALUES = 50
+# Top share of a scanned page treated as the letterhead
+LETTERHEAD_BAND = 0.2
+# dHash bits that may differ for two letterheads to count as the same design
+LETTERHEAD_DISTANCE = 6
+# The hash is also stored as four indexed 16-bit parts (DocumentAnalysis.letterhead_part0-3)
+LETTERHEAD_PARTS = 4
+LETTERHEAD_PART_BITS = 16
+AMOUNT_TOLERANCE = Decimal('0.01')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+AMOUNT_UNITS = {
+    'k': 1000, 'lakh': 100000, 'lakhs': 100000, 'lac': 100000, 'lacs': 100000, 'lpa': 100000,
+    'cr': 10000000, 'crore': 10000000, 'crores': 10000000,
+}
+
+_MONTH = r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+_ISO_DATE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+_NUMERIC_DATE = re.compile(r'\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b')
+_DAY_MONTH_DATE = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?\s+' + _MONTH + r',?\s+(\d{4})\b', re.I)
+_MONTH_DAY_DATE = re.compile(r'\b' + _MONTH + r'\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b', re.I)
+_AMOUNT = re.compile(
+    r'(?:₹|\brs\.?|\binr)\s*(\d[\d,]*(?:\.\d+)?)(?:\s*(lakhs?|lacs?|lpa|crores?|cr|k)\b)?'
+    r'|\b(\d[\d,]*(?:\.\d+)?)\s*(lpa|lakhs?|lacs?|crores?)\b',
+    re.I,
+)
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+_PHONE = re.compile(r'(?<![\d-])(?:\+\d{1,3}[\s-]?)?\d{5}[\s-]?\d{5}(?![\d-])')
+_CERTIFICATE_ID = re.compile(r'\b[A-Za-z0-9]{16}\b')
+
+_PDF_STREAM = re.compile(rb'(?<!end)stream\r?\n')
+_PDF_FILTER = re.compile(rb'/(FlateDecode|ASCII85Decode|ASCIIHexDecode|DCTDecode)\b')
+_PDF_TEXT = re.compile(
+    rb'\[((?:\\.|[^\]\\])*)\]\s*TJ|\(((?:\\.|[^\\)])*)\)\s*(?:Tj|\'|")|(T\*|Td|TD|ET)\b',
+    re.S,
+)
+_PDF_STRING = re.compile(rb'\(((?:\\.|[^\\)])*)\)|(-?\d+(?:\.\d+)?)', re.S)
+_PDF_ESCAPE = re.compile(rb'\\([0-7]{1,3}|\r\n|.)', re.S)
+_PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f', b'\n': b'', b'\r': b'', b'\r\n': b''}
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class DocumentError(Exception):
+    """The document cannot be read; the verification is marked failed."""
+
+
+# Analysis stage
+
+def file_hash(fileobj):
+    """SHA-256 of an uploaded or stored file, read in chunks unless the upload handler already hashed it."""
+    if getattr(fileobj, 'content_sha256', None):
+        return fileobj.content_sha256
+    digest = hashlib.sha256()
+    for chunk in fileobj.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_type(data, name):
+    if data.startswith(b'%PDF'):
+        return 'pdf'
+    if data.startswith(b'PK') and name.lower().endswith('.docx'):
+        return 'docx'
+    if name.lower().endswith(IMAGE_EXTENSIONS):
+        return 'image'
+    if name.lower().endswith('.txt'):
+        return 'text'
+    raise DocumentError('Unsupported document type. Upload a PDF, DOCX, text file or scanned image.')
+
+
+def _pdf_unescape(raw):
+    def replace(match):
+        escape = match.group(1)
+        if escape[:1].isdigit():
+            return bytes([int(escape, 8) & 0xFF])
+        return _PDF_ESCAPES.get(escape, escape)
+    return _PDF_ESCAPE.sub(replace, raw).decode('latin-1')
+
+
+def _pdf_streams(data):
+    """Yield (filters, stream dictionary, decoded bytes) for each stream of a PDF; JPEG images stay encoded."""
+    for match in _PDF_STREAM.finditer(data):
+        end = data.find(b'endstream', match.end())
+        if end < 0:
+            return
+        header = data[data.rfind(b'obj', 0, match.start()):match.start()]
+        filters = [name.decode('ascii') for name in _PDF_FILTER.findall(header)]
+        body = data[match.end():end].rstrip(b'\r\n')
+        try:
+            for name in filters:
+                if name == 'FlateDecode':
+                    body = zlib.decompressobj().decompress(body)
+                elif name == 'ASCII85Decode':
+                    body = base64.a85decode(body.strip().removesuffix(b'~>'))
+                elif name == 'ASCIIHexDecode':
+                    body = binascii.unhexlify(re.sub(rb'\s', b'', body.strip().removesuffix(b'>')))
+                else:
+                    break
+        except (zlib.error, ValueError, binascii.Error):
+            continue
+        yield filters, header, body
+
+
+def _pdf_text_fallback(data):
+    parts = []
+    for filters, header, body in _pdf_streams(data):
+        if b'/Image' in header or 'DCTDecode' in filters:
+            continue
+        for array, string, operator in _PDF_TEXT.findall(body):
+            if operator:
+                parts.append('\n')
+            elif string:
+                parts.append(_pdf_unescape(string))
+            else:
+                for piece, offset in _PDF_STRING.findall(array):
+                    if piece:
+                        parts.append(_pdf_unescape(piece))
+                    elif float(offset) < -200:
+                        parts.append(' ')
+    return ''.join(parts)
+
+
+def _pdf_text(data, fileobj):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return _pdf_text_fallback(data)
+    try:
+        fileobj.seek(0)
+        pages = PdfReader(fileobj).pages[:MAX_PDF_PAGES]
+        return '\n'.join(page.extract_text() or '' for page in pages)
+    except Exception:
+        # pypdf rejects some damaged files the simple reader can still make sense of
+        return _pdf_text_fallback(data)
+
+
+def _docx_text(archive):
+    names = sorted(name for name in archive.namelist() if re.fullmatch(r'word/header\d*\.xml', name))
+    parts = []
+    for name in names + ['word/document.xml']:
+        if name not in archive.namelist():
+            raise DocumentError('The DOCX file has no document body.')
+        with archive.open(name) as xml:
+            for _, element in ElementTree.iterparse(xml):
+                if element.tag == _WORD_NS + 't':
+                    parts.append(element.text or '')
+                elif element.tag == _WORD_NS + 'tab':
+                    parts.append('\t')
+                elif element.tag in (_WORD_NS + 'p', _WORD_NS + 'br'):
+                    parts.append('\n')
+                    element.clear()
+    return ''.join(parts)
+
+
+def _dhash(image):
+    """64-bit difference hash as 16 hex digits; '' for a blank image."""
+    image.draft('L', (64, 64))
+    gray = image.convert('L')
+    low, high = gray.getextrema()
+    if high - low < 8:
+        return ''
+    pixels = list(gray.resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
+def _image_hash(raw, band=None):
+    try:
+        with Image.open(BytesIO(raw)) as image:
+            if band:
+                image = image.crop((0, 0, image.width, max(1, int(image.height * band))))
+            return _dhash(image)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return ''
+
+
+def _pdf_letterhead(data):
+    # The first embedded JPEG is almost always the letterhead logo
+    for filters, header, body in _pdf_streams(data):
+        if 'DCTDecode' in filters:
+            return _image_hash(body)
+    return ''
+
+
+def _docx_letterhead(archive):
+    media = sorted(name for name in archive.namelist() if name.startswith('word/media/'))
+    for name in media:
+        letterhead = _image_hash(archive.read(name))
+        if letterhead:
+            return letterhead
+    return ''
+
+
+def _parse_amount(number, unit):
+    try:
+        value = Decimal(number.replace(',', ''))
+    except InvalidOperation:
+        return None
+    return value * AMOUNT_UNITS.get((unit or '').lower(), 1)
+
+
+def extract_fields(text):
+    """Dates (ISO strings), amounts (rupees, as strings) and e-mail addresses found in ``text``."""
+    dates = set()
+    candidates = [(year, month, day) for year, month, day in _ISO_DATE.findall(text)]
+    candidates += [(year, month, day) for day, month, year in _NUMERIC_DATE.findall(text)]
+    candidates += [(year, MONTHS[month.lower()], day) for day, month, year in _DAY_MONTH_DATE.findall(text)]
+    candidates += [(year, MONTHS[month.lower()], day) for month, day, year in _MONTH_DAY_DATE.findall(text)]
+    for year, month, day in candidates:
+        try:
+            dates.add(date(int(year), int(month), int(day)).isoformat())
+        except ValueError:
+            continue
+
+    amounts = set()
+    for number, unit, bare_number, bare_unit in _AMOUNT.findall(text):
+        value = _parse_amount(number or bare_number, unit or bare_unit)
+        if value:
+            amounts.add(value.normalize())
+
+    emails = {email.lower().rstrip('.') for email in _EMAIL.findall(text)}
+    return {
+        'version': ANALYSIS_VERSION,
+        'dates': sorted(dates)[:MAX_EXTRACTED_VALUES],
+        'amounts': [f'{amount:f}' for amount in sorted(amounts)][:MAX_EXTRACTED_VALUES],
+        'emails': sorted(emails)[:MAX_EXTRACTED_VALUES],
+        # Candidate Skillora certificate ids (case-sensitive, so kept from the raw text)
+        'reference_ids': sorted(set(_CERTIFICATE_ID.findall(text)))[:MAX_EXTRACTED_VALUES],
+        'has_phone': bool(_PHONE.search(text)),
+    }
+
+
+def analyse_document(fileobj, name):
+    """Extract text, fields and the letterhead hash of an open document (DocumentError if unreadable)."""
+    data = fileobj.read(MAX_DOCUMENT_SIZE + 1)
+    if len(data) > MAX_DOCUMENT_SIZE:
+        raise DocumentError(f'Documents larger than {MAX_DOCUMENT_SIZE // (1024 * 1024)} MB are not analysed.')
+    file_type = _file_type(data, name)
+
+    text = letterhead = ''
+    if file_type == 'pdf':
+        text = _pdf_text(data, fileobj)
+        letterhead = _pdf_letterhead(data)
+    elif file_type == 'docx':
+        try:
+            with zipfile.ZipFile(fileobj) as archive:
+                text = _docx_text(archive)
+                letterhead = _docx_letterhead(archive)
+        except (zipfile.BadZipFile, ElementTree.ParseError):
+            raise DocumentError('The DOCX file is damaged.')
+    elif file_type == 'text':
+        text = data.decode('utf-8', errors='replace')
+    else:
+        letterhead = _image_hash(data, band=LETTERHEAD_BAND)
+
+    text = re.sub(r'[ \t]+', ' ', text).strip()[:MAX_TEXT_LENGTH]
+    return {
+        'file_type': file_type,
+        'text': text,
+        'extracted': extract_fields(text),
+        'letterhead_hash': letterhead,
+    }
+
+
+def stored_analysis(content_hash):
+    """The memoized analysis for ``content_hash``, or None (also when it predates ANALYSIS_VERSION)."""
+    analysis = DocumentAnalysis.objects.filter(content_hash=content_hash).first()
+    if analysis is None or analysis.extracted.get('version') != ANALYSIS_VERSION:
+        return None
+    return analysis
+
+
+def letterhead_parts(letterhead_hash):
+    """{field: value} of the hash's indexed 16-bit parts, high bits first (None without a letterhead)."""
+    value = int(letterhead_hash, 16) if letterhead_hash else None
+    mask = (1 << LETTERHEAD_PART_BITS) - 1
+    return {
+        f'letterhead_part{index}': (
+            None if value is None
+            else value >> (LETTERHEAD_PART_BITS * (LETTERHEAD_PARTS - 1 - index)) & mask
+        )
+        for index in range(LETTERHEAD_PARTS)
+    }
+
+
+def _store_analysis(content_hash, result):
+    result = {**result, **letterhead_parts(result['letterhead_hash'])}
+    try:
+        with transaction.atomic():
+            analysis, _ = DocumentAnalysis.objects.update_or_create(content_hash=content_hash, defaults=result)
+    except IntegrityError:
+        # Another worker analysed the same file at the same moment
+        analysis = DocumentAnalysis.objects.get(content_hash=content_hash)
+    return analysis
+
+
+# Checks stage
+
+def _normalize(text):
+    return ' ' + ' '.join(re.findall(r'[a-z0-9]+', text.lower())) + ' '
+
+
+def _mentions(normalized_text, phrase):
+    phrase = _normalize(phrase)
+    return len(phrase.strip()) >= 2 and phrase in normalized_text
+
+
+def _check(checks, name, passed, weight, detail):
+    checks.append({'name': name, 'passed': passed, 'weight': weight, 'detail': detail})
+
+
+def _amount_matches(amounts, *expected):
+    for value in expected:
+        if not value:
+            continue
+        if any(abs(amount - value) <= value * AMOUNT_TOLERANCE for amount in amounts):
+            return True
+    return False
+
+
+def _hamming(first, second):
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+def _part_neighbours(value, bits):
+    """``value`` and every value differing from it in at most ``bits`` of its LETTERHEAD_PART_BITS."""
+    values = {value}
+    for count in range(1, bits + 1):
+        for positions in combinations(range(LETTERHEAD_PART_BITS), count):
+            flipped = value
+            for position in positions:
+                flipped ^= 1 << position
+            values.add(flipped)
+    return values
+
+
+def _similar_letterheads(verification, analysis):
+    """
+    Company ids of earlier verified documents whose letterhead looks the same.
+
+    Two hashes within LETTERHEAD_DISTANCE bits differ in at most
+    LETTERHEAD_DISTANCE // LETTERHEAD_PARTS bits in at least one of their
+    parts, so only rows with a part that close to ours (found through the part
+    indexes) can match; their full distance is checked here.
+    """
+    if not analysis.letterhead_hash:
+        return set()
+    near_parts = Q()
+    for field, value in letterhead_parts(analysis.letterhead_hash).items():
+        near_parts |= Q(**{f'{field}__in': _part_neighbours(value, LETTERHEAD_DISTANCE // LETTERHEAD_PARTS)})
+    near = [
+        content_hash
+        for content_hash, letterhead in DocumentAnalysis.objects.filter(near_parts).exclude(
+            content_hash=analysis.content_hash
+        ).values_list('content_hash', 'letterhead_hash')
+        if _hamming(letterhead, analysis.letterhead_hash) <= LETTERHEAD_DISTANCE
+    ]
+    if not near:
+        return set()
+    return set(
+        AIVerification.objects.filter(content_hash__in=near, status='verified')
+        .exclude(pk=verification.pk).values_list('company_id', flat=True)
+    )
+
+
+def _letterhead_check(checks, verification, analysis):
+    companies = _similar_letterheads(verification, analysis)
+    if not analysis.letterhead_hash:
+        passed, detail = None, 'No letterhead image found'
+    elif not companies:
+        passed, detail = None, 'No earlier verified document with this letterhead'
+    elif verification.company_id in companies:
+        passed, detail = True, 'Letterhead matches documents this company verified before'
+    else:
+        passed, detail = False, "Letterhead matches another company's verified documents"
+    _check(checks, 'letterhead_consistent', passed, 1, detail)
+
+
+def _offer_letter_checks(checks, matches, verification, text, extracted):
+    company = verification.company
+    _check(checks, 'company_named', _mentions(text, company.company_name), 2,
+           f'Looked for "{company.company_name}" in the letter')
+
+    others = [name for name in Company.objects.exclude(pk=company.pk).values_list('company_name', flat=True)
+              if _mentions(text, name)]
+    if others:
+        matches['other_companies'] = others[:10]
+
+    records = PlacementRecord.objects.filter(company=company).values(
+        'id', 'student_id', 'job_title', 'package_amount', 'stipend_amount', 'placement_date',
+        'student__user__first_name', 'student__user__last_name',
+    )
+    candidates = list(records.annotate(email=Lower('student__user__email')).filter(email__in=extracted['emails']))
+    if not candidates:
+        candidates = [
+            record for record in records.iterator()
+            if record['student__user__first_name'] and record['student__user__last_name']
+            and _mentions(text, f"{record['student__user__first_name']} {record['student__user__last_name']}")
+        ]
+
+    amounts = [Decimal(amount) for amount in extracted['amounts']]
+    dates = set(extracted['dates'])
+
+    def agreement(record):
+        return (
+            _amount_matches(amounts, record['package_amount'], record['stipend_amount'])
+            + (record['placement_date'].isoformat() in dates)
+            + _mentions(text, record['job_title'])
+        )
+
+    record = max(candidates, key=agreement, default=None)
+    _check(checks, 'candidate_identified', record is not None, 3,
+           'Matched a placement record of this company by e-mail or name' if record
+           else 'No placement record of this company names this candidate')
+    if record is None:
+        return
+    matches['placement_record_id'] = record['id']
+    matches['student_id'] = record['student_id']
+
+    if record['package_amount'] or record['stipend_amount']:
+        _check(checks, 'amount_matches', _amount_matches(amounts, record['package_amount'], record['stipend_amount']), 2,
+               'Compared the amounts in the letter with the recorded package and stipend')
+    else:
+        _check(checks, 'amount_matches', None, 2, 'The placement record has no package or stipend')
+    _check(checks, 'date_matches', record['placement_date'].isoformat() in dates, 1,
+           f"Looked for the placement date {record['placement_date'].isoformat()}")
+    _check(checks, 'job_title_matches', _mentions(text, record['job_title']), 1,
+           f"Looked for the job title \"{record['job_title']}\"")
+
+
+def _student_by_email(extracted):
+    return User.objects.annotate(email_lower=Lower('email')).filter(
+        email_lower__in=extracted['emails'], student__isnull=False
+    ).select_related('student__placement_profile').first()
+
+
+def _resume_checks(checks, matches, verification, text, extracted):
+    user = _student_by_email(extracted)
+    _check(checks, 'candidate_identified', user is not None, 3,
+           'Matched a registered student by e-mail' if user else 'No registered student uses an e-mail in this resume')
+    _check(checks, 'contact_details', bool(extracted['emails']) or extracted['has_phone'], 1,
+           'Looked for an e-mail address or phone number')
+    if user is None:
+        return
+    matches['student_id'] = user.student.id
+    _check(checks, 'name_matches', _mentions(text, user.get_full_name()), 1,
+           f'Looked for the student name "{user.get_full_name()}"')
+    profile = getattr(user.student, 'placement_profile', None)
+    skills = profile.get_skills_list() if profile else []
+    if skills:
+        found = [skill for skill in skills if _mentions(text, skill)]
+        _check(checks, 'skills_match_profile', len(found) * 2 >= len(skills), 1,
+               f'{len(found)} of {len(skills)} profile skills appear in the resume')
+
+
+def _certificate_checks(checks, matches, verification, text, extracted):
+    ids = extracted['reference_ids']
+    certificate = Certificate.objects.filter(certificate_id__in=ids).select_related('user', 'course').first() if ids else None
+    if certificate is not None:
+        matches['certificate_id'] = certificate.certificate_id
+        _check(checks, 'certificate_registered', True, 3, 'The certificate id was issued by Skillora')
+        _check(checks, 'holder_named', _mentions(text, certificate.user.get_full_name()), 2,
+               f'Looked for the holder "{certificate.user.get_full_name()}"')
+        _check(checks, 'course_named', _mentions(text, certificate.course.title), 1,
+               f'Looked for the course "{certificate.course.title}"')
+        return
+
+    user = _student_by_email(extracted)
+    _check(checks, 'certificate_registered', None, 3, 'No Skillora certificate id found; issued elsewhere')
+    _check(checks, 'holder_identified', user is not None, 2,
+           'Matched a registered student by e-mail' if user else 'The holder could not be matched to a student')
+    if user is not None:
+        matches['student_id'] = user.student.id
+    _check(checks, 'dated', bool(extracted['dates']), 1, 'Looked for an issue date')
+
+
+def _document_checks(checks, matches, verification, text, extracted):
+    _check(checks, 'company_named', _mentions(text, verification.company.company_name), 2,
+           f'Looked for "{verification.company.company_name}" in the document')
+    _check(checks, 'dated', bool(extracted['dates']), 1, 'Looked for a date')
+
+
+TYPE_CHECKS = {
+    'offer_letter': _offer_letter_checks,
+    'resume': _resume_checks,
+    'certificate': _certificate_checks,
+    'document': _document_checks,
+}
+
+
+def _recommendations(checks, duplicates):
+    recommendations = []
+    if duplicates:
+        recommendations.append('This exact file was already submitted by another company; verify it with the issuer.')
+    for check in checks:
+        if check['passed'] is False:
+            recommendations.append(f"Review manually: {check['detail'].rstrip('.')}.")
+    if not recommendations:
+        recommendations.append('All applicable checks passed.')
+    return recommendations
+
+
+def apply_checks(verification, analysis):
+    """Score ``verification`` against the database using a stored analysis and save the outcome."""
+    checks, matches = [], {}
+    extracted = analysis.extracted
+    previous = AIVerification.objects.filter(content_hash=analysis.content_hash).exclude(pk=verification.pk)
+    duplicates = list(previous.exclude(company_id=verification.company_id).values_list('id', flat=True)[:10])
+    resubmitted = list(previous.filter(company_id=verification.company_id).values_list('id', flat=True)[:10])
+
+    _letterhead_check(checks, verification, analysis)
+    if analysis.text:
+        TYPE_CHECKS.get(verification.verification_type, _document_checks)(
+            checks, matches, verification, _normalize(analysis.text), extracted
+        )
+
+    applicable = [check for check in checks if check['passed'] is not None]
+    total = sum(check['weight'] for check in applicable)
+    passed = sum(check['weight'] for check in applicable if check['passed'])
+    score = round(Decimal(passed * 100) / total, 2) if total else Decimal('0.00')
+    threshold = getattr(settings, 'AI_VERIFICATION_THRESHOLD', 80)
+
+    if not analysis.text:
+        verification.status = 'failed'
+        result = 'No text could be read from this document (scanned images are not read); please review it manually.'
+    elif duplicates:
+        verification.status = 'rejected'
+        result = 'Rejected: this exact file was already submitted by another company.'
+    elif total and score >= threshold:
+        verification.status = 'verified'
+        result = f'Document verified with {score}% confidence.'
+    else:
+        verification.status = 'rejected'
+        result = f'Document rejected with {score}% confidence.'
+    if analysis.text:
+        result += f" {sum(1 for check in applicable if check['passed'])} of {len(applicable)} checks passed."
+
+    verification.content_hash = analysis.content_hash
+    verification.confidence_score = score
+    verification.verification_result = result
+    verification.ai_analysis = {
+        'engine': 'local',
+        'version': ANALYSIS_VERSION,
+        'authenticity_score': float(score),
+        'content_hash': analysis.content_hash,
+        'file_type': analysis.file_type,
+        'letterhead_hash': analysis.letterhead_hash,
+        'checks': checks,
+        'extracted': {key: extracted[key] for key in ('dates', 'amounts', 'emails')},
+        'matches': matches,
+        'duplicate_of': duplicates,
+        'previously_submitted': resubmitted,
+        'recommendations': _recommendations(checks, duplicates),
+    }
+    verification.processed_at = timezone.now()
+    verification.save()
+    return verification
+
+
+def verify_if_known(verification):
+    """Answer a verification immediately when its file was analysed before; False if it needs the worker."""
+    analysis = stored_analysis(verification.content_hash) if verification.content_hash else None
+    if analysis is None:
+        return False
+    apply_checks(verification, analysis)
+    return True
+
+
+def verify_document(verification):
+    """Analyse the verification's document (unless already analysed) and store the outcome on it"""
+    verification.status = 'processing'
+    verification.save(update_fields=['status'])
+
+    document = verification.document_file
+    with document.open('rb') as fileobj:
+        if not verification.content_hash:
+            verification.content_hash = file_hash(fileobj)
+        analysis = stored_analysis(verification.content_hash)
+        if analysis is None:
+            fileobj.seek(0)
+            try:
+                result = analyse_document(fileobj, document.name)
+            except DocumentError as error:
+                verification.status = 'failed'
+                verification.verification_result = str(error)
+                verification.ai_analysis = {'engine': 'local', 'version': ANALYSIS_VERSION, 'error': str(error)}
+                verification.processed_at = timezone.now()
+                verification.save()
+                return verification
+            analysis = _store_analysis(verification.content_hash, result)
+    return apply_checks(verification, analysis)
@@ -150,3 +150,37 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Precomputed teacher stats older than this many seconds are refreshed in the background after the next page view
+TEACHER_STATS_MAX_AGE = config('TEACHER_STATS_MAX_AGE', default=900, cast=int)
+
+# Company dashboard snapshots older than this many seconds are rebuilt in the background when the dashboard polls
+DASHBOARD_STATS_MAX_AGE = config('DASHBOARD_STATS_MAX_AGE', default=300, cast=int)
+
+# Running background jobs renew a lease; one not renewed for this many seconds is assumed lost and requeued
+BACKGROUND_JOB_TIMEOUT = config('BACKGROUND_JOB_TIMEOUT', default=300, cast=int)
+
+# Set when `manage.py run_worker` runs beside the web service; otherwise web processes run the jobs they queue in a thread
+BACKGROUND_WORKER = config('BACKGROUND_WORKER', default=False, cast=bool)
+
+# Store uploaded media content-addressed: identical files are kept once (skillora_app/storage_utils.py).
+# After turning it on, run `manage.py dedup_media` to move existing files into the blob store.
+MEDIA_DEDUP = config('MEDIA_DEDUP', default=False, cast=bool)
+if MEDIA_DEDUP:
+    DEFAULT_FILE_STORAGE = 'skillora_app.storage_utils.DedupFileSystemStorage'
+    FILE_UPLOAD_HANDLERS = [
+        'skillora_app.storage_utils.HashingMemoryFileUploadHandler',
+        'skillora_app.storage_utils.HashingTemporaryFileUploadHandler',
+    ]
+
+# Computed report numbers are cached this many seconds (they are also keyed by a signature of the source rows)
+REPORT_CACHE_TIMEOUT = config('REPORT_CACHE_TIMEOUT', default=3600, cast=int)
+
+# In-process autocomplete indexes are rebuilt from the database at least this often (seconds)
+AUTOCOMPLETE_MAX_AGE = config('AUTOCOMPLETE_MAX_AGE', default=600, cast=int)
+
+# Each process checks the shared autocomplete version (one query) at most this often (seconds)
+AUTOCOMPLETE_VERSION_CHECK = config('AUTOCOMPLETE_VERSION_CHECK', default=5, cast=int)
+
+# Payment histories longer than this many rows are rendered to PDF by the background worker
+LEDGER_PDF_INLINE_ROWS = config('LEDGER_PDF_INLINE_ROWS', default=1000, cast=int)
@@ -0,0 +1,43 @@
+// Suggestions for inputs marked data-autocomplete="<types>" from /api/autocomplete/
+(function () {
+    "use strict";
+
+    var DELAY = 120;
+
+    document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+        var list = document.createElement('datalist');
+        list.id = (input.name || 'search') + '-suggestions';
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        input.parentNode.appendChild(list);
+
+        var timer = null;
+        var latest = 0;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            var query = input.value.trim();
+            if (query.length < 2) {
+                list.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(function () {
+                var request = ++latest;
+                var url = '/api/autocomplete/?q=' + encodeURIComponent(query) +
+                    '&type=' + encodeURIComponent(input.dataset.autocomplete);
+                fetch(url).then(function (response) {
+                    return response.json();
+                }).then(function (data) {
+                    if (request !== latest) {
+                        return;  // an older answer arriving late
+                    }
+                    list.innerHTML = '';
+                    (data.suggestions || []).forEach(function (suggestion) {
+                        var option = document.createElement('option');
+                        option.value = suggestion.text;
+                        list.appendChild(option);
+                    });
+                }).catch(function () {});
+            }, DELAY);
+        });
+    });
+})();